@@ -1,4 +1,5 @@
 import secrets
+from typing import Optional
 from pydantic import Field, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
@@ -27,6 +28,16 @@ class Settings(BaseSettings):
         BCRYPT_ROUNDS (int): Work factor for password hashing.
         ALLOWED_ORIGINS (list[str]): List of origins allowed for CORS.
         ENVIRONMENT (str): Current runtime environment (e.g., 'production').
+        EXPORT_BATCH_SIZE (int): Rows fetched per round trip when streaming exports.
+        BATCH_LOOKUP_MAX_CODES (int): Maximum product codes accepted by /products/batch.
+        BULK_UPSERT_MAX_ROWS (int): Maximum rows accepted by /admin/products/bulk.
+        BULK_UPSERT_CHUNK_SIZE (int): Rows per INSERT ... ON DUPLICATE KEY UPDATE statement.
+        MQTT_HOST (str): MQTT broker the crawler manager listens on.
+        MQTT_PORT (int): MQTT broker port (default: 1883).
+        MQTT_USERNAME (Optional[str]): MQTT username, if the broker requires one.
+        MQTT_PASSWORD (Optional[SecretStr]): MQTT password.
+        CRAWLER_COMMAND_TOPIC (str): Topic the crawler manager takes commands on.
+        REFRESH_MAX_ITEMS (int): Maximum codes plus URLs accepted by /admin/products/refresh.
         DEBUG (bool): Toggle for debug mode features.
     """
 
@@ -63,6 +74,20 @@ class Settings(BaseSettings):
         "http://127.0.0.1"
     ]
     
+    # --- Export & Batch Lookup ---
+    EXPORT_BATCH_SIZE: int = 1000
+    BATCH_LOOKUP_MAX_CODES: int = 500
+    BULK_UPSERT_MAX_ROWS: int = 10000
+    BULK_UPSERT_CHUNK_SIZE: int = 500
+
+    # --- Crawler Control (MQTT) ---
+    MQTT_HOST: str = Field(default="localhost")
+    MQTT_PORT: int = Field(default=1883)
+    MQTT_USERNAME: Optional[str] = Field(default=None)
+    MQTT_PASSWORD: Optional[SecretStr] = Field(default=None)
+    CRAWLER_COMMAND_TOPIC: str = "indumine/crawler/command"
+    REFRESH_MAX_ITEMS: int = 500
+
     # --- App State ---
     ENVIRONMENT: str = Field(default="development")
     DEBUG: bool = Field(default=False)
@@ -6,6 +6,8 @@
 
 import sys
 import os
+import csv
+import io
 import json
 import logging
 from typing import List, cast, Any, Optional, Dict
@@ -13,22 +15,26 @@ from typing import List, cast, Any, Optional, Dict
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi import APIRouter, HTTPException, Depends, Query, Body, Request
+from fastapi import APIRouter, HTTPException, Depends, Query, Body, Request, UploadFile, File
+from fastapi.responses import StreamingResponse
 from datetime import datetime
 from sqlalchemy import or_, func, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.orm import Session, aliased, selectinload
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
 # Internal Imports
-from database import get_db
+from database import get_db, SessionLocal
 from schemas.products import * 
 from schemas.auth import *
 from models.users import User
 from models.products import Category, Products
-from utils.helpers import get_translator, row_to_dict
+from utils.helpers import get_batch_translator, get_translator, row_to_dict
 from utils.cache import clear_cache, get_cached_category_tree, cache_category_tree
+from utils.export import EXPORT_MEDIA_TYPES, PARQUET_AVAILABLE, iter_csv, iter_ndjson, iter_parquet
+from utils.crawler import new_crawler_job_id, send_crawler_command
 from config import settings
 from utils.security import *
 
@@ -133,6 +139,38 @@ def has_access_to_category(user: User, category_slug: str, db: Session) -> bool:
     
     return False
 
+def get_accessible_category_ids(user: User, db: Session) -> Optional[set[int]]:
+    """Resolve every category ID the user may read in a single recursive query
+
+    Equivalent to calling `has_access_to_category` for each category: a category
+    is accessible when it or one of its ancestors is in `allowed_categories`.
+
+    Args:
+        user (User): The targeted users
+        db (Session): 
+
+    Returns:
+        Optional[set[int]]: The accessible IDs, or None if the user is admin (no restriction)
+    """
+    if str(user.role) == "admin":
+        return None
+
+    allowed_cats: List[str] = list(user.allowed_categories or [])
+    if not allowed_cats:
+        return set()
+
+    hierarchy_cte = (
+        select(Category.id)
+        .where(Category.slug.in_(allowed_cats))
+        .cte(name='accessible_categories', recursive=True)
+    )
+    child_alias = aliased(Category)
+    hierarchy_cte = hierarchy_cte.union_all(
+        select(child_alias.id).join(hierarchy_cte, child_alias.parent_id == hierarchy_cte.c.id)
+    )
+
+    return set(db.execute(select(hierarchy_cte.c.id)).scalars().all())
+
 
 # ============================================================================
 # AUTH ROUTES
@@ -682,6 +720,76 @@ def get_product_globally(
         raise HTTPException(status_code=500, detail="Error processing product data")
     return result
 
+@router.post("/products/batch", response_model=ProductBatchResponse)
+def get_products_batch(
+    batch: ProductBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """Resolve a list of product codes in one round trip
+
+    Args:
+        batch (ProductBatchRequest): The product codes and the response language
+        current_user (User, optional): Who's asking for the data. Defaults to Depends(get_current_user).
+        db (Session, optional): Defaults to Depends(get_db).
+
+    Raises:
+        HTTPException: 400 If more than `BATCH_LOOKUP_MAX_CODES` codes are requested
+
+    Returns:
+        Dict[str, Any]: Per-code status ('ok', 'not_found', 'forbidden') and product data
+    """
+    # Deduplicate while keeping the caller's order
+    codes = list(dict.fromkeys(c.strip() for c in batch.codes if c and c.strip()))
+    if len(codes) > settings.BATCH_LOOKUP_MAX_CODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many product codes (max {settings.BATCH_LOOKUP_MAX_CODES})"
+        )
+
+    # 1. One IN query for every product
+    products: List[Products] = (
+        db.query(Products)
+        .options(selectinload(Products.category_rel))
+        .filter(Products.id.in_(codes))
+        .all()
+    ) if codes else []
+    by_code: Dict[str, Products] = {str(p.id): p for p in products}
+
+    # 2. One access resolution for the whole batch
+    accessible_ids = get_accessible_category_ids(current_user, db)
+
+    # 3. Shared translator so repeated names and spec keys translate once
+    translator = get_batch_translator(batch.lang)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    counts = {"ok": 0, "not_found": 0, "forbidden": 0}
+
+    for code in codes:
+        product = by_code.get(code)
+        if product is None:
+            results[code] = {"status": "not_found", "product": None}
+        elif (
+            accessible_ids is not None
+            and product.category_rel is not None
+            and cast(int, product.category_id) not in accessible_ids
+        ):
+            results[code] = {"status": "forbidden", "product": None}
+        else:
+            setattr(product, "_response_lang", batch.lang)
+            slug = str(product.category_rel.slug) if product.category_rel else None
+            results[code] = {"status": "ok", "product": row_to_dict(product, slug=slug, translator=translator)}
+        counts[results[code]["status"]] += 1
+
+    logger.info(f"Batch lookup: {len(codes)} codes, {counts['ok']} encontrados")
+
+    return {
+        "results": results,
+        "found": counts["ok"],
+        "not_found": counts["not_found"],
+        "forbidden": counts["forbidden"]
+    }
+
 @router.get("/products/{category_slug}/{product_code}", response_model=ProductItemResponse)
 def get_product_detail(
     category_slug: str,
@@ -802,6 +910,106 @@ def search_products(
     
     return results
 
+# ============================================================================
+# EXPORT ROUTES
+# ============================================================================
+
+def _stream_category_products(category_ids: List[int], lang: str, batch_size: int):
+    """Yield serialized products for the given categories from a single streamed query.
+
+    Uses its own session so the server-side cursor outlives the request-scoped one.
+    Every category is loaded up front, which lets `category_rel` and the parent
+    chain resolve from the identity map instead of issuing queries on the
+    connection while the cursor is still open.
+
+    Args:
+        category_ids (List[int]): Category IDs whose products are exported.
+        lang (str): Which language you want the data.
+        batch_size (int): Rows fetched per round trip from the server-side cursor.
+
+    Yields:
+        Dict[str, Any]: The product on dict format
+    """
+    session = SessionLocal()
+    try:
+        # Keep a strong reference: the identity map only holds weak ones
+        categories: List[Category] = session.query(Category).all()
+        for cat in categories:
+            _ = cat.parent
+
+        stmt = (
+            select(Products)
+            .where(Products.category_id.in_(category_ids))
+            .order_by(Products.id)
+            .execution_options(yield_per=batch_size, stream_results=True)
+        )
+
+        translator = get_batch_translator(lang)
+        exported = 0
+        for partition in session.execute(stmt).scalars().partitions():
+            for p in partition:
+                setattr(p, "_response_lang", lang)
+                product_dict = row_to_dict(p, translator=translator)
+                if product_dict is not None:
+                    exported += 1
+                    yield product_dict
+
+        logger.info(f"Exportados {exported} produtos de {len(categories)} categorias carregadas")
+    finally:
+        session.close()
+
+@router.get("/export/{category_slug}")
+def export_products_by_category(
+    category_slug: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$", description="Export format: ndjson, csv or parquet"),
+    lang: str = Query("pb", description="Language code: en, es, pb"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> StreamingResponse:
+    """Stream every product of a category tree in a single query
+
+    Args:
+        category_slug (str): Raw Category Name
+        format (str, optional): Export format. Defaults to Query("ndjson").
+        lang (str, optional): Which language you want the data. Defaults to Query("pb").
+        current_user (User, optional): Who's asking for the data. Defaults to Depends(get_current_user).
+        db (Session, optional): Defaults to Depends(get_db).
+
+    Raises:
+        HTTPException: 403 If user doesn't have permission for the category
+        HTTPException: 404 If not found
+        HTTPException: 501 If parquet is requested but pyarrow isn't installed
+
+    Returns:
+        StreamingResponse: The products encoded in the requested format
+    """
+    if not has_access_to_category(current_user, category_slug, db):
+        raise HTTPException(status_code=403, detail="Access denied to this category")
+
+    category_ids = get_category_descendants(db, category_slug)
+    if not category_ids:
+        raise HTTPException(status_code=404, detail="Category not found")
+
+    if format == "parquet" and not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Parquet export is not available on this server")
+
+    items = _stream_category_products(category_ids, lang, settings.EXPORT_BATCH_SIZE)
+
+    if format == "csv":
+        body = iter_csv(items)
+    elif format == "parquet":
+        body = iter_parquet(items)
+    else:
+        body = iter_ndjson(items)
+
+    logger.info(f"Exportando categoria '{category_slug}' ({len(category_ids)} categorias) em {format}")
+
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{category_slug}.{format}"'}
+    )
+
 # ============================================================================
 # ADMIN ENDPOINTS
 # ============================================================================
@@ -853,6 +1061,239 @@ def create_product(
     
     return new_product
 
+def _parse_bulk_upload(content: bytes, is_csv: bool) -> List[Dict[str, Any]]:
+    """Decode a bulk upload into raw row dicts
+
+    Args:
+        content (bytes): The uploaded file body
+        is_csv (bool): True for CSV with a header row, False for JSON lines
+
+    Raises:
+        HTTPException: 400 If the file isn't valid UTF-8, CSV or JSON lines
+
+    Returns:
+        List[Dict[str, Any]]: One dict per row, empty CSV cells omitted
+    """
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Upload must be UTF-8 encoded")
+
+    rows: List[Dict[str, Any]] = []
+    if is_csv:
+        for record in csv.DictReader(io.StringIO(text)):
+            rows.append({k: v for k, v in record.items() if k and v not in (None, "")})
+        return rows
+
+    for line_no, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON on line {line_no}: {e.msg}")
+        if not isinstance(record, dict):
+            raise HTTPException(status_code=400, detail=f"Line {line_no} is not a JSON object")
+        rows.append(cast(Dict[str, Any], record))
+    return rows
+
+@router.post("/admin/products/bulk", response_model=BulkUpsertResponse)
+@limiter.limit("2/minute") # type: ignore
+def bulk_upsert_products(
+    request: Request,
+    file: UploadFile = File(..., description="JSON lines (.jsonl) or CSV with a header row"),
+    current_user: User = Depends(require_role("admin")),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """Admin endpoint to create or update many products at once
+
+    New IDs are validated as `ProductCreate`, existing ones as `ProductUpdate`
+    and merged onto the stored row, so every row is complete and the whole
+    batch can be written with multi-row `INSERT ... ON DUPLICATE KEY UPDATE`.
+
+    Args:
+        request (Request): `deprecated`
+        file (UploadFile): The rows to upsert
+        current_user (User, optional): `deprecated`. Defaults to Depends(require_role("admin")).
+        db (Session, optional): Defaults to Depends(get_db).
+
+    Raises:
+        HTTPException: 400 If the upload can't be parsed or has too many rows
+
+    Returns:
+        Dict[str, Any]: Inserted/updated/failed counts with a result per row
+    """
+    filename = (file.filename or "").lower()
+    is_csv = filename.endswith(".csv") or (file.content_type or "").startswith("text/csv")
+    raw_rows = _parse_bulk_upload(file.file.read(), is_csv)
+
+    if len(raw_rows) > settings.BULK_UPSERT_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"Too many rows (max {settings.BULK_UPSERT_MAX_ROWS})")
+
+    chunk_size = settings.BULK_UPSERT_CHUNK_SIZE
+    columns = [c.name for c in Products.__table__.columns]
+
+    # 1. Load every referenced product once
+    ids = list(dict.fromkeys(str(r["id"]) for r in raw_rows if r.get("id")))
+    existing: Dict[str, Products] = {}
+    for i in range(0, len(ids), chunk_size):
+        for p in db.query(Products).filter(Products.id.in_(ids[i:i + chunk_size])).all():
+            existing[str(p.id)] = p
+
+    # 2. Validate everything in one pass
+    results: List[Dict[str, Any]] = []
+    valid: List[tuple[Dict[str, Any], Dict[str, Any]]] = []
+    seen: set[str] = set()
+    now = datetime.now().isoformat()
+
+    for row_no, raw in enumerate(raw_rows, 1):
+        product_id = str(raw.get("id") or "").strip()
+        result: Dict[str, Any] = {"row": row_no, "id": product_id or None, "status": "error", "detail": None}
+        results.append(result)
+
+        if not product_id:
+            result["detail"] = "Missing id"
+            continue
+        if product_id in seen:
+            result["detail"] = "Duplicate id in batch"
+            continue
+        seen.add(product_id)
+
+        try:
+            payload = {**raw, "id": product_id}
+            if isinstance(payload.get("specs"), str):
+                payload["specs"] = json.loads(payload["specs"])
+
+            current = existing.get(product_id)
+            if current is None:
+                payload.setdefault("scraped_at", now)
+                record = ProductCreate.model_validate(payload).model_dump()
+                result["status"] = "inserted"
+            else:
+                update_data = ProductUpdate.model_validate(payload).model_dump(exclude_unset=True)
+                record = {c: getattr(current, c) for c in columns}
+                record.update({k: v for k, v in update_data.items() if k in record})
+                result["status"] = "updated"
+        except json.JSONDecodeError:
+            result["detail"] = "Invalid JSON in specs field"
+            continue
+        except ValidationError as e:
+            error = e.errors()[0]
+            result["detail"] = f"{'.'.join(str(x) for x in error.get('loc', ()))}: {error.get('msg')}"
+            continue
+
+        valid.append(({c: record.get(c) for c in columns}, result))
+
+    # 3. Multi-row upsert, one statement per chunk
+    applied = 0
+    for i in range(0, len(valid), chunk_size):
+        chunk = valid[i:i + chunk_size]
+        stmt = mysql_insert(Products).values([record for record, _ in chunk])
+        stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in columns if c != "id"})
+        try:
+            db.execute(stmt)
+            db.commit()
+            applied += len(chunk)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Bulk upsert chunk {i // chunk_size} failed: {e}")
+            for _, result in chunk:
+                result["status"] = "error"
+                result["detail"] = "Database error while writing this chunk"
+
+    # 4. A single invalidation for the whole batch
+    if applied:
+        clear_cache()
+
+    counts = {"inserted": 0, "updated": 0, "error": 0}
+    for result in results:
+        counts[result["status"]] += 1
+
+    logger.info(
+        f"Admin {current_user.username} bulk upsert: {counts['inserted']} inserted, "
+        f"{counts['updated']} updated, {counts['error']} failed"
+    )
+
+    return {
+        "inserted": counts["inserted"],
+        "updated": counts["updated"],
+        "failed": counts["error"],
+        "results": results
+    }
+
+@router.post("/admin/products/refresh", response_model=ProductRefreshResponse, status_code=202)
+@limiter.limit("10/minute") # type: ignore
+def refresh_products(
+    request: Request,
+    refresh: ProductRefreshRequest,
+    current_user: User = Depends(require_role("admin")),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """Admin endpoint to re-scrape specific products right away
+
+    Queues a high-priority `refresh` job on the crawler over MQTT. The
+    crawler resolves codes and the category subtree to product URLs,
+    scrapes only those pages and upserts them like a full crawl does.
+
+    Args:
+        request (Request): `deprecated`
+        refresh (ProductRefreshRequest): Product codes, URLs and/or a category slug
+        current_user (User, optional): `deprecated`. Defaults to Depends(require_role("admin")).
+        db (Session, optional): Defaults to Depends(get_db).
+
+    Raises:
+        HTTPException: 400 If nothing (or more than `REFRESH_MAX_ITEMS`) is requested
+        HTTPException: 404 If no code, URL or category could be resolved
+        HTTPException: 503 If the crawler can't be reached
+
+    Returns:
+        Dict[str, Any]: The crawler job id and what was sent to it
+    """
+    codes = list(dict.fromkeys(c.strip() for c in refresh.codes if c and c.strip()))
+    urls = list(dict.fromkeys(u.strip() for u in refresh.urls if u and u.strip()))
+    if not (codes or urls or refresh.category_slug):
+        raise HTTPException(status_code=400, detail="Provide codes, urls or a category_slug")
+    if len(codes) + len(urls) > settings.REFRESH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items (max {settings.REFRESH_MAX_ITEMS})")
+
+    # Fail fast on typos instead of queueing a job with nothing to do
+    known = {str(pid) for (pid,) in db.query(Products.id).filter(Products.id.in_(codes)).all()} if codes else set()
+    unknown_codes = [c for c in codes if c not in known]
+    codes = [c for c in codes if c in known]
+    if refresh.category_slug and not get_category_descendants(db, refresh.category_slug, True):
+        raise HTTPException(status_code=404, detail="Category not found")
+    if not (codes or urls or refresh.category_slug):
+        raise HTTPException(status_code=404, detail="None of the product codes were found")
+
+    job_id = new_crawler_job_id()
+    command: Dict[str, Any] = {
+        "command": "start",
+        "mode": "refresh",
+        "job_id": job_id,
+        "codes": codes,
+        "urls": urls,
+        "category": refresh.category_slug,
+    }
+    if refresh.priority is not None:
+        command["priority"] = refresh.priority
+
+    try:
+        send_crawler_command(command)
+    except (RuntimeError, OSError) as e:
+        logger.error(f"Refresh job {job_id} could not be sent to the crawler: {e}")
+        raise HTTPException(status_code=503, detail="Crawler is unavailable")
+
+    logger.info(f"Refresh job {job_id}: {len(codes)} codes, {len(urls)} urls, category={refresh.category_slug}")
+
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "codes": codes,
+        "unknown_codes": unknown_codes,
+        "urls": urls,
+        "category_slug": refresh.category_slug
+    }
+
 @router.put("/admin/products/{product_id}", response_model=ProductResponse)
 @limiter.limit("10/minute") # type: ignore
 def update_product(
@@ -87,6 +87,23 @@ class ProductItemResponse(BaseModel):
     specifications: Dict[str, Any]
     scraped_at: Optional[str]
 
+class ProductBatchRequest(BaseModel):
+    """Schema for resolving many product codes in a single request."""
+    codes: List[str] = Field(..., min_length=1)
+    lang: str = "pb"
+
+class ProductBatchItem(BaseModel):
+    """Per-code outcome of a batch lookup: 'ok', 'not_found' or 'forbidden'."""
+    status: str
+    product: Optional[ProductItemResponse] = None
+
+class ProductBatchResponse(BaseModel):
+    """Batch lookup results keyed by the requested product code."""
+    results: Dict[str, ProductBatchItem]
+    found: int
+    not_found: int
+    forbidden: int
+
 class ProductCreate(ProductBase):
     """Schema for inserting new products into the database."""
     pass
@@ -96,6 +113,7 @@ class ProductUpdate(BaseModel):
     url: Optional[str] = None
     name: Optional[str] = None
     category: Optional[str] = None
+    category_id: Optional[int] = None
     description: Optional[str] = None
     specs: Optional[Union[Dict[str, Any], str]] = None
     images: Optional[str] = None
@@ -105,6 +123,36 @@ class ProductResponse(ProductBase):
     """Standardized API response for product data."""
     model_config = ConfigDict(from_attributes=True)
 
+class BulkUpsertRowResult(BaseModel):
+    """Outcome of a single row in a bulk upsert: 'inserted', 'updated' or 'error'."""
+    row: int
+    id: Optional[str] = None
+    status: str
+    detail: Optional[str] = None
+
+class BulkUpsertResponse(BaseModel):
+    """Summary and per-row results of a bulk product upsert."""
+    inserted: int
+    updated: int
+    failed: int
+    results: List[BulkUpsertRowResult]
+
+class ProductRefreshRequest(BaseModel):
+    """Products to re-scrape: codes, product URLs and/or a category subtree."""
+    codes: List[str] = []
+    urls: List[str] = []
+    category_slug: Optional[str] = None
+    priority: Optional[int] = None
+
+class ProductRefreshResponse(BaseModel):
+    """A refresh job handed to the crawler; progress is reported on its status topic."""
+    job_id: str
+    status: str
+    codes: List[str]
+    unknown_codes: List[str]
+    urls: List[str]
+    category_slug: Optional[str] = None
+
 # ============================================================================
 # SYSTEM MONITORING SCHEMAS
 # ============================================================================
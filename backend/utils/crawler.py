@@ -0,0 +1,54 @@
+# ============================================================================
+# BACKEND UTILITIES - CRAWLER COMMANDS
+# ============================================================================
+# utils/crawler.py
+# ============================================================================
+
+import json
+import uuid
+from typing import Any, Dict
+
+from config import settings
+
+_publish: Any = None
+
+try:
+    from paho.mqtt import publish as _publish
+    _success = True
+except Exception:
+    _success = False
+
+MQTT_AVAILABLE: bool = _success
+
+
+def new_crawler_job_id() -> str:
+    """Same shape as the crawler's own job ids, so status messages can be matched."""
+    return str(uuid.uuid4())[:8]
+
+
+def send_crawler_command(command: Dict[str, Any]) -> None:
+    """Publishes one command to the crawler manager's command topic.
+
+    Args:
+        command (Dict[str, Any]): The JSON command, e.g. {"command": "start", "mode": "refresh", ...}
+
+    Raises:
+        RuntimeError: If paho-mqtt is not installed
+        OSError: If the broker can't be reached
+    """
+    if not MQTT_AVAILABLE:
+        raise RuntimeError("paho-mqtt is not installed")
+
+    auth = None
+    if settings.MQTT_USERNAME:
+        password = settings.MQTT_PASSWORD.get_secret_value() if settings.MQTT_PASSWORD else None
+        auth = {"username": settings.MQTT_USERNAME, "password": password}
+
+    _publish.single(
+        settings.CRAWLER_COMMAND_TOPIC,
+        json.dumps(command),
+        qos=1,
+        hostname=settings.MQTT_HOST,
+        port=settings.MQTT_PORT,
+        auth=auth,
+    )
@@ -0,0 +1,169 @@
+# ============================================================================
+# BACKEND UTILITIES - EXPORT
+# ============================================================================
+# utils/export.py
+# ============================================================================
+
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List
+
+_pa: Any = None
+_pq: Any = None
+
+try:
+    import pyarrow as _pa
+    import pyarrow.parquet as _pq
+    _success = True
+except Exception:
+    _success = False
+
+PARQUET_AVAILABLE: bool = _success
+
+# Column order shared by every export format (mirrors ProductItemResponse)
+EXPORT_COLUMNS: List[str] = [
+    "product_code",
+    "name",
+    "image",
+    "url",
+    "category_slug",
+    "category_path",
+    "scraped_at",
+    "specifications",
+]
+
+EXPORT_MEDIA_TYPES: Dict[str, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def _flatten(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Prepares a product dict for tabular formats by serializing the specs to JSON.
+
+    Args:
+        item (Dict[str, Any]): A product dict as produced by `row_to_dict`.
+
+    Returns:
+        Dict[str, Any]: The same fields, with `specifications` as a JSON string.
+    """
+    row = {col: item.get(col) for col in EXPORT_COLUMNS}
+    row["specifications"] = json.dumps(item.get("specifications") or {}, ensure_ascii=False)
+    return row
+
+def iter_ndjson(items: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    Encodes product dicts as newline-delimited JSON, one product per line.
+
+    Args:
+        items (Iterable[Dict[str, Any]]): Product dicts to encode.
+
+    Yields:
+        bytes: One UTF-8 encoded JSON line per product.
+    """
+    for item in items:
+        yield (json.dumps(item, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+def iter_csv(items: Iterable[Dict[str, Any]], flush_every: int = 500) -> Iterator[bytes]:
+    """
+    Encodes product dicts as CSV, flushing the buffer every `flush_every` rows.
+
+    Args:
+        items (Iterable[Dict[str, Any]]): Product dicts to encode.
+        flush_every (int): Rows buffered before a chunk is yielded. Defaults to 500.
+
+    Yields:
+        bytes: UTF-8 encoded CSV chunks, header first.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+
+    pending = 0
+    for item in items:
+        writer.writerow(_flatten(item))
+        pending += 1
+        if pending >= flush_every:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
+
+class _ChunkSink:
+    """
+    Write-only file object that hands written bytes back to the caller.
+
+    Parquet footers store absolute offsets, so `tell()` keeps counting even
+    after the buffered chunks have been drained.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def iter_parquet(items: Iterable[Dict[str, Any]], row_group_size: int = 5000) -> Iterator[bytes]:
+    """
+    Encodes product dicts as a Parquet file, one row group at a time.
+
+    Only one row group is held in memory; each one is yielded as soon as
+    it has been written.
+
+    Args:
+        items (Iterable[Dict[str, Any]]): Product dicts to encode.
+        row_group_size (int): Rows per Parquet row group. Defaults to 5000.
+
+    Raises:
+        RuntimeError: If pyarrow is not installed.
+
+    Yields:
+        bytes: Chunks of the Parquet file, in order.
+    """
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("pyarrow is not installed")
+
+    schema = _pa.schema([(col, _pa.string()) for col in EXPORT_COLUMNS])
+    sink = _ChunkSink()
+    writer = _pq.ParquetWriter(_pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+
+    batch: List[Dict[str, Any]] = []
+    try:
+        for item in items:
+            row = _flatten(item)
+            batch.append({k: (None if v is None else str(v)) for k, v in row.items()})
+            if len(batch) >= row_group_size:
+                writer.write_table(_pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+                yield sink.drain()
+
+        if batch:
+            writer.write_table(_pa.Table.from_pylist(batch, schema=schema))
+    finally:
+        writer.close()
+
+    yield sink.drain()
@@ -5,6 +5,7 @@
 # ============================================================================
 
 import json
+from functools import lru_cache
 from typing import Any, Callable, Dict, List, Optional, Protocol, Union, cast
 
 # --- Protocols for Structural Typing ---
@@ -94,6 +95,21 @@ def get_translator(to_code: Optional[str]) -> Callable[[str], str]:
     _TRANSLATOR_CACHE[code_str] = lambda s: s
     return _TRANSLATOR_CACHE[code_str]
 
+def get_batch_translator(to_code: Optional[str]) -> Callable[[str], str]:
+    """
+    Returns a memoized translator for serializing many products in one request.
+
+    Spec keys and common values repeat across products, so each distinct
+    string is translated only once per batch.
+
+    Args:
+        to_code (Optional[str]): The target language ISO code (e.g., 'es', 'fr').
+
+    Returns:
+        Callable[[str], str]: A caching wrapper around `get_translator(to_code)`.
+    """
+    return lru_cache(maxsize=None)(get_translator(to_code))
+
 def get_category_path(category: Optional[CategoryProtocol]) -> str:
     """
     Constructs a breadcrumb string representing the category hierarchy.
@@ -111,7 +127,11 @@ def get_category_path(category: Optional[CategoryProtocol]) -> str:
         current = current.parent
     return " > ".join(path) if len(path) > 0 else ""
 
-def row_to_dict(instance: Optional[InstanceProtocol], slug: Optional[str] = None) -> Optional[Dict[str, Any]]:
+def row_to_dict(
+    instance: Optional[InstanceProtocol],
+    slug: Optional[str] = None,
+    translator: Optional[Callable[[str], str]] = None
+) -> Optional[Dict[str, Any]]:
     """
     Converts a database instance into a serializable dictionary, handling 
     translations and JSON parsing for specifications.
@@ -120,6 +140,8 @@ def row_to_dict(instance: Optional[InstanceProtocol], slug: Optional[str] = None
         instance (Optional[InstanceProtocol]): The raw data instance.
         slug (Optional[str]): Override for the category slug. Defaults to the 
             slug found in the instance's category relation.
+        translator (Optional[Callable[[str], str]]): Translator to use instead of
+            `get_translator(lang)`, e.g. one shared across a batch.
 
     Returns:
         Optional[Dict[str, Any]]: A dictionary containing processed product data, 
@@ -158,7 +180,7 @@ def row_to_dict(instance: Optional[InstanceProtocol], slug: Optional[str] = None
     }
     
     if lang not in ["en", ""]:
-        translator = get_translator(lang)
+        translator = translator or get_translator(lang)
         data["name"] = translator(instance.name or "")
         data["category_path"] = translator(category_path)
         
@@ -0,0 +1,252 @@
+"""
+Offline crawler benchmark.
+
+Serves a recorded corpus (see `weg_crawler.py --record DIR`) from a local
+fixture server and runs `discovery_crawl`, `product_crawl` and
+`extract_product_data` against it, so throughput can be compared between
+commits without touching weg.net. The "engine" stage runs the shared
+`CrawlEngine` over the product pages with no frontier or sinks, i.e. the
+dispatch, fetch and parse core every crawler is built on.
+
+    python weg_crawler.py --no-mqtt --job full --fetch-mode hybrid --record data/corpus
+    python benchmark.py data/corpus --output data/benchmark.json
+    python benchmark.py data/corpus --parse-only --repeat-parse 20
+    python benchmark.py data/corpus --skip-discovery --incremental
+    python benchmark.py data/corpus --skip-discovery --workers 4 --shard-size 10
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import weg_crawler as wc
+from crawling.engine import CrawlEngine, PageScraper, QueueSource
+from crawling.parsing import LXML_AVAILABLE, PARSER_BACKENDS, ProductExtractor, parse_product_html
+from crawling.replay import FixtureServer, PageStore
+
+
+def rate(count, seconds):
+    return round(count / seconds, 2) if seconds > 0 else None
+
+
+async def bench_discovery(start_url, source):
+    start = time.perf_counter()
+    urls, _ = await wc.run_discovery(start_url, source=source)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": round(elapsed, 3),
+        "pages": len(urls),
+        "pages_per_s": rate(len(urls), elapsed),
+        "product_urls": sum(1 for u in urls if wc.looks_like_product(u)),
+    }
+
+
+async def progress(processed, total):
+    pass
+
+
+async def bench_products(product_urls, incremental=False):
+    start = time.perf_counter()
+    await wc.product_crawl(progress, stream_to_db=False, audit_csv=True, incremental=incremental)
+    elapsed = time.perf_counter() - start
+    metrics = wc.METRICS.latest("product")
+
+    with open(wc.OUTPUT_FILE, encoding="utf-8") as f:
+        rows = sum(1 for _ in f) - 1
+
+    return {
+        "seconds": round(elapsed, 3),
+        "pages": len(product_urls),
+        "pages_per_s": rate(len(product_urls), elapsed),
+        "rows": rows,
+        "rows_per_s": rate(rows, elapsed),
+        "fetch_ms": metrics["fetch_ms"],
+        "parse_ms": metrics["parse_ms"],
+        "error_rate": metrics["error_rate"],
+        "block_rate": metrics["block_rate"],
+    }
+
+
+async def bench_engine(product_urls):
+    """The crawl core alone: every product page fetched and parsed, results dropped."""
+    metrics = wc.METRICS.begin("engine", "engine")
+    executor = ThreadPoolExecutor(wc.MAX_WORKERS)
+    parse_pool = wc.PARSE_POOL
+    fetcher = wc.new_fetcher(executor, parse_pool, metrics)
+    scraper = PageScraper(fetcher, ProductExtractor(wc.BASE_URL, wc.PARSER_BACKEND), parse_pool,
+                          wait_selector=wc.PRODUCT_WAIT_SELECTOR, required_selector=wc.PRODUCT_REQUIRED_SELECTOR,
+                          metrics=metrics)
+    rows = 0
+
+    async def on_result(url, meta, result):
+        nonlocal rows
+        rows += len(result)
+
+    async def on_error(url, meta, e):
+        pass
+
+    crawler = CrawlEngine(QueueSource(product_urls), scraper, on_result, on_error,
+                          max_workers=wc.MAX_WORKERS, metrics=metrics)
+    try:
+        await crawler.run()
+    finally:
+        await fetcher.aclose()
+        executor.shutdown(wait=True)
+    metrics = wc.METRICS.end("engine")
+    return {
+        "seconds": round(crawler.elapsed, 3),
+        "pages": crawler.pages,
+        "errors": crawler.errors,
+        "pages_per_s": rate(crawler.pages, crawler.elapsed),
+        "rows": rows,
+        "worker_utilization": round(crawler.utilization(), 3),
+        "fetch_ms": metrics["fetch_ms"],
+        "parse_ms": metrics["parse_ms"],
+    }
+
+
+async def bench_cluster(product_urls, workers):
+    """Product stage sharded over `workers` in-process workers."""
+    start = time.perf_counter()
+    await wc.local_cluster_product_crawl(progress, workers=workers, stream_to_db=False)
+    elapsed = time.perf_counter() - start
+    products = wc.read_products(wc.PARQUET_DIR, ["url"]).num_rows if wc.PARQUET_OUTPUT else None
+    return {
+        "seconds": round(elapsed, 3),
+        "workers": workers,
+        "pages": len(product_urls),
+        "pages_per_s": rate(len(product_urls), elapsed),
+        "products": products,
+    }
+
+
+def bench_parse(store, product_urls, repeat=1):
+    """Times every available parser backend over the stored pages and checks them against bs4."""
+    pages = [(url, store.get(url)[1]) for url in product_urls]
+    backends = ["bs4"] + (["lxml"] if LXML_AVAILABLE else [])
+    results = {}
+    reference = None
+
+    for backend in backends:
+        rows = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            outputs = [parse_product_html(html, url, wc.BASE_URL, backend) for url, html in pages]
+            rows += sum(len(o) for o in outputs)
+        elapsed = time.perf_counter() - start
+        parsed = len(pages) * repeat
+
+        results[backend] = {
+            "seconds": round(elapsed, 3),
+            "pages": parsed,
+            "ms_per_page": round(elapsed * 1000 / parsed, 3) if parsed else None,
+            "rows": rows,
+            "rows_per_s": rate(rows, elapsed),
+        }
+        if reference is None:
+            reference = outputs
+        else:
+            results[backend]["mismatched_pages"] = sum(1 for a, b in zip(reference, outputs) if a != b)
+
+    return results
+
+
+async def run_benchmark(args):
+    store = PageStore(args.store)
+    if not len(store):
+        raise SystemExit(f"No recorded pages in {args.store}")
+
+    product_urls = sorted(u for u in store.urls() if wc.looks_like_product(u))
+    report = {
+        "corpus": {"pages": len(store), "product_pages": len(product_urls)},
+        "config": {
+            "parser": wc.PARSER_BACKEND,
+            "max_workers": wc.MAX_WORKERS,
+            "http_max_connections": wc.HTTP_MAX_CONNECTIONS,
+            "latency_ms": args.latency_ms,
+            "throttle": args.throttle,
+            "discovery_source": args.discovery_source,
+        },
+    }
+
+    if args.parse_only:
+        report["parse"] = bench_parse(store, product_urls, args.repeat_parse)
+        return report
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            FixtureServer(store, args.origin, latency=args.latency_ms / 1000) as server:
+        wc.FETCH_MODE = "http"
+        wc.REPLAY_ORIGIN = server.url
+        wc.RECORD_DIR = None
+        wc.ADAPTIVE_THROTTLE = args.throttle
+        wc.PRODUCT_URLS_FILE = Path(tmp) / "product_urls.csv"
+        wc.OUTPUT_FILE = Path(tmp) / "products.csv"
+        wc.FRONTIER_DB = Path(tmp) / "frontier.sqlite3"
+        wc.FRONTIER_SEEN_DIR = Path(tmp) / "frontier_seen"
+        wc.PAGE_INDEX_DB = Path(tmp) / "page_index.sqlite3"
+        wc.PARQUET_DIR = Path(tmp) / "products"
+        wc.SHARDS_DB = Path(tmp) / "shards.sqlite3"
+
+        if not args.skip_discovery:
+            report["discovery"] = await bench_discovery(args.start_url, args.discovery_source)
+
+        # The product stage always scrapes the whole recorded corpus so runs stay comparable
+        wc.save_product_urls(set(product_urls))
+        report["engine"] = await bench_engine(product_urls)
+        report["product"] = await bench_products(product_urls)
+        if args.incremental:
+            # Same corpus again: every page should be revalidated instead of re-parsed
+            report["product_incremental"] = await bench_products(product_urls, incremental=True)
+        if args.workers:
+            wc.SHARD_SIZE = args.shard_size
+            report["product_cluster"] = await bench_cluster(product_urls, args.workers)
+        report["fixture"] = {"hits": server.hits, "misses": server.misses, "not_modified": server.not_modified}
+
+    report["parse"] = bench_parse(store, product_urls, args.repeat_parse)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the WEG crawler against a recorded corpus")
+    parser.add_argument("store", help="PageStore directory written by --record")
+    parser.add_argument("--origin", default=wc.BASE_URL, help="Origin the corpus was recorded from")
+    parser.add_argument("--start-url", default=wc.settings.START_URL, help="Discovery entry point")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated per-request latency")
+    parser.add_argument("--repeat-parse", type=int, default=1, help="Parse passes over the stored product pages")
+    parser.add_argument("--parse-only", action="store_true", help="Only run the parser micro-benchmark")
+    parser.add_argument("--parser", choices=list(PARSER_BACKENDS), default=wc.PARSER_BACKEND,
+                        help="Parser used by the crawl stages")
+    parser.add_argument("--throttle", action="store_true", help="Keep adaptive rate control on during the crawl stages")
+    parser.add_argument("--discovery-source", choices=list(wc.DISCOVERY_SOURCES), default="links",
+                        help="Discovery input for the discovery stage (recorded corpora rarely include sitemaps)")
+    parser.add_argument("--skip-discovery", action="store_true", help="Only benchmark product scraping and parsing")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Re-run the product stage in incremental mode after the full crawl")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Also run the product stage sharded over this many in-process workers")
+    parser.add_argument("--shard-size", type=int, default=wc.SHARD_SIZE, help="URLs per shard with --workers")
+    parser.add_argument("--output", type=str, help="Also write the report to this JSON file")
+    args = parser.parse_args()
+    wc.PARSER_BACKEND = args.parser
+
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    wc.start_parse_pool()
+    try:
+        report = asyncio.run(run_benchmark(args))
+    finally:
+        wc.stop_parse_pool()
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Chrome driver factory.
+
+The crawler only reads DOM text and `src`/`href` attributes, so the lean
+profile keeps Chrome from downloading what it never looks at: images,
+media and fonts are blocked through DevTools (`Network.setBlockedURLs`) and
+content settings, analytics/ads hosts are blocked outright, navigation
+returns at DOMContentLoaded (`page_load_strategy='eager'`) and the
+renderer's JS heap is capped so more drivers fit on one host.
+
+`PoolRenderer` is the blocking `(url, wait_selector) -> html` render step
+`SeleniumFetcher` runs, on drivers leased from a `DriverPool`.
+"""
+
+import logging
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from crawling.fetchers import USER_AGENT
+
+BLOCKED_RESOURCE_PATTERNS = [
+    # Images
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp", "*.avif",
+    # Media
+    "*.mp4", "*.webm", "*.ogg", "*.mp3", "*.wav", "*.m4a", "*.mov",
+    # Fonts
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+]
+
+BLOCKED_THIRD_PARTY_PATTERNS = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*googleadservices.com*",
+    "*googlesyndication.com*",
+    "*facebook.net*",
+    "*connect.facebook.com*",
+    "*hotjar.com*",
+    "*clarity.ms*",
+    "*linkedin.com/px*",
+    "*snap.licdn.com*",
+    "*bat.bing.com*",
+    "*youtube.com/embed*",
+    "*newrelic.com*",
+    "*nr-data.net*",
+    "*onetrust.com*",
+    "*cookielaw.org*",
+]
+
+# 2 = block for every site
+LEAN_CONTENT_SETTINGS = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.default_content_setting_values.notifications": 2,
+    "profile.default_content_setting_values.geolocation": 2,
+    "profile.default_content_setting_values.media_stream": 2,
+    "profile.default_content_setting_values.automatic_downloads": 2,
+}
+
+RENDERER_MEMORY_MB = 512
+
+
+def build_chrome_options(lean: bool = True, user_agent: str = USER_AGENT,
+                         renderer_memory_mb: int = RENDERER_MEMORY_MB) -> Options:
+    opts = Options()
+    opts.add_argument("--headless=new")
+    opts.add_argument("--disable-gpu")
+    opts.add_argument("--no-sandbox")
+    opts.add_argument("--disable-dev-shm-usage")
+    opts.add_argument("--log-level=3")
+    opts.add_experimental_option("excludeSwitches", ["enable-logging"])
+    opts.add_argument(f"user-agent={user_agent}")
+
+    if lean:
+        opts.page_load_strategy = "eager"
+        opts.add_experimental_option("prefs", LEAN_CONTENT_SETTINGS)
+        opts.add_argument("--blink-settings=imagesEnabled=false")
+        opts.add_argument("--mute-audio")
+        opts.add_argument("--disable-extensions")
+        opts.add_argument("--disable-background-networking")
+        opts.add_argument("--disable-component-update")
+        opts.add_argument("--disable-default-apps")
+        opts.add_argument("--disable-sync")
+        opts.add_argument("--no-first-run")
+        opts.add_argument("--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication")
+        # Cap each renderer's V8 heap and keep a single renderer per driver
+        opts.add_argument(f"--js-flags=--max-old-space-size={renderer_memory_mb}")
+        opts.add_argument("--renderer-process-limit=1")
+        opts.add_argument("--disk-cache-size=1")
+        opts.add_argument("--media-cache-size=1")
+
+    return opts
+
+
+def block_requests(driver: webdriver.Chrome, patterns=None) -> None:
+    """Makes Chrome fail matching requests before they hit the network."""
+    patterns = patterns if patterns is not None else BLOCKED_RESOURCE_PATTERNS + BLOCKED_THIRD_PARTY_PATTERNS
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+
+def create_chrome_driver(chromedriver_path: str, lean: bool = True, read_timeout: int = 300,
+                         user_agent: str = USER_AGENT) -> webdriver.Chrome:
+    """Creates a headless Chrome driver, using the lean crawl profile unless `lean` is False."""
+    service = Service(chromedriver_path, service_args=[f"--read-timeout={read_timeout}"])
+    driver = webdriver.Chrome(service=service, options=build_chrome_options(lean, user_agent))
+    if lean:
+        try:
+            block_requests(driver)
+        except WebDriverException as e:
+            logging.warning(f"[BROWSER] Could not enable request blocking: {e}")
+    return driver
+
+
+class PoolRenderer:
+    """
+    Loads a page in a driver leased from `pool` and returns the rendered
+    HTML ("" on failure). A wait timeout still returns what was rendered;
+    a driver that raises is discarded by the pool instead of being reused.
+    """
+
+    def __init__(self, pool, wait_timeout: float = 30):
+        self.pool = pool
+        self.wait_timeout = wait_timeout
+
+    def __call__(self, url: str, wait_selector: str = None) -> str:
+        try:
+            with self.pool.lease() as driver:
+                driver.get(url)
+                if wait_selector:
+                    try:
+                        WebDriverWait(driver, self.wait_timeout).until(
+                            EC.presence_of_element_located(("css selector", wait_selector))
+                        )
+                    except TimeoutException:
+                        title = driver.title
+                        logging.warning(f"[FETCH] Timeout on {url}. Page Title: '{title}'")
+                        if "Access Denied" in title or "Pardon" in title:
+                            logging.error("BLOCKED: WEG has detected the crawler as a bot.")
+                return driver.page_source
+        except Exception as e:
+            logging.error(f"[FETCH] Error {url}: {e}")
+            return ""
@@ -0,0 +1,447 @@
+"""
+Sharded crawling across several crawler processes.
+
+A coordinator splits a job's URLs into shards and keeps them in a
+`ShardLedger` (SQLite, next to the frontier). Workers ask for work, get a
+shard under a lease, keep the lease alive with heartbeats and send the
+scraped results back; the coordinator writes them to its sinks and marks
+the shard done. A worker that dies stops heartbeating, its lease runs out
+and the shard goes to the next worker that asks. A result that arrives
+after its shard was already completed elsewhere is ignored, so a shard is
+written exactly once even if it was scraped twice.
+
+Everything travels as JSON over a `MessageBus`: `MqttBus` on top of an
+aiomqtt client, or `InProcessBroker` for tests and benchmarks in a single
+process. Topics, under `indumine/crawler/cluster`:
+
+    announce         coordinator -> all   a job has shards to hand out
+    claim            worker -> coord.     {worker, slots}: ready for `slots` shards
+    assign/<worker>  coordinator -> one   {job_id, shard_id, urls, lease_s}
+    heartbeat        worker -> coord.     {worker, shards: [[job_id, shard_id], ...]}
+    result           worker -> coord.     {worker, job_id, shard_id, ok, result | error}
+    done             coordinator -> all   the job is finished
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable, Optional
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+CLUSTER_PREFIX = "indumine/crawler/cluster"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    job_id      TEXT NOT NULL,
+    shard_id    INTEGER NOT NULL,
+    state       TEXT NOT NULL,
+    urls        TEXT NOT NULL,
+    worker      TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT,
+    PRIMARY KEY (job_id, shard_id)
+);
+CREATE INDEX IF NOT EXISTS ix_shards_state ON shards (job_id, state, shard_id);
+"""
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """MQTT topic filter matching, with `+` and `#` wildcards."""
+    parts = topic.split("/")
+    for i, level in enumerate(pattern.split("/")):
+        if level == "#":
+            return True
+        if i >= len(parts) or (level != "+" and level != parts[i]):
+            return False
+    return len(parts) == len(pattern.split("/"))
+
+
+# ----------------------------------------------------------------------
+# Shard ledger
+# ----------------------------------------------------------------------
+
+class ShardLedger:
+    def __init__(self, path, max_attempts: int = 3):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def create(self, job_id: str, urls: Iterable[str], shard_size: int) -> int:
+        """Splits `urls` into shards of `shard_size`, replacing any shards of the same job; returns the shard count."""
+        urls = list(urls)
+        self.conn.execute("DELETE FROM shards WHERE job_id = ?", (job_id,))
+        self.conn.executemany(
+            "INSERT INTO shards (job_id, shard_id, state, urls) VALUES (?, ?, ?, ?)",
+            ((job_id, n, PENDING, json.dumps(urls[i:i + shard_size]))
+             for n, i in enumerate(range(0, len(urls), shard_size))),
+        )
+        self.conn.commit()
+        return -(-len(urls) // shard_size)
+
+    def resume(self, job_id: str) -> int:
+        """Puts the shards that were leased when the coordinator stopped back in the queue."""
+        cur = self.conn.execute(
+            "UPDATE shards SET state = ?, worker = NULL, lease_until = NULL WHERE job_id = ? AND state = ?",
+            (PENDING, job_id, LEASED),
+        )
+        self.conn.commit()
+        return cur.rowcount
+
+    def lease(self, job_id: str, worker: str, lease_seconds: float) -> Optional[tuple[int, list[str]]]:
+        row = self.conn.execute(
+            "SELECT shard_id, urls FROM shards WHERE job_id = ? AND state = ? ORDER BY shard_id LIMIT 1",
+            (job_id, PENDING),
+        ).fetchone()
+        if row is None:
+            return None
+        self.conn.execute(
+            "UPDATE shards SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1 "
+            "WHERE job_id = ? AND shard_id = ?",
+            (LEASED, worker, time.time() + lease_seconds, job_id, row[0]),
+        )
+        self.conn.commit()
+        return row[0], json.loads(row[1])
+
+    def renew(self, job_id: str, shard_id: int, worker: str, lease_seconds: float) -> bool:
+        cur = self.conn.execute(
+            "UPDATE shards SET lease_until = ? WHERE job_id = ? AND shard_id = ? AND state = ? AND worker = ?",
+            (time.time() + lease_seconds, job_id, shard_id, LEASED, worker),
+        )
+        self.conn.commit()
+        return cur.rowcount > 0
+
+    def is_open(self, job_id: str, shard_id: int) -> bool:
+        """True while the shard still needs a result (pending or leased, to anyone)."""
+        row = self.conn.execute(
+            "SELECT state FROM shards WHERE job_id = ? AND shard_id = ?", (job_id, shard_id)
+        ).fetchone()
+        return row is not None and row[0] in (PENDING, LEASED)
+
+    def complete(self, job_id: str, shard_id: int) -> None:
+        self.conn.execute(
+            "UPDATE shards SET state = ?, lease_until = NULL, error = NULL WHERE job_id = ? AND shard_id = ?",
+            (DONE, job_id, shard_id),
+        )
+        self.conn.commit()
+
+    def release(self, job_id: str, shard_id: int, error: str = "") -> bool:
+        """Returns a shard to the queue after a failure; returns True when it used up `max_attempts`."""
+        row = self.conn.execute(
+            "SELECT attempts FROM shards WHERE job_id = ? AND shard_id = ?", (job_id, shard_id)
+        ).fetchone()
+        gave_up = row is None or row[0] >= self.max_attempts
+        self.conn.execute(
+            "UPDATE shards SET state = ?, worker = NULL, lease_until = NULL, error = ? WHERE job_id = ? AND shard_id = ?",
+            (FAILED if gave_up else PENDING, error[:500], job_id, shard_id),
+        )
+        self.conn.commit()
+        return gave_up
+
+    def expire(self, job_id: str) -> list[int]:
+        """Releases every lease that ran out; returns the affected shard ids."""
+        expired = [r[0] for r in self.conn.execute(
+            "SELECT shard_id FROM shards WHERE job_id = ? AND state = ? AND lease_until < ?",
+            (job_id, LEASED, time.time()),
+        )]
+        for shard_id in expired:
+            self.release(job_id, shard_id, "lease expired")
+        return expired
+
+    def counts(self, job_id: str) -> dict:
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for state, n in self.conn.execute(
+            "SELECT state, COUNT(*) FROM shards WHERE job_id = ? GROUP BY state", (job_id,)
+        ):
+            counts[state] = n
+        return counts
+
+    def page_counts(self, job_id: str) -> dict:
+        """Like `counts`, in URLs instead of shards."""
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for state, n in self.conn.execute(
+            "SELECT state, SUM(json_array_length(urls)) FROM shards WHERE job_id = ? GROUP BY state", (job_id,)
+        ):
+            counts[state] = n or 0
+        return counts
+
+    def finished(self, job_id: str) -> bool:
+        counts = self.counts(job_id)
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+
+
+# ----------------------------------------------------------------------
+# Message buses
+# ----------------------------------------------------------------------
+
+class MqttBus:
+    """
+    JSON messages over an aiomqtt client. Messages only reach `messages()`
+    once they are handed to `dispatch()`, either by `pump()` or by a loop
+    that also reads other topics from the same client (the crawler manager).
+    """
+
+    def __init__(self, client, qos: int = 1):
+        self.client = client
+        self.qos = qos
+        self.filters = []
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, pattern: str) -> None:
+        self.filters.append(pattern)
+        await self.client.subscribe(pattern, qos=self.qos)
+
+    async def publish(self, topic: str, payload: dict) -> None:
+        await self.client.publish(topic, json.dumps(payload, default=str), qos=self.qos)
+
+    def dispatch(self, topic: str, raw) -> bool:
+        """Queues a received message if it matches one of our subscriptions."""
+        if not any(topic_matches(p, topic) for p in self.filters):
+            return False
+        try:
+            self.queue.put_nowait((topic, json.loads(raw)))
+        except ValueError as e:
+            logging.error(f"[CLUSTER] Invalid message on {topic}: {e}")
+        return True
+
+    async def pump(self) -> None:
+        async for message in self.client.messages:
+            self.dispatch(str(message.topic), message.payload)
+
+    async def messages(self):
+        while True:
+            yield await self.queue.get()
+
+
+class InProcessBus:
+    def __init__(self, broker: "InProcessBroker"):
+        self.broker = broker
+        self.filters = []
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, pattern: str) -> None:
+        self.filters.append(pattern)
+
+    async def publish(self, topic: str, payload: dict) -> None:
+        self.broker.route(topic, json.dumps(payload, default=str))
+
+    async def messages(self):
+        while True:
+            yield await self.queue.get()
+
+
+class InProcessBroker:
+    """Stand-in for an MQTT broker when coordinator and workers share one event loop."""
+
+    def __init__(self):
+        self.clients = []
+
+    def connect(self) -> InProcessBus:
+        bus = InProcessBus(self)
+        self.clients.append(bus)
+        return bus
+
+    def route(self, topic: str, raw: str) -> None:
+        for bus in self.clients:
+            if any(topic_matches(p, topic) for p in bus.filters):
+                # Decoded per subscriber, like a real broker delivering separate copies
+                bus.queue.put_nowait((topic, json.loads(raw)))
+
+
+# ----------------------------------------------------------------------
+# Roles
+# ----------------------------------------------------------------------
+
+class Coordinator:
+    """
+    Hands out the shards of `job_id` and passes each result to
+    `on_result(shard_id, result)`. If `on_result` raises, the shard goes
+    back to the queue. `run()` returns the final shard counts.
+    """
+
+    def __init__(self, bus, ledger: ShardLedger, job_id: str,
+                 on_result: Callable[[int, dict], Awaitable[None]],
+                 lease_seconds: float = 120.0, reap_interval: float = 5.0, prefix: str = CLUSTER_PREFIX):
+        self.bus = bus
+        self.ledger = ledger
+        self.job_id = job_id
+        self.on_result = on_result
+        self.lease_seconds = lease_seconds
+        self.reap_interval = reap_interval
+        self.prefix = prefix
+        self.waiting = {}  # worker -> free slots
+        self.workers = set()
+        self._finished = asyncio.Event()
+
+    async def run(self) -> dict:
+        for name in ("claim", "heartbeat", "result"):
+            await self.bus.subscribe(f"{self.prefix}/{name}")
+        await self.bus.publish(f"{self.prefix}/announce", {"job_id": self.job_id})
+        self._check_finished()
+
+        tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._reap())]
+        try:
+            await self._finished.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        counts = self.ledger.counts(self.job_id)
+        await self.bus.publish(f"{self.prefix}/done", {"job_id": self.job_id, "shards": counts})
+        logging.info(f"[CLUSTER] Job {self.job_id} finished on {len(self.workers)} workers: {counts}")
+        return counts
+
+    def _check_finished(self) -> None:
+        if self.ledger.finished(self.job_id):
+            self._finished.set()
+
+    async def _listen(self) -> None:
+        async for topic, payload in self.bus.messages():
+            try:
+                name = topic.rsplit("/", 1)[-1]
+                if name == "claim":
+                    self.waiting[payload["worker"]] = int(payload.get("slots", 1))
+                    await self._assign()
+                elif name == "heartbeat":
+                    for job_id, shard_id in payload.get("shards", []):
+                        if job_id == self.job_id:
+                            self.ledger.renew(job_id, shard_id, payload["worker"], self.lease_seconds)
+                elif name == "result" and payload.get("job_id") == self.job_id:
+                    await self._handle_result(payload)
+            except Exception as e:
+                logging.error(f"[CLUSTER] Error handling {topic}: {e}", exc_info=True)
+
+    async def _handle_result(self, payload: dict) -> None:
+        shard_id = payload["shard_id"]
+        self.workers.add(payload["worker"])
+        if not self.ledger.is_open(self.job_id, shard_id):
+            logging.info(f"[CLUSTER] Ignoring duplicate result for shard {shard_id} from {payload['worker']}")
+            return
+        error = payload.get("error", "")
+        if payload.get("ok"):
+            try:
+                await self.on_result(shard_id, payload["result"])
+                self.ledger.complete(self.job_id, shard_id)
+            except Exception as e:
+                error = f"result not stored: {e}"
+        if error:
+            if self.ledger.release(self.job_id, shard_id, error):
+                logging.error(f"[CLUSTER] Giving up on shard {shard_id}: {error}")
+            else:
+                logging.warning(f"[CLUSTER] Shard {shard_id} failed on {payload['worker']}, re-queued: {error}")
+            await self._assign()
+        self._check_finished()
+
+    async def _assign(self) -> None:
+        for worker, slots in list(self.waiting.items()):
+            while slots > 0:
+                shard = self.ledger.lease(self.job_id, worker, self.lease_seconds)
+                if shard is None:
+                    return
+                shard_id, urls = shard
+                slots -= 1
+                self.waiting[worker] = slots
+                await self.bus.publish(f"{self.prefix}/assign/{worker}", {
+                    "job_id": self.job_id, "shard_id": shard_id, "urls": urls, "lease_s": self.lease_seconds,
+                })
+            del self.waiting[worker]
+
+    async def _reap(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            expired = self.ledger.expire(self.job_id)
+            if expired:
+                logging.warning(f"[CLUSTER] Leases expired for shards {expired}; reassigning")
+                await self._assign()
+            self._check_finished()
+
+
+class Worker:
+    """
+    Claims shards and runs `process(urls) -> dict` on each, with up to
+    `slots` shards at once. Runs until cancelled, or until a job ends when
+    `stop_on_done` is set.
+    """
+
+    def __init__(self, bus, worker_id: str, process: Callable[[list[str]], Awaitable[dict]],
+                 slots: int = 1, heartbeat_interval: float = 30.0, prefix: str = CLUSTER_PREFIX):
+        self.bus = bus
+        self.worker_id = worker_id
+        self.process = process
+        self.slots = slots
+        self.heartbeat_interval = heartbeat_interval
+        self.prefix = prefix
+        self.active = {}  # (job_id, shard_id) -> task
+        self.shards_done = 0
+
+    async def run(self, stop_on_done: bool = False) -> None:
+        await self.bus.subscribe(f"{self.prefix}/assign/{self.worker_id}")
+        await self.bus.subscribe(f"{self.prefix}/announce")
+        await self.bus.subscribe(f"{self.prefix}/done")
+        await self._claim()
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            async for topic, payload in self.bus.messages():
+                name = topic.rsplit("/", 1)[-1]
+                if name == "announce":
+                    await self._claim()
+                elif name == "done":
+                    if stop_on_done:
+                        break
+                elif topic.endswith(f"/assign/{self.worker_id}"):
+                    key = (payload["job_id"], payload["shard_id"])
+                    self.active[key] = asyncio.create_task(self._run_shard(key, payload["urls"]))
+        finally:
+            heartbeat.cancel()
+            for task in self.active.values():
+                task.cancel()
+
+    async def _claim(self) -> None:
+        free = self.slots - len(self.active)
+        if free > 0:
+            await self.bus.publish(f"{self.prefix}/claim", {"worker": self.worker_id, "slots": free})
+
+    async def _run_shard(self, key, urls: list[str]) -> None:
+        job_id, shard_id = key
+        message = {"worker": self.worker_id, "job_id": job_id, "shard_id": shard_id}
+        try:
+            message.update(ok=True, result=await self.process(urls))
+            self.shards_done += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"[CLUSTER] Shard {shard_id} of job {job_id} failed: {e}")
+            message.update(ok=False, error=str(e))
+        self.active.pop(key, None)
+        await self.bus.publish(f"{self.prefix}/result", message)
+        await self._claim()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if self.active:
+                await self.bus.publish(f"{self.prefix}/heartbeat", {
+                    "worker": self.worker_id, "shards": [list(key) for key in self.active],
+                })
@@ -0,0 +1,278 @@
+"""
+Bounded, self-healing pool of Selenium drivers.
+
+`DriverPool.lease()` hands out a driver for one page:
+
+    with pool.lease() as driver:
+        driver.get(url)
+
+- At most `max_size` drivers ever exist; callers wait (up to `acquire_timeout`)
+  instead of creating extra ones.
+- A lease that raises discards its driver instead of returning it.
+- Drivers are recycled after `max_pages` pages or when Chrome's resident
+  memory exceeds `max_rss_mb` (needs psutil), and idle ones are probed
+  before reuse.
+- The pool grows on demand up to the cap and drivers idle for longer than
+  `idle_timeout` are closed, down to `min_size`.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
+
+@dataclass
+class PooledDriver:
+    driver: object
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    pages: int = 0
+    generation: int = 0
+
+
+def driver_rss_mb(driver) -> Optional[float]:
+    """Resident memory of chromedriver plus every Chrome process it spawned, in MB."""
+    if not PSUTIL_AVAILABLE:
+        return None
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        procs = [root] + root.children(recursive=True)
+    except (AttributeError, psutil.Error):
+        return None
+
+    total = 0
+    for proc in procs:
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / (1024 * 1024)
+
+
+def driver_is_alive(driver) -> bool:
+    try:
+        driver.execute_script("return 1")
+        return True
+    except Exception:
+        return False
+
+
+class DriverPool:
+    def __init__(self, factory: Callable[[], object], max_size: int, min_size: int = 0,
+                 max_pages: int = 200, max_rss_mb: Optional[float] = 1500,
+                 idle_timeout: float = 300.0, health_check_interval: float = 30.0,
+                 acquire_timeout: Optional[float] = 120.0):
+        self.factory = factory
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._leased = 0
+        self._waiting = 0
+        self._generation = 0
+
+        self.created = 0
+        self.recycled = 0
+        self.failed = 0
+        self.leases = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # ------------------------------------------------------------------
+    # Leasing
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        pooled = self.acquire(timeout)
+        healthy = False
+        try:
+            yield pooled.driver
+            healthy = True
+        finally:
+            self.release(pooled, healthy)
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledDriver:
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+
+        while True:
+            pooled, create = self._take_slot(deadline)
+            if create:
+                pooled = self._create()
+            elif not self._usable(pooled):
+                self._discard(pooled, reason="failed health check")
+                continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._leased += 1
+                self.leases += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return pooled
+
+    def _take_slot(self, deadline):
+        """Returns (idle driver, False) or (None, True) once a new driver may be created."""
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        return self._idle.pop(), False
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None, True
+
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"No Chrome driver available after waiting (pool size {self._size})")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+    def _create(self) -> PooledDriver:
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self.failed += 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.created += 1
+            return PooledDriver(driver, generation=self._generation)
+
+    def _usable(self, pooled: PooledDriver) -> bool:
+        if time.monotonic() - pooled.last_used < self.health_check_interval:
+            return True
+        return driver_is_alive(pooled.driver)
+
+    def release(self, pooled: PooledDriver, healthy: bool = True) -> None:
+        pooled.pages += 1
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._leased -= 1
+
+        reason = None
+        if pooled.generation != self._generation:
+            reason = "pool closed"
+        elif not healthy:
+            reason = "error during lease"
+        elif self.max_pages and pooled.pages >= self.max_pages:
+            reason = f"served {pooled.pages} pages"
+        elif self.max_rss_mb:
+            rss = driver_rss_mb(pooled.driver)
+            if rss is not None and rss > self.max_rss_mb:
+                reason = f"RSS {rss:.0f} MB"
+
+        if reason:
+            self._discard(pooled, reason)
+        else:
+            with self._cond:
+                self._idle.append(pooled)
+                self._cond.notify()
+
+        self.reap_idle()
+
+    def _discard(self, pooled: PooledDriver, reason: str) -> None:
+        logging.info(f"[POOL] Recycling driver ({reason})")
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self.recycled += 1
+            self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # Sizing
+    # ------------------------------------------------------------------
+
+    def prewarm(self, count: int) -> int:
+        """Starts up to `count` drivers ahead of time; returns how many were created."""
+        started = []
+        for _ in range(min(count, self.max_size)):
+            with self._cond:
+                if self._size >= self.max_size:
+                    break
+                self._size += 1
+            try:
+                started.append(self._create())
+            except Exception as e:
+                logging.warning(f"[POOL] Failed to initialize driver: {e}")
+        with self._cond:
+            self._idle.extend(started)
+            self._cond.notify_all()
+        return len(started)
+
+    def reap_idle(self) -> None:
+        """Closes drivers idle for longer than `idle_timeout` while nobody is waiting."""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            if self._waiting:
+                return
+            # Oldest idle drivers sit at the left of the deque
+            while self._idle and self._size - len(expired) > self.min_size \
+                    and now - self._idle[0].last_used > self.idle_timeout:
+                expired.append(self._idle.popleft())
+        for pooled in expired:
+            self._discard(pooled, reason="idle")
+
+    def close(self) -> None:
+        """Quits every idle driver; drivers still leased are quit when released."""
+        with self._cond:
+            self._generation += 1
+            idle = list(self._idle)
+            self._idle.clear()
+        for pooled in idle:
+            try:
+                pooled.driver.quit()
+            except Exception:
+                pass
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "leased": self._leased,
+                "waiting": self._waiting,
+                "max_size": self.max_size,
+                "utilization": round(self._leased / self.max_size, 3) if self.max_size else 0.0,
+                "created": self.created,
+                "recycled": self.recycled,
+                "failed": self.failed,
+                "leases": self.leases,
+                "avg_wait_ms": round(self._wait_total * 1000 / self.leases, 1) if self.leases else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 1),
+            }
@@ -0,0 +1,195 @@
+"""
+The crawl engine every entry point runs on.
+
+A crawl is assembled from pluggable parts:
+
+- a source handing out `(url, meta)` pairs: `FrontierSource` (the SQLite
+  frontier, resumable) or `QueueSource` (in-memory, for one-off crawls)
+- a scrape coroutine `(url, meta) -> result`, usually a `PageScraper`:
+  any fetcher from `crawling.fetchers` plus an extractor from
+  `crawling.parsing`, run in the parse pool
+- `on_result(url, meta, result)` and `on_error(url, meta, exc)`, where the
+  caller writes to its sinks and queues the links it found
+- optionally a `JobControl` (pause, cancel, budget) and `CrawlMetrics`
+
+`CrawlEngine.run()` keeps up to `max_workers` pages in flight and refills
+a slot as soon as any page finishes, so dispatch tuning lands in one place
+and `benchmark.py` can time it without the frontier or the sinks.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Iterable, Optional
+
+from crawling.urlseen import UrlSeen
+
+
+class FrontierSource:
+    """
+    Claims URLs of one frontier job. With `prefetch`, claims are made in
+    batches of at least that many; URLs claimed but never started stay
+    in flight and return to pending when the job is resumed.
+    """
+
+    def __init__(self, frontier, job_id: str, prefetch: int = 0):
+        self.frontier = frontier
+        self.job_id = job_id
+        self.prefetch = prefetch
+        self.buffer = deque()
+
+    def claim(self, limit: int) -> list[tuple]:
+        if len(self.buffer) < limit:
+            self.buffer.extend(self.frontier.claim(self.job_id, max(limit - len(self.buffer), self.prefetch)))
+        return [self.buffer.popleft() for _ in range(min(limit, len(self.buffer)))]
+
+
+class QueueSource:
+    """
+    In-memory FIFO: every URL is handed out once, and URLs in `skip`
+    (e.g. already scraped by an earlier run) are dropped when claimed.
+    """
+
+    def __init__(self, urls: Iterable[str] = (), skip=None):
+        self.pending = deque()
+        self.seen = UrlSeen()
+        self.skip = skip
+        self.added = 0
+        self.skipped = 0
+        self.add(urls)
+
+    def add(self, urls: Iterable[str], meta=None) -> int:
+        """Queues the URLs not seen before; returns how many were new."""
+        added = 0
+        for url in urls:
+            if self.seen.add(url):
+                self.pending.append((url, meta))
+                added += 1
+        self.added += added
+        return added
+
+    def claim(self, limit: int) -> list[tuple]:
+        claimed = []
+        while self.pending and len(claimed) < limit:
+            url, meta = self.pending.popleft()
+            if self.skip is not None and url in self.skip:
+                self.skipped += 1
+                continue
+            claimed.append((url, meta))
+        return claimed
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+
+class PageScraper:
+    """
+    Fetches a page and runs `extract(html, url)` on it in `parse_pool`
+    (a process pool needs a picklable extractor, like the ones in
+    `crawling.parsing`). An empty response raises, so `on_error` decides
+    about retries; a 404 is extracted like an empty page.
+    """
+
+    def __init__(self, fetcher, extract: Callable[[str, str], object], parse_pool=None,
+                 wait_selector: Optional[str] = None, required_selector: Optional[str] = None, metrics=None):
+        self.fetcher = fetcher
+        self.extract = extract
+        self.parse_pool = parse_pool
+        self.wait_selector = wait_selector
+        self.required_selector = required_selector
+        self.metrics = metrics
+
+    async def __call__(self, url: str, meta=None):
+        result = await self.fetcher.fetch(url, self.wait_selector, self.required_selector)
+        if not result.html and result.status != 404:
+            raise RuntimeError(f"Empty response (status {result.status})")
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        extracted = await loop.run_in_executor(self.parse_pool, self.extract, result.html, url)
+        if self.metrics:
+            self.metrics.observe_parse(time.perf_counter() - start)
+        return extracted
+
+
+class CrawlEngine:
+    def __init__(self, source, scrape: Callable[[str, object], Awaitable[object]],
+                 on_result: Callable[[str, object, object], Awaitable[None]],
+                 on_error: Optional[Callable[[str, object, Exception], Awaitable[None]]] = None,
+                 max_workers: int = 8, control=None, metrics=None):
+        self.source = source
+        self.scrape = scrape
+        self.on_result = on_result
+        self.on_error = on_error
+        self.max_workers = max_workers
+        self.control = control
+        self.metrics = metrics
+        self.in_flight = 0
+        self.pages = 0
+        self.errors = 0
+        self.busy = 0.0     # worker-seconds spent on pages
+        self.elapsed = 0.0
+
+    async def run(self) -> Optional[str]:
+        """
+        Crawls until the source runs dry (with nothing in flight) or
+        `control` stops it. Returns `control.outcome()`: None when the crawl
+        ran to the end. Without `on_error`, a failed page ends the crawl.
+        """
+        control = self.control
+        tasks = {}
+        started = time.monotonic()
+        try:
+            while True:
+                free = self.max_workers - len(tasks)
+                if control:
+                    free = control.claim_limit(len(tasks), free)
+                if free > 0:
+                    claimed = self.source.claim(free)
+                    for url, meta in claimed:
+                        tasks[asyncio.ensure_future(self.scrape(url, meta))] = (url, meta)
+                    if control:
+                        control.started(len(claimed))
+                if control and control.should_wait(len(tasks)):
+                    await control.wait_running()
+                    continue
+                if not tasks:
+                    break
+                self._set_in_flight(len(tasks))
+
+                waited = time.monotonic()
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                self.busy += len(tasks) * (time.monotonic() - waited)
+
+                for fut in done:
+                    url, meta = tasks.pop(fut)
+                    self._set_in_flight(len(tasks))
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        self.errors += 1
+                        if self.on_error is None:
+                            raise
+                        await self.on_error(url, meta, e)
+                        continue
+                    self.pages += 1
+                    await self.on_result(url, meta, result)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._set_in_flight(0)
+            self.elapsed += time.monotonic() - started
+        return control.outcome() if control else None
+
+    def _set_in_flight(self, n: int) -> None:
+        self.in_flight = n
+        if self.metrics:
+            self.metrics.set_gauge("in_flight", n)
+
+    def utilization(self) -> float:
+        """Share of the worker slots that had a page in flight."""
+        return self.busy / (self.elapsed * self.max_workers) if self.elapsed else 0.0
+
+    def log_stats(self, tag: str) -> None:
+        logging.info(f"[{tag}] {self.pages} pages, {self.errors} errors, "
+                     f"worker utilization {self.utilization():.0%} over {self.elapsed:.1f}s")
@@ -0,0 +1,216 @@
+"""
+Fetch engines for the crawler.
+
+Every engine turns a URL into a `FetchResult` holding the raw HTML, so the
+parsing code never needs to know whether a page came from a plain HTTP
+request or from a headless Chrome render.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from bs4 import BeautifulSoup
+
+from crawling.parsing import LXML_AVAILABLE
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+    # httpx logs every request at INFO, which floods the crawler log
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+)
+
+FETCH_MODES = ("http", "selenium", "hybrid")
+
+
+@dataclass
+class FetchResult:
+    url: str
+    html: str
+    status: int = 200
+    engine: str = ""
+    elapsed: float = 0.0
+    headers: dict = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300 and bool(self.html)
+
+
+def has_selector(html: str, selector: Optional[str]) -> bool:
+    """
+    True when `selector` matches something in `html` (always True without
+    a selector). This is a full parse: `HybridFetcher` runs it off the
+    event loop.
+    """
+    if not selector:
+        return True
+    if not html:
+        return False
+    return BeautifulSoup(html, "lxml" if LXML_AVAILABLE else "html.parser").select_one(selector) is not None
+
+
+class HttpFetcher:
+    """
+    Plain async HTTP client: one pooled connection set per host with
+    keep-alive and transparent gzip/deflate (br/zstd when the optional
+    decoders are installed). No JavaScript is executed.
+    """
+
+    engine = "http"
+
+    def __init__(self, max_connections: int = 16, timeout: float = 30.0, user_agent: str = USER_AGENT):
+        if not HTTPX_AVAILABLE:
+            raise RuntimeError("httpx is not installed")
+        self.client = httpx.AsyncClient(
+            headers={
+                "User-Agent": user_agent,
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "en-US,en;q=0.9",
+            },
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60.0,
+            ),
+            timeout=httpx.Timeout(timeout),
+            follow_redirects=True,
+        )
+
+    async def fetch(self, url: str, wait_selector: Optional[str] = None,
+                    required_selector: Optional[str] = None, headers: Optional[dict] = None) -> FetchResult:
+        start = time.perf_counter()
+        response = await self.client.get(url, headers=headers)
+        return FetchResult(
+            url=url,
+            html=response.text,
+            status=response.status_code,
+            engine=self.engine,
+            elapsed=time.perf_counter() - start,
+            headers=dict(response.headers),
+        )
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class SeleniumFetcher:
+    """
+    Renders pages with headless Chrome. `render` is the blocking
+    `(url, wait_selector) -> html` callable that owns the driver pool; it
+    runs on `executor` so the event loop never waits on a driver.
+    """
+
+    engine = "selenium"
+
+    def __init__(self, render: Callable[[str, Optional[str]], str], executor=None):
+        self.render = render
+        self.executor = executor
+
+    async def fetch(self, url: str, wait_selector: Optional[str] = None,
+                    required_selector: Optional[str] = None, headers: Optional[dict] = None) -> FetchResult:
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        html = await loop.run_in_executor(self.executor, self.render, url, wait_selector)
+        return FetchResult(
+            url=url,
+            html=html or "",
+            status=200 if html else 0,
+            engine=self.engine,
+            elapsed=time.perf_counter() - start,
+        )
+
+    async def aclose(self) -> None:
+        pass
+
+
+class HybridFetcher:
+    """
+    Tries the HTTP engine first and only falls back to Selenium when the
+    response failed or lacks the selector the caller needs (i.e. the
+    content is rendered client-side). `check` runs off the event loop on
+    `check_executor` (a process pool needs a picklable check).
+    """
+
+    engine = "hybrid"
+
+    def __init__(self, http: HttpFetcher, selenium: SeleniumFetcher,
+                 check: Callable[[str, Optional[str]], bool] = has_selector, check_executor=None):
+        self.http = http
+        self.selenium = selenium
+        self.check = check
+        self.check_executor = check_executor
+        self.http_hits = 0
+        self.fallbacks = 0
+
+    async def fetch(self, url: str, wait_selector: Optional[str] = None,
+                    required_selector: Optional[str] = None, headers: Optional[dict] = None) -> FetchResult:
+        """
+        `wait_selector` is what Selenium waits for; `required_selector`
+        (defaults to `wait_selector`) decides whether the HTTP body is usable.
+        Conditional `headers` only reach the HTTP engine; a 304 is final.
+        """
+        try:
+            result = await self.http.fetch(url, wait_selector, headers=headers)
+            if result.status in (304, 404):
+                self.http_hits += 1
+                return result
+            if result.ok and await self.usable(result.html, required_selector or wait_selector):
+                self.http_hits += 1
+                return result
+        except Exception as e:
+            logging.debug(f"[FETCH] HTTP failed for {url}: {e}")
+
+        self.fallbacks += 1
+        return await self.selenium.fetch(url, wait_selector)
+
+    async def usable(self, html: str, selector: Optional[str]) -> bool:
+        if not selector:
+            return True
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.check_executor, self.check, html, selector)
+
+    async def aclose(self) -> None:
+        total = self.http_hits + self.fallbacks
+        if total:
+            logging.info(
+                f"[FETCH] {self.http_hits}/{total} pages served over HTTP, "
+                f"{self.fallbacks} rendered with Selenium"
+            )
+        await self.http.aclose()
+        await self.selenium.aclose()
+
+
+def build_fetcher(mode: str, render: Callable[[str, Optional[str]], str], executor=None,
+                  max_connections: int = 16, timeout: float = 30.0, check_executor=None):
+    """
+    Creates the fetch engine for `mode` ('http', 'selenium' or 'hybrid').
+    HTTP-based modes degrade to Selenium when httpx is not installed.
+    `check_executor` runs the hybrid selector check (see `HybridFetcher`).
+    """
+    if mode not in FETCH_MODES:
+        raise ValueError(f"Unknown fetch mode: {mode}")
+
+    selenium = SeleniumFetcher(render, executor)
+    if mode == "selenium":
+        return selenium
+
+    if not HTTPX_AVAILABLE:
+        logging.warning("httpx not installed, falling back to Selenium for every page.")
+        return selenium
+
+    http = HttpFetcher(max_connections=max_connections, timeout=timeout)
+    if mode == "http":
+        return http
+    return HybridFetcher(http, selenium, check_executor=check_executor)
+
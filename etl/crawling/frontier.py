@@ -0,0 +1,208 @@
+"""
+Persistent crawl frontier.
+
+One SQLite file holds every job and the state of each of its URLs
+(pending -> in_flight -> done | failed, with attempts, depth, priority and
+last fetch time). Writes are committed in checkpoints (every
+`checkpoint_every` changes or `checkpoint_interval` seconds), so a crash
+loses at most the last few seconds of progress; callables in
+`checkpoint_hooks` run after every commit, so state kept beside the
+frontier can be flushed in step with it. On resume, URLs that were in
+flight go back to pending and are fetched again.
+"""
+
+import json
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Iterable, Optional
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id      TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    state       TEXT NOT NULL,
+    meta        TEXT NOT NULL DEFAULT '{}',
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    job_id      TEXT NOT NULL,
+    url         TEXT NOT NULL,
+    state       TEXT NOT NULL,
+    priority    INTEGER NOT NULL DEFAULT 0,
+    depth       INTEGER NOT NULL DEFAULT 0,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    last_fetch  REAL,
+    error       TEXT,
+    PRIMARY KEY (job_id, url)
+);
+CREATE INDEX IF NOT EXISTS ix_urls_claim ON urls (job_id, state, priority DESC, depth);
+"""
+
+
+def new_job_id() -> str:
+    return str(uuid.uuid4())[:8]
+
+
+class Frontier:
+    def __init__(self, path, max_attempts: int = 3, checkpoint_every: int = 200,
+                 checkpoint_interval: float = 5.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+        self._dirty = 0
+        self._last_checkpoint = time.monotonic()
+        self.checkpoint_hooks = []
+
+    # ------------------------------------------------------------------
+    # Checkpointing
+    # ------------------------------------------------------------------
+
+    def _touched(self, count: int = 1) -> None:
+        self._dirty += count
+        if self._dirty >= self.checkpoint_every or time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        self.conn.commit()
+        self._dirty = 0
+        self._last_checkpoint = time.monotonic()
+        for hook in self.checkpoint_hooks:
+            hook()
+
+    def close(self) -> None:
+        self.checkpoint()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+
+    def start_job(self, job_id: str, kind: str, meta: Optional[dict] = None) -> str:
+        """Registers a fresh job, dropping anything stored under the same id."""
+        now = time.time()
+        self.conn.execute("DELETE FROM urls WHERE job_id = ?", (job_id,))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, kind, state, meta, created_at, updated_at) VALUES (?, ?, 'running', ?, ?, ?)",
+            (job_id, kind, json.dumps(meta or {}), now, now),
+        )
+        self.checkpoint()
+        return job_id
+
+    def resume_job(self, job_id: str) -> dict:
+        """Marks a stored job as running again and re-queues the URLs it had in flight."""
+        job = self.get_job(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        self.conn.execute(
+            "UPDATE urls SET state = ? WHERE job_id = ? AND state = ?",
+            (PENDING, job_id, IN_FLIGHT),
+        )
+        self.set_job_state(job_id, "running")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        row = self.conn.execute(
+            "SELECT job_id, kind, state, meta, created_at, updated_at FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0], "kind": row[1], "state": row[2], "meta": json.loads(row[3]),
+            "created_at": row[4], "updated_at": row[5],
+        }
+
+    def set_job_state(self, job_id: str, state: str, meta: Optional[dict] = None) -> None:
+        if meta is None:
+            self.conn.execute("UPDATE jobs SET state = ?, updated_at = ? WHERE job_id = ?", (state, time.time(), job_id))
+        else:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, meta = ?, updated_at = ? WHERE job_id = ?",
+                (state, json.dumps(meta), time.time(), job_id),
+            )
+        self.checkpoint()
+
+    # ------------------------------------------------------------------
+    # URLs
+    # ------------------------------------------------------------------
+
+    def add(self, job_id: str, urls: Iterable[str], depth: int = 0, priority: int = 0) -> int:
+        """Queues URLs the job has not seen yet; returns how many were new."""
+        cur = self.conn.executemany(
+            "INSERT OR IGNORE INTO urls (job_id, url, state, priority, depth) VALUES (?, ?, ?, ?, ?)",
+            ((job_id, url, PENDING, priority, depth) for url in urls),
+        )
+        added = cur.rowcount if cur.rowcount is not None and cur.rowcount >= 0 else 0
+        self._touched(added)
+        return added
+
+    def claim(self, job_id: str, limit: int) -> list[tuple[str, int]]:
+        """Moves up to `limit` pending URLs (highest priority, shallowest first) to in_flight."""
+        rows = self.conn.execute(
+            "SELECT url, depth FROM urls WHERE job_id = ? AND state = ? ORDER BY priority DESC, depth LIMIT ?",
+            (job_id, PENDING, limit),
+        ).fetchall()
+        if rows:
+            now = time.time()
+            self.conn.executemany(
+                "UPDATE urls SET state = ?, attempts = attempts + 1, last_fetch = ? WHERE job_id = ? AND url = ?",
+                ((IN_FLIGHT, now, job_id, url) for url, _ in rows),
+            )
+            self._touched(len(rows))
+        return rows
+
+    def mark_done(self, job_id: str, url: str) -> None:
+        self.conn.execute(
+            "UPDATE urls SET state = ?, error = NULL WHERE job_id = ? AND url = ?", (DONE, job_id, url)
+        )
+        self._touched()
+
+    def mark_failed(self, job_id: str, url: str, error: str = "") -> bool:
+        """Puts the URL back in the queue until it used up `max_attempts`; returns True when it gave up."""
+        attempts = self.conn.execute(
+            "SELECT attempts FROM urls WHERE job_id = ? AND url = ?", (job_id, url)
+        ).fetchone()
+        gave_up = attempts is None or attempts[0] >= self.max_attempts
+        self.conn.execute(
+            "UPDATE urls SET state = ?, error = ? WHERE job_id = ? AND url = ?",
+            (FAILED if gave_up else PENDING, error[:500], job_id, url),
+        )
+        self._touched()
+        return gave_up
+
+    def urls(self, job_id: str, state: Optional[str] = None) -> list[str]:
+        if state is None:
+            rows = self.conn.execute("SELECT url FROM urls WHERE job_id = ?", (job_id,))
+        else:
+            rows = self.conn.execute("SELECT url FROM urls WHERE job_id = ? AND state = ?", (job_id, state))
+        return [r[0] for r in rows]
+
+    def counts(self, job_id: str) -> dict:
+        counts = {PENDING: 0, IN_FLIGHT: 0, DONE: 0, FAILED: 0}
+        for state, n in self.conn.execute(
+            "SELECT state, COUNT(*) FROM urls WHERE job_id = ? GROUP BY state", (job_id,)
+        ):
+            counts[state] = n
+        return counts
@@ -0,0 +1,154 @@
+"""
+Change detection for incremental re-crawls.
+
+`PageIndex` remembers, per product URL, the validators the server sent
+(ETag / Last-Modified), a hash of the raw HTML and a hash of the rows
+extracted from it. A re-crawl checks them cheapest first:
+
+1. Conditional request (`If-None-Match` / `If-Modified-Since`): a 304 means
+   the page was not even downloaded.
+2. HTML hash: an identical body is not parsed again.
+3. Content hash: a page whose markup changed but whose extracted rows did
+   not (rotating tokens, banners...) is not written to the sinks.
+
+Only pages that fail all three checks are parsed and upserted.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url             TEXT PRIMARY KEY,
+    etag            TEXT,
+    last_modified   TEXT,
+    html_hash       TEXT,
+    content_hash    TEXT,
+    fetched_at      REAL NOT NULL,
+    changed_at      REAL NOT NULL
+);
+"""
+
+
+def hash_html(html: str) -> str:
+    return hashlib.blake2b(html.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def hash_rows(rows) -> str:
+    """Order-sensitive hash of extracted [url, feature, value] rows."""
+    payload = json.dumps(rows, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def header_value(headers: dict, name: str) -> Optional[str]:
+    """Case-insensitive lookup in a plain header dict."""
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+@dataclass
+class PageVersion:
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    html_hash: Optional[str] = None
+    content_hash: Optional[str] = None
+    changed: bool = True
+
+
+class PageIndex:
+    def __init__(self, path, checkpoint_every: int = 200, checkpoint_interval: float = 5.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+        self._dirty = 0
+        self._last_checkpoint = time.monotonic()
+        self.not_modified = 0
+        self.same_html = 0
+        self.same_content = 0
+        self.changed = 0
+
+    def checkpoint(self) -> None:
+        self.conn.commit()
+        self._dirty = 0
+        self._last_checkpoint = time.monotonic()
+
+    def close(self) -> None:
+        self.checkpoint()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get(self, url: str) -> Optional[PageVersion]:
+        row = self.conn.execute(
+            "SELECT etag, last_modified, html_hash, content_hash FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        return PageVersion(url, *row, changed=False)
+
+    def fetched_at(self, url: str) -> Optional[float]:
+        row = self.conn.execute("SELECT fetched_at FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def conditional_headers(version: Optional[PageVersion]) -> dict:
+        headers = {}
+        if version is None:
+            return headers
+        if version.etag:
+            headers["If-None-Match"] = version.etag
+        if version.last_modified:
+            headers["If-Modified-Since"] = version.last_modified
+        return headers
+
+    def record(self, version: PageVersion) -> None:
+        """Stores the latest validators and hashes; `changed_at` only moves when the content did."""
+        now = time.time()
+        self.conn.execute(
+            """
+            INSERT INTO pages (url, etag, last_modified, html_hash, content_hash, fetched_at, changed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                html_hash = excluded.html_hash,
+                content_hash = excluded.content_hash,
+                fetched_at = excluded.fetched_at,
+                changed_at = CASE WHEN pages.content_hash IS excluded.content_hash
+                                  THEN pages.changed_at ELSE excluded.changed_at END
+            """,
+            (version.url, version.etag, version.last_modified, version.html_hash,
+             version.content_hash, now, now),
+        )
+        self._dirty += 1
+        if self._dirty >= self.checkpoint_every or time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def stats(self) -> dict:
+        return {
+            "not_modified": self.not_modified,
+            "same_html": self.same_html,
+            "same_content": self.same_content,
+            "changed": self.changed,
+        }
@@ -0,0 +1,330 @@
+"""
+Job scheduling for the crawler service.
+
+`JobScheduler` keeps a priority queue of `Job`s and runs up to
+`max_concurrent` of them at once, highest priority first (FIFO within a
+priority). A job waiting for a slot can preempt a running one with a lower
+priority: the running job is paused, not killed, and picks up where it was
+once a slot frees up again. Jobs sharing a `group` (e.g. two full product
+crawls writing the same files) never run side by side.
+
+Every job carries a `JobControl`, which the crawl loops poll between pages:
+
+- cancel: stop starting pages, let the in-flight ones finish and flush
+  the sinks, then return; the frontier keeps the rest for a later resume
+- pause / resume: stop starting pages until resumed
+- `Budget`: caps on pages started, concurrent pages and browser threads
+
+Control is cooperative. Code that does not poll it can be wrapped in
+`run_until_cancelled`, which cancels the task outright instead.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+PREEMPTED = "preempted"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+ACTIVE_STATES = (RUNNING, PAUSED, PREEMPTED)
+
+
+@dataclass
+class Budget:
+    max_pages: Optional[int] = None    # pages started by the job
+    max_workers: Optional[int] = None  # pages in flight at once
+    max_drivers: Optional[int] = None  # threads (and so Chrome drivers) used for rendering
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "Budget":
+        data = data or {}
+        return cls(**{k: int(data[k]) for k in ("max_pages", "max_workers", "max_drivers") if data.get(k) is not None})
+
+
+class JobControl:
+    def __init__(self, budget: Optional[Budget] = None):
+        self.budget = budget or Budget()
+        self.cancelled = False
+        self.pages_started = 0
+        self._running = asyncio.Event()
+        self._running.set()
+        self._cancelled = asyncio.Event()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    @property
+    def budget_spent(self) -> bool:
+        return self.budget.max_pages is not None and self.pages_started >= self.budget.max_pages
+
+    def pause(self) -> None:
+        self._running.clear()
+
+    def resume(self) -> None:
+        self._running.set()
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        self._cancelled.set()
+        # Wake a paused job so it can wind down
+        self._running.set()
+
+    async def wait_running(self) -> None:
+        await self._running.wait()
+
+    async def wait_cancelled(self) -> None:
+        await self._cancelled.wait()
+
+    def claim_limit(self, in_flight: int, free: int) -> int:
+        """How many of `free` worker slots may start a page now."""
+        if self.cancelled or self.paused or self.budget_spent:
+            return 0
+        if self.budget.max_workers is not None:
+            free = min(free, self.budget.max_workers - in_flight)
+        if self.budget.max_pages is not None:
+            free = min(free, self.budget.max_pages - self.pages_started)
+        return max(0, free)
+
+    def started(self, pages: int = 1) -> None:
+        self.pages_started += pages
+
+    def drivers(self, default: int) -> int:
+        return min(default, self.budget.max_drivers) if self.budget.max_drivers else default
+
+    def should_wait(self, in_flight: int) -> bool:
+        """True when a paused job has nothing in flight and should block in `wait_running`."""
+        return self.paused and not self.cancelled and not in_flight
+
+    def outcome(self) -> Optional[str]:
+        """Why the job stopped early: "cancelled", "budget", or None if it ran to the end."""
+        if self.cancelled:
+            return "cancelled"
+        if self.budget_spent:
+            return "budget"
+        return None
+
+
+async def run_until_cancelled(coro, control: JobControl):
+    """Runs `coro`, cancelling it as soon as `control` is cancelled."""
+    task = asyncio.ensure_future(coro)
+    waiter = asyncio.ensure_future(control.wait_cancelled())
+    try:
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            task.cancel()
+        return await task
+    finally:
+        waiter.cancel()
+
+
+@dataclass
+class Job:
+    job_id: str
+    kind: str
+    priority: int = 0
+    params: dict = field(default_factory=dict)
+    budget: Budget = field(default_factory=Budget)
+    preemptible: bool = True
+    group: Optional[str] = None
+    state: str = QUEUED
+    error: Optional[str] = None
+    result: object = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    control: JobControl = None
+    task: Optional[asyncio.Task] = None
+
+    def __post_init__(self):
+        if self.control is None:
+            self.control = JobControl(self.budget)
+
+    def info(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "priority": self.priority,
+            "state": self.state,
+            "params": self.params,
+            "pages_started": self.control.pages_started,
+            "outcome": self.control.outcome(),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobScheduler:
+    """
+    Runs `runner(job)` for submitted jobs. `on_change(job)` is awaited
+    after every state change, e.g. to publish the job list.
+    """
+
+    def __init__(self, runner: Callable[[Job], Awaitable[object]], max_concurrent: int = 2,
+                 on_change: Optional[Callable[[Job], Awaitable[None]]] = None, history: int = 50):
+        self.runner = runner
+        self.max_concurrent = max_concurrent
+        self.on_change = on_change
+        self.queue = []  # heap of (-priority, seq, job)
+        self.active = {}  # job_id -> job, started and not finished
+        self.finished = deque(maxlen=history)
+        self._seq = itertools.count()
+
+    # ------------------------------------------------------------------
+    # Commands
+    # ------------------------------------------------------------------
+
+    async def submit(self, job: Job) -> Job:
+        existing = self.get(job.job_id)
+        if existing is not None and existing.state in (QUEUED,) + ACTIVE_STATES:
+            raise ValueError(f"Job {job.job_id} is already {existing.state}")
+        heapq.heappush(self.queue, (-job.priority, next(self._seq), job))
+        await self._changed(job)
+        await self._schedule()
+        return job
+
+    async def cancel(self, job_id: str, force: bool = False) -> bool:
+        job = self.get(job_id)
+        if job is None or job.state not in (QUEUED,) + ACTIVE_STATES:
+            return False
+        if job.state == QUEUED:
+            self.queue = [entry for entry in self.queue if entry[2] is not job]
+            heapq.heapify(self.queue)
+            job.control.cancel()
+            job.state = CANCELLED
+            job.finished_at = time.time()
+            self.finished.append(job)
+            await self._changed(job)
+            return True
+        job.control.cancel()
+        if force and job.task:
+            job.task.cancel()
+        return True
+
+    async def pause(self, job_id: str) -> bool:
+        job = self.active.get(job_id)
+        if job is None or job.state != RUNNING:
+            return False
+        job.control.pause()
+        job.state = PAUSED
+        await self._changed(job)
+        await self._schedule()
+        return True
+
+    async def resume(self, job_id: str) -> bool:
+        """Resumes a paused job; it waits (as preempted) if every slot is taken."""
+        job = self.active.get(job_id)
+        if job is None or job.state != PAUSED:
+            return False
+        job.state = PREEMPTED
+        await self._schedule()
+        return True
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def get(self, job_id: str) -> Optional[Job]:
+        if job_id in self.active:
+            return self.active[job_id]
+        for _, _, job in self.queue:
+            if job.job_id == job_id:
+                return job
+        for job in reversed(self.finished):
+            if job.job_id == job_id:
+                return job
+        return None
+
+    def running(self) -> list[Job]:
+        return [job for job in self.active.values() if job.state == RUNNING]
+
+    def idle(self) -> bool:
+        return not self.active and not self.queue
+
+    def jobs(self, include_finished: bool = True) -> list[dict]:
+        queued = [job for _, _, job in sorted(self.queue, key=lambda e: e[:2])]
+        finished = list(self.finished) if include_finished else []
+        return [job.info() for job in list(self.active.values()) + queued + finished]
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    async def _changed(self, job: Job) -> None:
+        if self.on_change:
+            try:
+                await self.on_change(job)
+            except Exception as e:
+                logging.error(f"[JOBS] on_change failed: {e}")
+
+    def _blocked(self, job: Job) -> bool:
+        """A job whose group already has another active job has to wait."""
+        return job.group is not None and any(
+            other.group == job.group and other is not job for other in self.active.values()
+        )
+
+    def _next_candidate(self) -> Optional[Job]:
+        """Highest-priority job waiting for a slot: preempted jobs or the queue head (FIFO on ties)."""
+        waiting = [(-job.priority, job.started_at or 0, job) for job in self.active.values() if job.state == PREEMPTED]
+        queued = [entry for entry in sorted(self.queue, key=lambda e: e[:2]) if not self._blocked(entry[2])]
+        candidates = sorted(waiting, key=lambda e: (e[0], e[1])) + queued[:1]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda e: e[0])[2]
+
+    async def _schedule(self) -> None:
+        while True:
+            job = self._next_candidate()
+            if job is None:
+                return
+            running = self.running()
+            if len(running) >= self.max_concurrent:
+                victims = [r for r in running if r.preemptible and r.priority < job.priority]
+                if not victims:
+                    return
+                victim = min(victims, key=lambda r: (r.priority, -(r.started_at or 0)))
+                victim.control.pause()
+                victim.state = PREEMPTED
+                logging.info(f"[JOBS] {job.job_id} (priority {job.priority}) preempts {victim.job_id}")
+                await self._changed(victim)
+
+            if job.state == PREEMPTED:
+                job.control.resume()
+                job.state = RUNNING
+            else:
+                self.queue = [entry for entry in self.queue if entry[2] is not job]
+                heapq.heapify(self.queue)
+                job.state = RUNNING
+                job.started_at = time.time()
+                self.active[job.job_id] = job
+                job.task = asyncio.create_task(self._run(job))
+            await self._changed(job)
+
+    async def _run(self, job: Job) -> None:
+        try:
+            job.result = await self.runner(job)
+            job.state = CANCELLED if job.control.cancelled else DONE
+        except asyncio.CancelledError:
+            job.state = CANCELLED
+        except Exception as e:
+            job.state = FAILED
+            job.error = str(e)
+            logging.error(f"[JOBS] Job {job.job_id} failed: {e}", exc_info=True)
+        finally:
+            job.finished_at = time.time()
+            self.active.pop(job.job_id, None)
+            self.finished.append(job)
+            await self._changed(job)
+            await self._schedule()
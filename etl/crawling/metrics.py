@@ -0,0 +1,407 @@
+"""
+Live crawler metrics.
+
+`CrawlMetrics` collects what is needed to see where a running crawl is
+bottlenecked:
+
+- counters: pages finished/failed, fetches, fetch errors, block pages, bytes
+- latency windows: the last `window` fetch and parse times, reported as
+  p50/p95
+- gauges: queue depths and in-flight pages, set by the crawl loops
+- sources: callables polled at snapshot time (driver pool, throttle...)
+
+`snapshot()` returns a JSON-ready dict (published on MQTT by the crawler
+manager) and `prometheus_text()` renders the same figures in the Prometheus
+text format, served by `MetricsServer` on `/metrics`.
+
+Jobs can run side by side, so each one gets its own `CrawlMetrics` from
+`MetricsRegistry.begin()`: snapshots are keyed by job id and Prometheus
+series carry `job_id` and `stage` labels. A job's series disappear when it
+ends; its last snapshot is kept for `latest()`.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+import numpy as np
+
+from crawling.throttle import is_block_page
+
+PREFIX = "crawler"
+QUANTILES = (0.5, 0.95)
+
+
+class LatencyWindow:
+    """The last `size` samples of a duration, in seconds."""
+
+    def __init__(self, size: int = 2048):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self) -> dict:
+        if not self.samples:
+            return {q: None for q in QUANTILES}
+        values = np.percentile(np.fromiter(self.samples, dtype=float, count=len(self.samples)),
+                               [q * 100 for q in QUANTILES])
+        return dict(zip(QUANTILES, values.tolist()))
+
+
+class CrawlMetrics:
+    def __init__(self, window: int = 2048, rate_window: float = 60.0):
+        self.window = window
+        self.rate_window = rate_window
+        self.sources: dict[str, Callable[[], dict]] = {}
+        self._lock = threading.Lock()
+        self.begin(None)
+
+    def begin(self, stage: Optional[str], job_id: Optional[str] = None) -> None:
+        """Starts counting for a new crawl stage."""
+        with self._lock:
+            self.stage = stage
+            self.job_id = job_id
+            self.started = time.monotonic()
+            self.pages = 0
+            self.failed = 0
+            self.fetches = 0
+            self.errors = 0
+            self.blocks = 0
+            self.bytes = 0
+            self.fetch_time = LatencyWindow(self.window)
+            self.parse_time = LatencyWindow(self.window)
+            self.gauges = {}
+            self._finished = deque()
+
+    def add_source(self, name: str, source: Callable[[], dict]) -> None:
+        """Registers a callable whose dict is included in every snapshot."""
+        self.sources[name] = source
+
+    def remove_source(self, name: str) -> None:
+        self.sources.pop(name, None)
+
+    def observe_fetch(self, seconds: float, size: int = 0, error: bool = False, blocked: bool = False) -> None:
+        with self._lock:
+            self.fetches += 1
+            self.bytes += size
+            self.fetch_time.add(seconds)
+            if error:
+                self.errors += 1
+            if blocked:
+                self.blocks += 1
+
+    def observe_parse(self, seconds: float) -> None:
+        with self._lock:
+            self.parse_time.add(seconds)
+
+    def page_done(self, failed: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.pages += 1
+            if failed:
+                self.failed += 1
+            self._finished.append(now)
+            self._prune(now)
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.rate_window
+        while self._finished and self._finished[0] < cutoff:
+            self._finished.popleft()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            elapsed = now - self.started
+            window = max(1.0, min(self.rate_window, elapsed))
+            fetch_q = self.fetch_time.quantiles()
+            parse_q = self.parse_time.quantiles()
+            snap = {
+                "stage": self.stage,
+                "job_id": self.job_id,
+                "elapsed_s": round(elapsed, 1),
+                "pages": self.pages,
+                "failed": self.failed,
+                "pages_per_s": round(len(self._finished) / window, 2),
+                "fetches": self.fetches,
+                "bytes": self.bytes,
+                "error_rate": round(self.errors / self.fetches, 4) if self.fetches else 0.0,
+                "block_rate": round(self.blocks / self.fetches, 4) if self.fetches else 0.0,
+                "fetch_ms": {f"p{int(q * 100)}": _ms(v) for q, v in fetch_q.items()},
+                "parse_ms": {f"p{int(q * 100)}": _ms(v) for q, v in parse_q.items()},
+                "queues": dict(self.gauges),
+            }
+        for name, source in list(self.sources.items()):
+            try:
+                snap[name] = source()
+            except Exception as e:
+                logging.debug(f"[METRICS] Source {name} failed: {e}")
+        return snap
+
+    def families(self, labels: Optional[dict] = None) -> list[tuple]:
+        """Every metric as (name, kind, help, samples), with `labels` on each sample."""
+        labels = labels or {}
+        snap = self.snapshot()
+        with self._lock:
+            counters = {
+                "pages_total": ("Pages finished in this stage", self.pages),
+                "pages_failed_total": ("Pages given up on", self.failed),
+                "fetches_total": ("Fetch attempts", self.fetches),
+                "fetch_errors_total": ("Fetches that raised or returned an error status", self.errors),
+                "blocks_total": ("Block pages received", self.blocks),
+                "bytes_total": ("HTML characters received", self.bytes),
+            }
+            windows = {
+                "fetch_seconds": ("Fetch time, recent window", self.fetch_time),
+                "parse_seconds": ("Parse time, recent window", self.parse_time),
+            }
+            summaries = {name: (help_text, w.quantiles(), w.count, w.total) for name, (help_text, w) in windows.items()}
+
+        families = []
+        for name, (help_text, value) in counters.items():
+            families.append((name, "counter", help_text, [("", labels, value)]))
+        families.append(("pages_per_second", "gauge", f"Pages finished per second over the last {self.rate_window:.0f}s",
+                         [("", labels, snap["pages_per_s"])]))
+        for name, (help_text, quantiles, count, total) in summaries.items():
+            samples = [("", {**labels, "quantile": q}, v) for q, v in quantiles.items()]
+            samples += [("_count", labels, count), ("_sum", labels, total)]
+            families.append((name, "summary", help_text, samples))
+        families.append(("queue_depth", "gauge", "Pending or in-flight items per queue",
+                         [("", {**labels, "queue": name}, value) for name, value in snap["queues"].items()]))
+        families += source_families(snap, self.sources, labels)
+        return families
+
+    def prometheus_text(self) -> str:
+        return render_prometheus(self.families())
+
+
+class MetricsRegistry:
+    """
+    One `CrawlMetrics` per running job, so jobs running side by side never
+    reset or overwrite each other's figures. Sources registered here (e.g.
+    the shared driver pool) are reported once, next to the jobs.
+    """
+
+    def __init__(self, window: int = 2048, rate_window: float = 60.0, history: int = 20):
+        self.window = window
+        self.rate_window = rate_window
+        self.history = history
+        self.sources: dict[str, Callable[[], dict]] = {}
+        self.jobs: dict[Optional[str], CrawlMetrics] = {}
+        self.finished = OrderedDict()  # job_id -> last snapshot
+        self._lock = threading.Lock()
+
+    def begin(self, stage: Optional[str], job_id: Optional[str] = None) -> CrawlMetrics:
+        """Returns fresh metrics for a job; they are reported until `end(job_id)`."""
+        metrics = CrawlMetrics(self.window, self.rate_window)
+        metrics.begin(stage, job_id)
+        with self._lock:
+            self.jobs[job_id] = metrics
+        return metrics
+
+    def end(self, job_id: Optional[str]) -> Optional[dict]:
+        """Stops reporting a job and returns its last snapshot."""
+        with self._lock:
+            metrics = self.jobs.pop(job_id, None)
+        if metrics is None:
+            return None
+        snap = metrics.snapshot()
+        with self._lock:
+            self.finished[job_id] = snap
+            self.finished.move_to_end(job_id)
+            while len(self.finished) > self.history:
+                self.finished.popitem(last=False)
+        return snap
+
+    def latest(self, stage: str) -> Optional[dict]:
+        """Last snapshot of the most recently finished job of `stage`."""
+        with self._lock:
+            snaps = list(self.finished.values())
+        return next((snap for snap in reversed(snaps) if snap["stage"] == stage), None)
+
+    def add_source(self, name: str, source: Callable[[], dict]) -> None:
+        self.sources[name] = source
+
+    def remove_source(self, name: str) -> None:
+        self.sources.pop(name, None)
+
+    def _source_values(self) -> dict:
+        values = {}
+        for name, source in list(self.sources.items()):
+            try:
+                values[name] = source()
+            except Exception as e:
+                logging.debug(f"[METRICS] Source {name} failed: {e}")
+        return values
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            jobs = dict(self.jobs)
+        return {
+            "jobs": {job_id: metrics.snapshot() for job_id, metrics in jobs.items()},
+            **self._source_values(),
+        }
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            jobs = dict(self.jobs)
+        families = []
+        for job_id, metrics in jobs.items():
+            families += metrics.families({"job_id": job_id, "stage": metrics.stage})
+        families += source_families(self._source_values(), self.sources)
+        return render_prometheus(families)
+
+
+def source_families(snap: dict, sources, labels: Optional[dict] = None) -> list[tuple]:
+    """
+    Numeric fields of the sources in `snap` as gauges, e.g.
+    crawler_drivers_utilization. Sources keyed by host (the throttle's
+    `{host: {...}}` stats) get one sample per host under a `host` label.
+    """
+    labels = labels or {}
+    families = []
+    for source in sources:
+        values = snap.get(source)
+        if not isinstance(values, dict):
+            continue
+        for key, value in values.items():
+            if isinstance(value, dict):
+                host_labels = {**labels, "host": key}
+                for field, field_value in value.items():
+                    if _is_number(field_value):
+                        families.append((f"{source}_{field}", "gauge", f"{source} {field}",
+                                         [("", host_labels, field_value)]))
+            elif _is_number(value):
+                families.append((f"{source}_{key}", "gauge", f"{source} {key}", [("", labels, value)]))
+    return families
+
+
+def render_prometheus(families: list[tuple]) -> str:
+    """Prometheus text format; families with the same name (one per job) become one metric."""
+    merged = {}
+    for name, kind, help_text, samples in families:
+        merged.setdefault(name, (kind, help_text, []))[2].extend(samples)
+
+    lines = []
+    for name, (kind, help_text, samples) in merged.items():
+        full = f"{PREFIX}_{name}"
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} {kind}")
+        for suffix, labels, value in samples:
+            if value is None:
+                continue
+            label_text = "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+            lines.append(f"{full}{suffix}{label_text} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MeteredFetcher:
+    """Times every fetch of the wrapped engine and counts errors and block pages."""
+
+    def __init__(self, inner, metrics: CrawlMetrics):
+        self.inner = inner
+        self.metrics = metrics
+        self.engine = getattr(inner, "engine", "")
+
+    async def fetch(self, url, wait_selector=None, required_selector=None, headers=None):
+        start = time.perf_counter()
+        result = None
+        try:
+            result = await self.inner.fetch(url, wait_selector, required_selector, headers=headers)
+            return result
+        finally:
+            if result is None:
+                self.metrics.observe_fetch(time.perf_counter() - start, error=True)
+            else:
+                self.metrics.observe_fetch(
+                    time.perf_counter() - start,
+                    size=len(result.html or ""),
+                    error=not result.ok and result.status not in (304, 404),
+                    blocked=is_block_page(result.html, result.status),
+                )
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class MetricsServer:
+    """
+    Serves `metrics.prometheus_text()` (a `CrawlMetrics` or a
+    `MetricsRegistry`) on GET /metrics from a background thread.
+    """
+
+    def __init__(self, metrics, port: int, host: str = "0.0.0.0"):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.httpd = None
+        self.thread = None
+
+    def start(self) -> "MetricsServer":
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body = metrics.prometheus_text().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(metrics.snapshot(), default=str).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True)
+        self.thread.start()
+        logging.info(f"[METRICS] Serving http://{self.host}:{self.port}/metrics")
+        return self
+
+    def close(self) -> None:
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
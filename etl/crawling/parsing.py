@@ -0,0 +1,467 @@
+"""
+Product page extractors.
+
+Both extractors turn a WEG product page into `[url, feature, value]` rows
+in the same order:
+
+- `extract_product_data_bs4` runs CSS selectors over a BeautifulSoup tree
+  (one `select` per selector, the original implementation).
+- `extract_product_data_lxml` builds an lxml tree and walks it once,
+  tracking which selector contexts each element sits in with a bitmask,
+  so breadcrumbs, tables and images are collected in a single visit.
+
+`parse_product_html` picks the backend; "auto" prefers lxml when installed.
+`PageExtractor` follows the same choice, with XPath twins of the
+navigation selectors on the lxml side.
+Everything here is a plain top-level function, or a small picklable
+extractor class (`ProductExtractor`, `DiscoveryExtractor`, `PageExtractor`
+for `crawling.engine.PageScraper`), so the crawler can run it in worker
+processes from `new_parse_pool`. The module has no import-time side
+effects, so the pool's forkserver can preload it.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+PARSER_BACKENDS = ("auto", "bs4", "lxml")
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+IMAGE_SELECTORS = [
+    # Main product image
+    "div.product-image img[src]",
+    "img.product-image[src]",
+    "div.xtt-product-image-zoom img[src]",
+    # Gallery images
+    "div.product-gallery img[src]",
+    "ul.product-thumbnails img[src]",
+    "div.carousel-item img[src]",
+    # General product images
+    "div.product-images img[src]",
+    "section.product-images img[src]",
+    # Any img tag that might contain product image
+    "img[src*='product']",
+    "img[src*='Product']",
+]
+
+IMAGE_LINK_SELECTOR = ", ".join(f"a[href*='{ext}']" for ext in IMAGE_EXTENSIONS)
+
+
+def absolute_url(src: str, page_url: str, base_url: str) -> str:
+    if src.startswith('/'):
+        return urljoin(base_url, src)
+    if src.startswith('http'):
+        return src
+    return urljoin(page_url, src)
+
+
+def build_rows(url, breadcrumb, name, code, description, spec_pairs, images):
+    """Flattens the extracted fields into [URL, Feature, Value] rows."""
+    rows = []
+    def add(feature, value):
+        if feature and value:
+            rows.append([url, feature, value])
+
+    if breadcrumb:
+        path_levels = breadcrumb[1:-1]
+        add("Category_Path", " > ".join(path_levels))
+        for i, level in enumerate(path_levels):
+            add(f"Category_Level_{i+1}", level)
+
+    add("Product Name", name)
+    if code is not None:
+        add("Product Code", code.replace("Product:", "").strip())
+    add("Description", description)
+
+    for feature, value in spec_pairs:
+        add(feature, value)
+
+    for i, img_url in enumerate(images, 1):
+        add(f"Image URL {i}", img_url)
+
+    return rows
+
+
+def merge_images(img_buckets, link_urls):
+    """Images in selector order (deduplicated, image extensions only), then anchor images."""
+    seen = set()
+    images = []
+    for bucket in img_buckets:
+        for full_url in bucket:
+            if full_url not in seen and any(ext in full_url.lower() for ext in IMAGE_EXTENSIONS):
+                images.append(full_url)
+                seen.add(full_url)
+    for full_url in link_urls:
+        if full_url not in seen:
+            images.append(full_url)
+            seen.add(full_url)
+    return images
+
+
+def extract_discovery_links(html: str, base_url: str, language_marker: str = "/BR/en/") -> list[str]:
+    """Same-site links (no fragments, queries or image files) in the crawled language."""
+    if not html:
+        return []
+    soup = BeautifulSoup(html, "html.parser")
+
+    links = set()
+    for a in soup.select("a[href]"):
+        href = a.get("href")
+        if not href or href.startswith("#"):
+            continue
+
+        if any(ext in href.lower() for ext in IMAGE_EXTENSIONS):
+            continue
+
+        full = urlparse(urljoin(base_url, href))._replace(fragment="", query="").geturl()
+        if base_url in full and language_marker in full:
+            links.add(full)
+
+    return list(links)
+
+
+NAVIGATION_LINK_SELECTORS = [
+    "#productMenuContent li a[href]",
+    "a.xtt-url-categories[href]",
+    "#products-selection a[href]",
+    "a.btn.btn-primary.btn-sm.btn-block[href]",
+    "td.product-code a[href]",
+    "li.xtt-listing-grid-product h4 a[href]",
+    "li#products-selection a[href]",
+    "a.xtt-product-image-zoom[href]",
+]
+
+# Pages with any of these are scraped as products, the rest as navigation
+PRODUCT_PAGE_SELECTOR = "h1.product-card-title, div.product-info-specs, div.xtt-product-description"
+
+
+def extract_navigation_links(soup: BeautifulSoup, url: str, base_url: str) -> list[str]:
+    """Menu, category, listing and pagination links (no image files), without `url` itself."""
+    links = set()
+    for a in soup.select(", ".join(NAVIGATION_LINK_SELECTORS)):
+        href = a.get("href")
+        if href and href.strip() != "#" and not any(ext in href.lower() for ext in IMAGE_EXTENSIONS):
+            links.add(urljoin(base_url, href))
+    # Pagination keeps its target in data-href
+    for a in soup.select("ul.pagination a[data-href]"):
+        links.add(urljoin(base_url, a.get("data-href")))
+    links.discard(url)
+    return list(links)
+
+
+# ------------------------------------------------------------------
+# BeautifulSoup backend
+# ------------------------------------------------------------------
+
+def extract_product_data_bs4(soup: BeautifulSoup, url: str, base_url: str) -> list[list[str]]:
+    breadcrumb = [b.get_text(strip=True) for b in soup.select('ol.breadcrumb li span[itemprop="name"]')]
+
+    name = soup.select_one("h1.product-card-title")
+    code = soup.select_one("small.product-card-info")
+    desc = soup.select_one("div.xtt-product-description p")
+
+    # Extract tables (features and details)
+    spec_pairs = []
+    for table in soup.select("div.product-info-specs table.table, table.table-striped"):
+        for tr in table.select("tr"):
+            th, td = tr.find("th"), tr.find("td")
+            if th and td:
+                spec_pairs.append((th.get_text(strip=True), td.get_text(strip=True)))
+
+    img_buckets = []
+    for selector in IMAGE_SELECTORS:
+        bucket = []
+        for img in soup.select(selector):
+            src = img.get('src')
+            if src and src.strip():
+                bucket.append(absolute_url(src, url, base_url))
+        img_buckets.append(bucket)
+
+    link_urls = []
+    for link in soup.select(IMAGE_LINK_SELECTOR):
+        href = link.get('href')
+        if href and href.strip():
+            link_urls.append(absolute_url(href, url, base_url))
+
+    return build_rows(
+        url,
+        breadcrumb,
+        name.get_text(strip=True) if name else None,
+        code.get_text(strip=True) if code else None,
+        desc.get_text(strip=True) if desc else None,
+        spec_pairs,
+        merge_images(img_buckets, link_urls),
+    )
+
+
+# ------------------------------------------------------------------
+# lxml single-pass backend
+# ------------------------------------------------------------------
+
+# Ancestor contexts, one bit each
+IN_BREADCRUMB = 1 << 0          # ol.breadcrumb
+IN_BREADCRUMB_LI = 1 << 1       # ol.breadcrumb li
+IN_SPECS_BLOCK = 1 << 2         # div.product-info-specs
+IN_SPEC_TABLE = 1 << 3          # div.product-info-specs table.table, table.table-striped
+IN_SPEC_ROW = 1 << 4            # <tr> inside a spec table
+IN_DESCRIPTION = 1 << 5         # div.xtt-product-description
+
+# Image containers: (tag, class) -> index into IMAGE_SELECTORS, stored as bits from 8 up
+IMAGE_CONTAINERS = {
+    ("div", "product-image"): 0,
+    ("div", "xtt-product-image-zoom"): 2,
+    ("div", "product-gallery"): 3,
+    ("ul", "product-thumbnails"): 4,
+    ("div", "carousel-item"): 5,
+    ("div", "product-images"): 6,
+    ("section", "product-images"): 7,
+}
+IMAGE_BIT_OFFSET = 8
+
+
+def _text(el) -> str:
+    """Equivalent of BeautifulSoup's get_text(strip=True)."""
+    return "".join(s.strip() for s in el.itertext())
+
+
+def _parse_tree(html: str):
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # Unicode strings with an XML encoding declaration must be fed as bytes
+        return lxml.html.document_fromstring(html.encode("utf-8"))
+
+
+def extract_product_data_lxml(html: str, url: str, base_url: str) -> list[list[str]]:
+    return _product_rows_lxml(_parse_tree(html), url, base_url)
+
+
+def _product_rows_lxml(root, url: str, base_url: str) -> list[list[str]]:
+    breadcrumb = []
+    name = code = description = None
+    spec_pairs = []
+    img_buckets = [[] for _ in IMAGE_SELECTORS]
+    link_urls = []
+
+    stack = [0]
+    row_cells = None  # [th, td] of the spec row being walked
+
+    for event, el in etree.iterwalk(root, events=("start", "end")):
+        tag = el.tag
+        if not isinstance(tag, str):
+            # Comments and processing instructions
+            continue
+
+        if event == "end":
+            stack.pop()
+            if tag == "tr" and row_cells is not None and stack[-1] & IN_SPEC_TABLE and not stack[-1] & IN_SPEC_ROW:
+                th, td = row_cells
+                if th is not None and td is not None:
+                    spec_pairs.append((_text(th), _text(td)))
+                row_cells = None
+            continue
+
+        flags = stack[-1]
+        classes = el.get("class", "").split()
+
+        if tag == "ol" and "breadcrumb" in classes:
+            flags |= IN_BREADCRUMB
+        elif tag == "li" and flags & IN_BREADCRUMB:
+            flags |= IN_BREADCRUMB_LI
+        elif tag == "span":
+            if flags & IN_BREADCRUMB_LI and el.get("itemprop") == "name":
+                breadcrumb.append(_text(el))
+        elif tag == "h1":
+            if name is None and "product-card-title" in classes:
+                name = _text(el)
+        elif tag == "small":
+            if code is None and "product-card-info" in classes:
+                code = _text(el)
+        elif tag == "p":
+            if description is None and flags & IN_DESCRIPTION:
+                description = _text(el)
+        elif tag == "table":
+            if "table-striped" in classes or (flags & IN_SPECS_BLOCK and "table" in classes):
+                flags |= IN_SPEC_TABLE
+        elif tag == "tr":
+            if flags & IN_SPEC_TABLE and not flags & IN_SPEC_ROW:
+                flags |= IN_SPEC_ROW
+                row_cells = [None, None]
+        elif tag in ("th", "td"):
+            if row_cells is not None and flags & IN_SPEC_ROW:
+                slot = 0 if tag == "th" else 1
+                if row_cells[slot] is None:
+                    row_cells[slot] = el
+        elif tag == "img":
+            src = el.get("src")
+            if src is not None:
+                matched = [i for i in range(len(IMAGE_SELECTORS)) if flags >> (IMAGE_BIT_OFFSET + i) & 1]
+                if "product-image" in classes:
+                    matched.append(1)
+                if "product" in src:
+                    matched.append(8)
+                if "Product" in src:
+                    matched.append(9)
+                if matched and src.strip():
+                    full_url = absolute_url(src, url, base_url)
+                    for i in matched:
+                        img_buckets[i].append(full_url)
+        elif tag == "a":
+            href = el.get("href")
+            if href and any(ext in href for ext in IMAGE_EXTENSIONS) and href.strip():
+                link_urls.append(absolute_url(href, url, base_url))
+
+        if tag == "div":
+            if "product-info-specs" in classes:
+                flags |= IN_SPECS_BLOCK
+            if "xtt-product-description" in classes:
+                flags |= IN_DESCRIPTION
+        for cls in classes:
+            index = IMAGE_CONTAINERS.get((tag, cls))
+            if index is not None:
+                flags |= 1 << (IMAGE_BIT_OFFSET + index)
+
+        stack.append(flags)
+
+    return build_rows(url, breadcrumb, name, code, description, spec_pairs, merge_images(img_buckets, link_urls))
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# XPath twins of NAVIGATION_LINK_SELECTORS, the pagination selector and PRODUCT_PAGE_SELECTOR
+NAVIGATION_LINK_XPATH = " | ".join([
+    "//*[@id='productMenuContent']//li//a[@href]",
+    f"//a[{_has_class('xtt-url-categories')}][@href]",
+    "//*[@id='products-selection']//a[@href]",
+    f"//a[{_has_class('btn')} and {_has_class('btn-primary')} and {_has_class('btn-sm')} and {_has_class('btn-block')}][@href]",
+    f"//td[{_has_class('product-code')}]//a[@href]",
+    f"//li[{_has_class('xtt-listing-grid-product')}]//h4//a[@href]",
+    f"//a[{_has_class('xtt-product-image-zoom')}][@href]",
+])
+PAGINATION_LINK_XPATH = f"//ul[{_has_class('pagination')}]//a[@data-href]"
+PRODUCT_PAGE_XPATH = " | ".join([
+    f"//h1[{_has_class('product-card-title')}]",
+    f"//div[{_has_class('product-info-specs')}]",
+    f"//div[{_has_class('xtt-product-description')}]",
+])
+
+
+def extract_navigation_links_lxml(root, url: str, base_url: str) -> list[str]:
+    """`extract_navigation_links` over an lxml tree."""
+    links = set()
+    for a in root.xpath(NAVIGATION_LINK_XPATH):
+        href = a.get("href")
+        if href and href.strip() != "#" and not any(ext in href.lower() for ext in IMAGE_EXTENSIONS):
+            links.add(urljoin(base_url, href))
+    for a in root.xpath(PAGINATION_LINK_XPATH):
+        links.add(urljoin(base_url, a.get("data-href")))
+    links.discard(url)
+    return list(links)
+
+
+def resolve_backend(backend: str = "auto") -> str:
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend: {backend}")
+    if backend == "auto":
+        return "lxml" if LXML_AVAILABLE else "bs4"
+    if backend == "lxml" and not LXML_AVAILABLE:
+        raise RuntimeError("lxml is not installed")
+    return backend
+
+
+def parse_product_html(html: str, url: str, base_url: str, backend: str = "auto") -> list[list[str]]:
+    """Parses a product page with the chosen backend ('bs4', 'lxml' or 'auto')."""
+    if not html:
+        return []
+    if resolve_backend(backend) == "lxml":
+        return extract_product_data_lxml(html, url, base_url)
+    return extract_product_data_bs4(BeautifulSoup(html, "html.parser"), url, base_url)
+
+
+# ------------------------------------------------------------------
+# Extractors: `extract(html, url)` callables for crawling.engine.PageScraper
+# ------------------------------------------------------------------
+
+class ProductExtractor:
+    """Product rows of a page (see `parse_product_html`)."""
+
+    def __init__(self, base_url: str, backend: str = "auto"):
+        self.base_url = base_url
+        self.backend = backend
+
+    def __call__(self, html: str, url: str) -> list[list[str]]:
+        return parse_product_html(html, url, self.base_url, self.backend)
+
+
+class DiscoveryExtractor:
+    """Same-site links of a page in the crawled language (see `extract_discovery_links`)."""
+
+    def __init__(self, base_url: str, language_marker: str = "/BR/en/"):
+        self.base_url = base_url
+        self.language_marker = language_marker
+
+    def __call__(self, html: str, url: str) -> list[str]:
+        return extract_discovery_links(html, self.base_url, self.language_marker)
+
+
+class PageExtractor:
+    """
+    One parse of any page: (rows, []) for product pages and
+    ([], same-site navigation links) for everything else. `backend` is
+    picked like in `parse_product_html`.
+    """
+
+    def __init__(self, base_url: str, backend: str = "auto"):
+        self.base_url = base_url
+        self.backend = backend
+
+    def __call__(self, html: str, url: str) -> tuple[list[list[str]], list[str]]:
+        if not html:
+            return [], []
+        if resolve_backend(self.backend) == "lxml":
+            root = _parse_tree(html)
+            if root.xpath(PRODUCT_PAGE_XPATH):
+                return _product_rows_lxml(root, url, self.base_url), []
+            links = extract_navigation_links_lxml(root, url, self.base_url)
+        else:
+            soup = BeautifulSoup(html, "html.parser")
+            if soup.select_one(PRODUCT_PAGE_SELECTOR):
+                return extract_product_data_bs4(soup, url, self.base_url), []
+            links = extract_navigation_links(soup, url, self.base_url)
+        return [], [u for u in links if self.base_url in u]
+
+
+# ------------------------------------------------------------------
+# Worker pool
+# ------------------------------------------------------------------
+
+def new_parse_pool(workers: int):
+    """
+    Process pool for the extractors above, or None when `workers` is 0
+    (parse in threads). Workers are forked from a forkserver that has only
+    imported this module (spawned where there is none, e.g. Windows), so
+    they don't inherit the crawler's threads and open drivers. Either way
+    they re-import the entry script as `__mp_main__`, which has to keep its
+    startup under `if __name__ == "__main__"`. Create the pool once, before
+    the crawler starts any threads, and share it across jobs.
+    """
+    if not workers:
+        return None
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+    else:
+        context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(workers, mp_context=context)
@@ -0,0 +1,217 @@
+"""
+Recorded-corpus support for offline crawls.
+
+`PageStore` keeps raw pages in a directory (gzip bodies + a JSON-lines
+index), `RecordingFetcher` fills it during a live crawl and `FixtureServer`
+serves it back over local HTTP. `RewritingFetcher` points any fetch engine
+at the fixture server while the crawler keeps seeing the original URLs.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+
+class PageStore:
+    """Directory store: `pages/<sha1>.html.gz` plus `index.jsonl` mapping URLs to files."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.pages_dir = self.root / "pages"
+        self.index_file = self.root / "index.jsonl"
+        self.pages_dir.mkdir(parents=True, exist_ok=True)
+        self.index = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.index_file.exists():
+            return
+        with open(self.index_file, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.index[entry["url"]] = entry
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def urls(self):
+        return list(self.index)
+
+    def put(self, url: str, html: str, status: int = 200) -> None:
+        name = f"{self.key(url)}.html.gz"
+        (self.pages_dir / name).write_bytes(gzip.compress(html.encode("utf-8")))
+        entry = {"url": url, "file": name, "status": status, "fetched_at": time.time()}
+        with self._lock:
+            self.index[url] = entry
+            with open(self.index_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def get_compressed(self, url: str) -> Optional[tuple[int, bytes]]:
+        entry = self.index.get(url)
+        if entry is None:
+            return None
+        return entry["status"], (self.pages_dir / entry["file"]).read_bytes()
+
+    def get(self, url: str) -> Optional[tuple[int, str]]:
+        found = self.get_compressed(url)
+        if found is None:
+            return None
+        status, body = found
+        return status, gzip.decompress(body).decode("utf-8")
+
+
+class RecordingFetcher:
+    """Wraps a fetch engine and saves every successful page into a `PageStore`."""
+
+    def __init__(self, inner, store: PageStore):
+        self.inner = inner
+        self.store = store
+        self.engine = getattr(inner, "engine", "")
+
+    async def fetch(self, url, wait_selector=None, required_selector=None, headers=None):
+        result = await self.inner.fetch(url, wait_selector, required_selector, headers=headers)
+        if result.html:
+            self.store.put(url, result.html, result.status)
+        return result
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class RewritingFetcher:
+    """Fetches `url` with its origin swapped for `target_origin`, reporting the original URL."""
+
+    def __init__(self, inner, source_origin: str, target_origin: str):
+        self.inner = inner
+        self.source_origin = source_origin.rstrip("/")
+        self.target_origin = target_origin.rstrip("/")
+        self.engine = getattr(inner, "engine", "")
+
+    async def fetch(self, url, wait_selector=None, required_selector=None, headers=None):
+        target = url
+        if url.startswith(self.source_origin):
+            target = self.target_origin + url[len(self.source_origin):]
+        result = await self.inner.fetch(target, wait_selector, required_selector, headers=headers)
+        return replace(result, url=url)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class FixtureServer:
+    """
+    Serves a `PageStore` over local HTTP. Request paths are resolved against
+    `origin`, so `http://127.0.0.1:<port>/a/b` returns the page recorded for
+    `<origin>/a/b`. Stored gzip bodies are sent as-is to clients that accept
+    gzip. Recorded pages carry an ETag derived from their body and
+    `If-None-Match` is answered with 304. `latency` (seconds) simulates a
+    remote host.
+    """
+
+    def __init__(self, store: PageStore, origin: str, host: str = "127.0.0.1",
+                 port: int = 0, latency: float = 0.0):
+        self.store = store
+        self.origin = origin.rstrip("/")
+        self.latency = latency
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._counter_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _lookup(self, path: str):
+        url = self.origin + path
+        found = self.store.get_compressed(url)
+        if found is None and "?" in path:
+            found = self.store.get_compressed(self.origin + urlsplit(path).path)
+        return found
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                found = server._lookup(self.path)
+                with server._counter_lock:
+                    if found is None:
+                        server.misses += 1
+                    else:
+                        server.hits += 1
+
+                status, body = found if found is not None else (404, gzip.compress(b"Not recorded"))
+                etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"' if found is not None else None
+                if etag and etag in self.headers.get("If-None-Match", ""):
+                    with server._counter_lock:
+                        server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                encoded = "gzip" in self.headers.get("Accept-Encoding", "")
+                if not encoded:
+                    body = gzip.decompress(body)
+
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                if encoded:
+                    self.send_header("Content-Encoding", "gzip")
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client gave up (e.g. a cancelled crawl)
+                    pass
+
+            def log_message(self, format, *args):
+                logging.debug(f"[FIXTURE] {format % args}")
+
+        return Handler
+
+    def start(self) -> "FixtureServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server", daemon=True)
+        self.thread.start()
+        logging.info(f"[FIXTURE] Serving {len(self.store)} recorded pages on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
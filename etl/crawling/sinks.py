@@ -0,0 +1,175 @@
+"""
+Columnar output for scraped products.
+
+`ParquetSink` writes one record per product (instead of one CSV row per
+feature) with a fixed schema:
+
+    url, code, name, description : string
+    breadcrumbs                  : list<string>
+    specs                        : map<string, string>   (every non-image feature)
+    images                       : list<string>
+    scraped_at                   : timestamp[ms, UTC]
+
+Files are zstd-compressed and hive-partitioned by scrape date
+(`<root>/dt=YYYY-MM-DD/part-<run>-<session>-<n>.parquet`). Each part is a complete
+file, written once `rows_per_part` products are buffered, so a crash never
+leaves a half-written footer behind.
+
+`read_products` loads only the requested columns and keeps the latest
+record per URL; `wide_frame` rebuilds the one-row-per-product table that
+used to come from pivoting the long CSV.
+"""
+
+import logging
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = ds = pq = None
+    PYARROW_AVAILABLE = False
+
+PRODUCT_COLUMNS = ("url", "code", "name", "description", "breadcrumbs", "specs", "images", "scraped_at")
+
+if PYARROW_AVAILABLE:
+    PRODUCT_SCHEMA = pa.schema([
+        ("url", pa.string()),
+        ("code", pa.string()),
+        ("name", pa.string()),
+        ("description", pa.string()),
+        ("breadcrumbs", pa.list_(pa.string())),
+        ("specs", pa.map_(pa.string(), pa.string())),
+        ("images", pa.list_(pa.string())),
+        ("scraped_at", pa.timestamp("ms", tz="UTC")),
+    ])
+else:
+    PRODUCT_SCHEMA = None
+
+
+def breadcrumbs_from_specs(specs: dict) -> list[str]:
+    levels = []
+    i = 1
+    while f"Category_Level_{i}" in specs:
+        levels.append(specs[f"Category_Level_{i}"])
+        i += 1
+    return levels
+
+
+def rows_to_product(rows):
+    """Groups one page's [url, feature, value] rows into (url, specs, images)."""
+    specs = {}
+    images = []
+    for _, feature, value in rows:
+        if "Image URL" in feature:
+            images.append(value)
+        else:
+            specs[feature] = value
+    return rows[0][0], specs, images
+
+
+def product_record(url: str, specs: dict, images: list, scraped_at: Optional[datetime] = None) -> dict:
+    code = specs.get("Product Code")
+    return {
+        "url": url,
+        "code": code,
+        "name": specs.get("Product Name"),
+        "description": specs.get("Description"),
+        "breadcrumbs": breadcrumbs_from_specs(specs),
+        "specs": [(str(k), None if v is None else str(v)) for k, v in specs.items()],
+        "images": [str(i) for i in images],
+        "scraped_at": scraped_at or datetime.now(timezone.utc),
+    }
+
+
+def has_products(root) -> bool:
+    root = Path(root)
+    return root.is_dir() and any(root.rglob("*.parquet"))
+
+
+class ParquetSink:
+    def __init__(self, root, run_id: str = "run", rows_per_part: int = 5000, compression: str = "zstd"):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is not installed")
+        self.root = Path(root)
+        self.run_id = run_id
+        # A resumed run keeps its run id, so every sink gets its own file names
+        self.session = uuid.uuid4().hex[:6]
+        self.rows_per_part = rows_per_part
+        self.compression = compression
+        self.buffer = []
+        self.parts = 0
+        self.written = 0
+
+    def add(self, url: str, specs: dict, images: list, scraped_at: Optional[datetime] = None) -> None:
+        self.buffer.append(product_record(url, specs, images, scraped_at))
+        if len(self.buffer) >= self.rows_per_part:
+            self.flush()
+
+    def write(self, products: Iterable[tuple]) -> None:
+        """Adds (url, specs, images) tuples, the shape `ProductDbSink.write` takes."""
+        scraped_at = datetime.now(timezone.utc)
+        for url, specs, images in products:
+            self.add(url, specs, images, scraped_at)
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        table = pa.Table.from_pylist(self.buffer, schema=PRODUCT_SCHEMA)
+        partition = self.root / f"dt={self.buffer[0]['scraped_at']:%Y-%m-%d}"
+        partition.mkdir(parents=True, exist_ok=True)
+        path = partition / f"part-{self.run_id}-{self.session}-{self.parts:05d}.parquet"
+        # Dot-prefixed, so dataset readers skip it until it is complete
+        tmp = partition / f".{path.name}.tmp"
+        pq.write_table(table, tmp, compression=self.compression)
+        tmp.replace(path)
+        self.parts += 1
+        self.written += len(self.buffer)
+        self.buffer = []
+
+    def close(self) -> None:
+        self.flush()
+        if self.written:
+            logging.info(f"[PARQUET] {self.written} products in {self.parts} parts under {self.root}")
+
+
+def read_products(root, columns: Optional[list[str]] = None, latest: bool = True):
+    """
+    Loads the product dataset as an Arrow table with only `columns`. With
+    `latest`, a URL scraped by several runs keeps its most recent record.
+    """
+    columns = list(columns or PRODUCT_COLUMNS)
+    wanted = list(dict.fromkeys(columns + (["url", "scraped_at"] if latest else [])))
+    dataset = ds.dataset(str(root), format="parquet", partitioning="hive", schema=PRODUCT_SCHEMA)
+    table = dataset.to_table(columns=wanted)
+    if latest and table.num_rows:
+        table = table.sort_by([("url", "ascending"), ("scraped_at", "ascending")])
+        urls = table.column("url").to_numpy(zero_copy_only=False)
+        # Last row of every run of equal URLs
+        keep = np.flatnonzero(np.append(urls[1:] != urls[:-1], True))
+        table = table.take(pa.array(keep))
+    return table.select(columns)
+
+
+def wide_frame(root, url_column: str = "Product URL"):
+    """One row per product with a column per feature and `Image URL n` columns, like the old CSV pivot."""
+    import pandas as pd
+
+    table = read_products(root, ["url", "specs", "images"])
+    records = []
+    for url, specs, images in zip(table.column("url").to_pylist(),
+                                  table.column("specs").to_pylist(),
+                                  table.column("images").to_pylist()):
+        record = {url_column: url}
+        record.update(specs or [])
+        for i, image in enumerate(images or [], 1):
+            record[f"Image URL {i}"] = image
+        records.append(record)
+    return pd.DataFrame.from_records(records)
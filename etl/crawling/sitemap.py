@@ -0,0 +1,189 @@
+"""
+Sitemap-based URL discovery.
+
+`SitemapReader` finds the sitemaps of a site (the `Sitemap:` lines of
+robots.txt, else `/sitemap.xml`), follows sitemap indexes and yields every
+`<url>` entry with its `<lastmod>`. Bodies are streamed through an
+incremental XML parser (`XMLPullParser`), gzip-compressed sitemaps
+(`.xml.gz`) are inflated on the fly, and parsed elements are dropped right
+away, so a 50k-URL sitemap never sits in memory as a whole.
+"""
+
+import logging
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional
+from urllib.parse import urljoin, urlsplit
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+from crawling.fetchers import HTTPX_AVAILABLE, USER_AGENT, httpx
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+@dataclass
+class SitemapEntry:
+    loc: str
+    lastmod: Optional[datetime] = None
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """W3C datetime ('2024-05-01', '2024-05-01T10:00:00Z', ...) as an aware datetime; None if unparseable."""
+    if not value:
+        return None
+    try:
+        value = value.strip()
+        # fromisoformat only takes a "Z" suffix from Python 3.11 on
+        if value.endswith(("Z", "z")):
+            value = value[:-1] + "+00:00"
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def sitemaps_from_robots(robots_txt: str, base_url: str) -> list[str]:
+    sitemaps = []
+    for line in robots_txt.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip().lower() == "sitemap" and value.strip():
+            sitemaps.append(urljoin(base_url, value.strip()))
+    return sitemaps
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+class SitemapParser:
+    """
+    Push-style parser: `feed()` raw (possibly gzipped) bytes and get back the
+    ("url" | "sitemap", SitemapEntry) pairs completed so far.
+    """
+
+    def __init__(self):
+        self.parser = XMLPullParser(events=("start", "end"))
+        self.inflater = None
+        self.started = False
+        self.root = None
+
+    def feed(self, chunk: bytes) -> list[tuple[str, SitemapEntry]]:
+        if not self.started:
+            self.started = True
+            if chunk.startswith(GZIP_MAGIC):
+                self.inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.inflater:
+            chunk = self.inflater.decompress(chunk)
+        self.parser.feed(chunk)
+        return self._drain()
+
+    def close(self) -> list[tuple[str, SitemapEntry]]:
+        if self.inflater:
+            self.parser.feed(self.inflater.flush())
+        self.parser.close()
+        return self._drain()
+
+    def _drain(self):
+        entries = []
+        for event, el in self.parser.read_events():
+            if event == "start":
+                if self.root is None:
+                    self.root = el
+                continue
+            kind = _local(el.tag)
+            if kind not in ("url", "sitemap"):
+                continue
+            loc = lastmod = None
+            for child in el:
+                name = _local(child.tag)
+                if name == "loc":
+                    loc = (child.text or "").strip()
+                elif name == "lastmod":
+                    lastmod = parse_lastmod(child.text)
+            if loc:
+                entries.append((kind, SitemapEntry(loc, lastmod)))
+            # Finished entries are not needed any more
+            try:
+                self.root.remove(el)
+            except ValueError:
+                el.clear()
+        return entries
+
+
+def parse_sitemap(chunks: Iterable[bytes]) -> Iterator[tuple[str, SitemapEntry]]:
+    """Parses a whole sitemap body given as byte chunks."""
+    parser = SitemapParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+class SitemapReader:
+    """
+    Streams every URL entry reachable from a site's sitemaps. `rewrite`
+    maps a URL to the address actually requested (e.g. a fixture server),
+    like `RewritingFetcher` does for pages.
+    """
+
+    def __init__(self, timeout: float = 60.0, max_sitemaps: int = 10000,
+                 rewrite: Optional[Callable[[str], str]] = None, user_agent: str = USER_AGENT):
+        if not HTTPX_AVAILABLE:
+            raise RuntimeError("httpx is not installed")
+        self.client = httpx.AsyncClient(
+            headers={"User-Agent": user_agent},
+            timeout=httpx.Timeout(timeout),
+            follow_redirects=True,
+        )
+        self.max_sitemaps = max_sitemaps
+        self.rewrite = rewrite or (lambda url: url)
+        self.sitemaps_read = 0
+        self.failed = 0
+
+    async def find_sitemaps(self, base_url: str) -> list[str]:
+        origin = "{0.scheme}://{0.netloc}".format(urlsplit(base_url))
+        try:
+            response = await self.client.get(self.rewrite(origin + "/robots.txt"))
+            if response.status_code == 200:
+                found = sitemaps_from_robots(response.text, origin)
+                if found:
+                    return found
+        except httpx.HTTPError as e:
+            logging.warning(f"[SITEMAP] Could not read robots.txt: {e}")
+        return [origin + "/sitemap.xml"]
+
+    async def read(self, url: str) -> AsyncIterator[tuple[str, SitemapEntry]]:
+        parser = SitemapParser()
+        async with self.client.stream("GET", self.rewrite(url)) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            async for chunk in response.aiter_bytes():
+                for item in parser.feed(chunk):
+                    yield item
+        for item in parser.close():
+            yield item
+
+    async def entries(self, sitemaps: list[str]) -> AsyncIterator[SitemapEntry]:
+        """Yields the URL entries of `sitemaps`, following sitemap indexes depth-first."""
+        stack = list(reversed(sitemaps))
+        visited = set()
+        while stack and self.sitemaps_read < self.max_sitemaps:
+            url = stack.pop()
+            if url in visited:
+                continue
+            visited.add(url)
+            children = []
+            try:
+                async for kind, entry in self.read(url):
+                    if kind == "sitemap":
+                        children.append(entry.loc)
+                    else:
+                        yield entry
+                self.sitemaps_read += 1
+            except (httpx.HTTPError, RuntimeError, ParseError, zlib.error) as e:
+                self.failed += 1
+                logging.warning(f"[SITEMAP] Skipping {url}: {e}")
+            stack.extend(reversed(children))
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,303 @@
+"""
+Adaptive per-host rate control.
+
+Each host gets a `HostThrottle` made of:
+
+- `TokenBucket`: paces request starts to `rate` requests/second.
+- `AdaptiveConcurrency`: an AIMD limit on in-flight requests. The limit
+  grows by one after a full window of healthy responses and halves when
+  latency drifts well above its baseline or the recent error rate climbs.
+- Block backoff: a block page ("Access Denied", 403/429, captcha...) halves
+  both limit and rate and pauses the host with exponential backoff.
+
+`ThrottledFetcher` wraps any fetch engine with a `Throttle` and retries
+blocked pages once the pause is over.
+"""
+
+import asyncio
+import logging
+import random
+import re
+import time
+from collections import deque
+from dataclasses import replace
+from typing import Optional
+from urllib.parse import urlsplit
+
+BLOCK_STATUSES = {403, 429}
+BLOCK_MARKERS = (
+    "access denied",
+    "pardon our interruption",
+    "request unsuccessful",
+    "are you a robot",
+    "captcha",
+    "too many requests",
+)
+
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+
+
+def is_block_page(html: str, status: int = 200) -> bool:
+    """True for bot-protection responses: block statuses or a block marker in the page title."""
+    if status in BLOCK_STATUSES:
+        return True
+    if not html:
+        return False
+    match = _TITLE_RE.search(html, 0, 20000)
+    title = match.group(1).lower() if match else ""
+    return any(marker in title for marker in BLOCK_MARKERS)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so requests leave the bucket in FIFO order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def set_rate(self, rate: float) -> None:
+        self._refill()
+        self.rate = rate
+
+
+class AdaptiveConcurrency:
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 8,
+                 latency_tolerance: float = 2.0, latency_floor: float = 1.0,
+                 error_threshold: float = 0.25, window: int = 20):
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.latency_floor = latency_floor
+        self.error_threshold = error_threshold
+
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self.outcomes = deque(maxlen=window)
+        self._since_change = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def record(self, latency: float, ok: bool) -> Optional[str]:
+        """Feeds one response into the controller; returns "increase"/"decrease" when the limit moved."""
+        self.outcomes.append(ok)
+        self._since_change += 1
+        if ok:
+            self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            self.baseline = self.latency_ewma if self.baseline is None else min(self.baseline, self.latency_ewma)
+
+        # Only react once per window of `limit` responses, i.e. once the last change had a chance to show
+        if self._since_change < self.limit:
+            return None
+
+        errors = self.outcomes.count(False)
+        error_rate = errors / len(self.outcomes)
+        slow = (
+            self.latency_ewma is not None
+            and self.latency_ewma > max(self.baseline * self.latency_tolerance, self.latency_floor)
+        )
+        if (len(self.outcomes) >= self.outcomes.maxlen // 2 and error_rate > self.error_threshold) or slow:
+            return self.decrease()
+        if ok:
+            return self.increase()
+        return None
+
+    def increase(self) -> Optional[str]:
+        self._since_change = 0
+        if self.limit >= self.max_limit:
+            return None
+        self.limit += 1
+        self._notify()
+        return "increase"
+
+    def decrease(self) -> Optional[str]:
+        self._since_change = 0
+        # Let the baseline re-learn at the lower load
+        self.baseline = self.latency_ewma
+        if self.limit <= self.min_limit:
+            return None
+        self.limit = max(self.min_limit, self.limit // 2)
+        return "decrease"
+
+    def _notify(self):
+        async def wake():
+            async with self._cond:
+                self._cond.notify_all()
+        try:
+            asyncio.get_running_loop().create_task(wake())
+        except RuntimeError:
+            pass
+
+
+class HostThrottle:
+    def __init__(self, host: str, concurrency: AdaptiveConcurrency, bucket: TokenBucket,
+                 min_rate: float, max_rate: float, rate_step: float,
+                 backoff_base: float, backoff_max: float):
+        self.host = host
+        self.concurrency = concurrency
+        self.bucket = bucket
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_step = rate_step
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.paused_until = 0.0
+        self.consecutive_blocks = 0
+        self.requests = 0
+        self.errors = 0
+        self.blocks = 0
+
+    async def acquire(self) -> None:
+        while True:
+            delay = self.paused_until - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        await self.concurrency.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            # Cancelled while waiting for a token: the slot was never used
+            await self.concurrency.release()
+            raise
+
+    async def release(self, latency: float, ok: bool, blocked: bool = False) -> None:
+        self.requests += 1
+        if blocked:
+            self.on_block()
+        else:
+            if ok:
+                self.consecutive_blocks = 0
+            else:
+                self.errors += 1
+            change = self.concurrency.record(latency, ok)
+            if change == "increase":
+                self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.rate_step))
+            elif change == "decrease":
+                self.bucket.set_rate(max(self.min_rate, self.bucket.rate / 2))
+                logging.info(f"[THROTTLE] {self.host}: slowing down to {self.concurrency.limit} in flight, {self.bucket.rate:.2f} req/s")
+        await self.concurrency.release()
+
+    def on_block(self) -> None:
+        self.blocks += 1
+        self.consecutive_blocks += 1
+        self.concurrency.decrease()
+        self.bucket.set_rate(max(self.min_rate, self.bucket.rate / 2))
+
+        pause = min(self.backoff_max, self.backoff_base * 2 ** (self.consecutive_blocks - 1))
+        pause *= random.uniform(0.8, 1.2)
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+        logging.warning(
+            f"[THROTTLE] Block page from {self.host} (#{self.consecutive_blocks}); "
+            f"pausing {pause:.0f}s at {self.bucket.rate:.2f} req/s"
+        )
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.concurrency.limit,
+            "in_flight": self.concurrency.in_flight,
+            "rate": round(self.bucket.rate, 2),
+            "latency_ewma": round(self.concurrency.latency_ewma, 3) if self.concurrency.latency_ewma else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "blocks": self.blocks,
+        }
+
+
+class Throttle:
+    """Keeps one `HostThrottle` per host, all built from the same settings."""
+
+    def __init__(self, max_concurrency: int = 8, initial_concurrency: Optional[int] = None,
+                 rate: float = 4.0, min_rate: float = 0.2, max_rate: float = 16.0, rate_step: float = 0.5,
+                 backoff_base: float = 30.0, backoff_max: float = 600.0, latency_floor: float = 1.0):
+        self.max_concurrency = max_concurrency
+        self.initial_concurrency = initial_concurrency or max(1, max_concurrency // 2)
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_step = rate_step
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency_floor = latency_floor
+        self.hosts = {}
+
+    def for_url(self, url: str) -> HostThrottle:
+        host = urlsplit(url).netloc
+        throttle = self.hosts.get(host)
+        if throttle is None:
+            throttle = HostThrottle(
+                host,
+                AdaptiveConcurrency(self.initial_concurrency, max_limit=self.max_concurrency,
+                                    latency_floor=self.latency_floor),
+                TokenBucket(self.rate, burst=max(1, self.initial_concurrency)),
+                self.min_rate, self.max_rate, self.rate_step,
+                self.backoff_base, self.backoff_max,
+            )
+            self.hosts[host] = throttle
+        return throttle
+
+    def stats(self) -> dict:
+        return {host: t.stats() for host, t in self.hosts.items()}
+
+
+class ThrottledFetcher:
+    """Runs every fetch through a `Throttle`; block pages are retried after the backoff."""
+
+    def __init__(self, inner, throttle: Throttle, block_retries: int = 2):
+        self.inner = inner
+        self.throttle = throttle
+        self.block_retries = block_retries
+        self.engine = getattr(inner, "engine", "")
+
+    async def fetch(self, url, wait_selector=None, required_selector=None, headers=None):
+        host = self.throttle.for_url(url)
+        for attempt in range(self.block_retries + 1):
+            await host.acquire()
+            start = time.perf_counter()
+            result = None
+            try:
+                result = await self.inner.fetch(url, wait_selector, required_selector, headers=headers)
+            finally:
+                blocked = result is not None and is_block_page(result.html, result.status)
+                ok = result is not None and (result.ok or result.status in (304, 404))
+                await host.release(time.perf_counter() - start, ok and not blocked, blocked)
+
+            if not blocked:
+                return result
+
+        logging.error(f"[THROTTLE] Still blocked after {self.block_retries} retries: {url}")
+        # Never hand a block page to the parsers
+        return replace(result, html="")
+
+    async def aclose(self):
+        stats = self.throttle.stats()
+        if stats:
+            logging.info(f"[THROTTLE] {stats}")
+        await self.inner.aclose()
@@ -5,22 +5,34 @@ import hashlib
 import logging
 import time
 import json
-import uuid
+import math
+import os
+import socket
 import argparse  # Added for CLI arguments
 from pathlib import Path
-from urllib.parse import urljoin, urlparse
-from queue import Queue, Empty, Full
+from urllib.parse import urlsplit
 
+import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
 from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import WebDriverException, TimeoutException
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from tqdm.asyncio import tqdm_asyncio
 
+from crawling.browser import PoolRenderer, create_chrome_driver
+from crawling.coordinator import Coordinator, InProcessBroker, MqttBus, ShardLedger, Worker
+from crawling.driver_pool import DriverPool
+from crawling.engine import CrawlEngine, FrontierSource, PageScraper
+from crawling.fetchers import FETCH_MODES, build_fetcher
+from crawling.frontier import DONE, FAILED, PENDING, Frontier, new_job_id
+from crawling.jobs import CANCELLED, DONE as JOB_DONE, FAILED as JOB_FAILED, Budget, Job, JobScheduler, run_until_cancelled
+from crawling.incremental import PageIndex, PageVersion, hash_html, hash_rows, header_value
+from crawling.metrics import MeteredFetcher, MetricsRegistry, MetricsServer
+from crawling.parsing import PARSER_BACKENDS, DiscoveryExtractor, new_parse_pool, parse_product_html
+from crawling.replay import PageStore, RecordingFetcher, RewritingFetcher
+from crawling.sinks import PYARROW_AVAILABLE, ParquetSink, has_products, read_products, rows_to_product
+from crawling.sitemap import SitemapReader
+from crawling.throttle import Throttle, ThrottledFetcher
+from crawling.urlseen import UrlSeen
+
 try:
     import aiomqtt
     MQTT_AVAILABLE = True
@@ -38,9 +50,10 @@ except ImportError:
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, SecretStr
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, String, Text, JSON, Integer, ForeignKey, UniqueConstraint
+from sqlalchemy import create_engine, select, and_, case, Column, String, Text, JSON, Integer, ForeignKey, UniqueConstraint
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
 import re
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.orm import declarative_base
 from sqlalchemy.dialects.mysql import insert
 
 load_dotenv()
@@ -110,13 +123,109 @@ BASE_URL = "https://www.weg.net"
 WAIT_TIMEOUT = 30
 MAX_WORKERS = 8
 MAX_DRIVERS = 8
+# Processes for HTML parsing, separate from the fetch/driver threads (0 = parse in threads)
+PARSE_WORKERS = os.cpu_count() or 1
+# Shared by every job, see start_parse_pool()
+PARSE_POOL = None
+
+# Fetch engine: "http" (plain HTTP only), "selenium" (Chrome for every page)
+# or "hybrid" (HTTP first, Chrome only when the required selectors are missing)
+FETCH_MODE = "hybrid"
+HTTP_MAX_CONNECTIONS = 16
+# Adaptive per-host pacing: MAX_WORKERS is the ceiling, the AIMD controller
+# finds the actual concurrency/rate and backs off when block pages appear
+ADAPTIVE_THROTTLE = True
+THROTTLE_RATE = 4.0          # initial requests/second per host
+THROTTLE_MAX_RATE = 16.0
+BLOCK_BACKOFF_BASE = 30.0    # seconds, doubled on each consecutive block
+BLOCK_BACKOFF_MAX = 600.0
+
+# Product page parser: "lxml" (single-pass), "bs4" (selector-based) or "auto"
+PARSER_BACKEND = "auto"
+
+# Offline corpus: RECORD_DIR saves every fetched page into a PageStore,
+# REPLAY_ORIGIN (e.g. a FixtureServer URL) replaces BASE_URL when fetching
+RECORD_DIR = None
+REPLAY_ORIGIN = None
+
+DISCOVERY_WAIT_SELECTOR = "a[href]"
+# Links further than this many hops from START_URL are not followed
+DISCOVERY_MAX_DEPTH = 8
+# Only pages in this language are crawled
+LANGUAGE_MARKER = "/BR/en/"
+# Where discovery gets URLs: "sitemap" (robots.txt/sitemap.xml over plain HTTP),
+# "links" (follow links from START_URL) or "auto" (sitemaps, links if they list no products)
+DISCOVERY_SOURCES = ("auto", "sitemap", "links")
+DISCOVERY_SOURCE = "auto"
+# Sitemaps to read instead of the ones listed in robots.txt
+SITEMAP_URLS = []
+PRODUCT_WAIT_SELECTOR = "h1, table"
+PRODUCT_REQUIRED_SELECTOR = "h1.product-card-title, div.product-info-specs table, table.table-striped"
 
 # Adjust path or use environment variable for flexibility
 CHROMEDRIVER_PATH = r"C:\chromedriver\chromedriver.exe"
+# Block images/media/fonts/analytics, eager page loads and capped renderer memory
+LEAN_BROWSER = True
+
+# Driver pool: hard cap is MAX_DRIVERS; drivers are recycled after
+# DRIVER_MAX_PAGES pages or above DRIVER_MAX_RSS_MB of Chrome memory
+PREWARM_DRIVERS = min(4, MAX_DRIVERS)
+DRIVER_MAX_PAGES = 200
+DRIVER_MAX_RSS_MB = 1500
+DRIVER_IDLE_TIMEOUT = 300
+DRIVER_ACQUIRE_TIMEOUT = WAIT_TIMEOUT * 4
 
 DATA_DIR = Path("data")
 PRODUCT_URLS_FILE = DATA_DIR / "product_urls.csv"
 OUTPUT_FILE = DATA_DIR / "weg_products_final.csv"
+DEAD_LETTER_FILE = DATA_DIR / "upsert_dead_letter.jsonl"
+# Crawl frontier: per-URL state of every discovery/product job, for resume
+FRONTIER_DB = DATA_DIR / "frontier.sqlite3"
+FRONTIER_MAX_ATTEMPTS = 3
+# Seen-URL set of each discovery job (<job_id>.npy), memory-mapped on resume
+FRONTIER_SEEN_DIR = DATA_DIR / "frontier_seen"
+# Incremental re-crawl: ETag/Last-Modified and HTML/content hashes per product
+# page; with INCREMENTAL only pages whose extracted content changed are
+# parsed and upserted (the index is updated on every product crawl)
+PAGE_INDEX_DB = DATA_DIR / "page_index.sqlite3"
+INCREMENTAL = False
+
+# Upsert tuning: rows per executemany chunk and retries for transient DB errors
+UPSERT_BATCH_SIZE = 500
+UPSERT_MAX_RETRIES = 3
+
+# Streaming pipeline: scraped products are upserted while the crawl runs,
+# the long CSV is only kept as an audit trail
+STREAM_TO_DB = True
+AUDIT_CSV = True
+# One zstd Parquet record per product (partitioned by scrape date); the
+# import job and Miner read it instead of the long CSV when it exists
+PARQUET_OUTPUT = PYARROW_AVAILABLE
+PARQUET_DIR = DATA_DIR / "products"
+STREAM_BATCH_SIZE = 100
+STREAM_FLUSH_INTERVAL = 5.0
+STREAM_QUEUE_SIZE = MAX_WORKERS * 4
+
+# Sharded crawling (crawling/coordinator.py): a distributed product job is cut into
+# SHARD_SIZE-URL shards that `--role worker` processes lease over MQTT
+DISTRIBUTED = False
+SHARDS_DB = DATA_DIR / "shards.sqlite3"
+SHARD_SIZE = 50
+SHARD_LEASE_SECONDS = 120.0  # a worker silent for this long loses its shards
+WORKER_SLOTS = 2             # shards a worker scrapes at once
+WORKER_ID = None             # defaults to <hostname>-<pid>
+
+# Job scheduling in the MQTT service (crawling/jobs.py): higher priorities run first and may
+# preempt (pause) a running job of lower priority. Refresh jobs (a few product codes, URLs or a
+# category subtree) outrank full crawls so they finish in seconds even while one is running
+MAX_CONCURRENT_JOBS = 2
+JOB_PRIORITIES = {"discovery": 0, "product": 0, "import": 0, "refresh": 10}
+# Status wording for JobControl.outcome() when a job returns
+JOB_OUTCOMES = {None: "complete", "cancelled": "cancelled", "budget": "stopped at its page budget"}
+
+# Live metrics: JSON on MQTT every METRICS_INTERVAL seconds, Prometheus text on METRICS_PORT (0 disables)
+METRICS_INTERVAL = 10.0
+METRICS_PORT = 9464
 
 # Create directories before logging
 DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -135,37 +244,41 @@ logging.basicConfig(
 # ===================== DRIVER POOL ==========================
 # ============================================================
 
-CHROME_POOL: Queue = Queue(maxsize=MAX_DRIVERS)
+def create_driver_instance() -> webdriver.Chrome:
+    return create_chrome_driver(CHROMEDRIVER_PATH, lean=LEAN_BROWSER)
 
 
-def create_driver_instance() -> webdriver.Chrome:
-    opts = Options()
-    opts.add_argument("--headless=new")
-    opts.add_argument("--disable-gpu")
-    opts.add_argument("--no-sandbox")
-    opts.add_argument("--disable-dev-shm-usage") 
-    opts.add_argument("--log-level=3")
-    opts.add_experimental_option("excludeSwitches", ["enable-logging"])
-    opts.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
-    )
+DRIVER_POOL = DriverPool(
+    create_driver_instance,
+    max_size=MAX_DRIVERS,
+    max_pages=DRIVER_MAX_PAGES,
+    max_rss_mb=DRIVER_MAX_RSS_MB,
+    idle_timeout=DRIVER_IDLE_TIMEOUT,
+    acquire_timeout=DRIVER_ACQUIRE_TIMEOUT,
+)
+
+
+# One CrawlMetrics per running job (see MetricsRegistry); the driver pool is shared by all of them
+METRICS = MetricsRegistry()
+METRICS.add_source("drivers", DRIVER_POOL.stats)
+
 
-    service = Service(CHROMEDRIVER_PATH, service_args=["--read-timeout=300"])
-    return webdriver.Chrome(service=service, options=opts)
+def start_drivers():
+    """Prewarms the pool unless every page is fetched over plain HTTP."""
+    if FETCH_MODE != "http":
+        started = DRIVER_POOL.prewarm(PREWARM_DRIVERS)
+        logging.info(f"[POOL] {started} Chrome drivers ready")
+
+
+def stop_drivers():
+    logging.info(f"[POOL] {DRIVER_POOL.stats()}")
+    DRIVER_POOL.close()
 
 
 # ============================================================
 # ======================= HELPERS ============================
 # ============================================================
 
-def is_valid_language(url: str) -> bool:
-    return "/BR/en/" in url
-
-def normalize_url(url: str) -> str:
-    parsed = urlparse(url)
-    return parsed._replace(fragment="", query="").geturl()
-
 def looks_like_product(url: str) -> bool:
     u = url.lower()
     return any(x in u for x in [
@@ -173,273 +286,809 @@ def looks_like_product(url: str) -> bool:
         "/industrial/", "/motors/", "/drives/", "/automation/", "/p/"
     ])
 
+# Discovery fetches higher priorities first
+PRIORITY_LISTING = 2   # category and listing pages, where most new links come from
+PRIORITY_PAGE = 1
+PRIORITY_LEAF = 0      # product pages, which mostly link back to known pages
+
+def url_priority(url: str) -> int:
+    path = urlsplit(url).path.lower()
+    if "/p/" in path:
+        return PRIORITY_LEAF
+    if "/c/" in path or "/catalog/" in path:
+        return PRIORITY_LISTING
+    return PRIORITY_PAGE
+
 # ============================================================
 # ==================== CRAWLER LOGIC =========================
 # ============================================================
 
-def scrape_page_discovery(url: str) -> list[str]:
-    driver = None
-    soup = None
+# Loads a page in a pooled Chrome driver and returns the rendered HTML
+render_page = PoolRenderer(DRIVER_POOL, WAIT_TIMEOUT)
 
-    try:
-        driver = CHROME_POOL.get_nowait()
-    except Empty:
-        driver = create_driver_instance()
+def new_throttle():
+    return Throttle(
+        max_concurrency=MAX_WORKERS,
+        rate=THROTTLE_RATE,
+        max_rate=THROTTLE_MAX_RATE,
+        backoff_base=BLOCK_BACKOFF_BASE,
+        backoff_max=BLOCK_BACKOFF_MAX,
+    )
 
+def new_fetcher(executor, parse_pool=None, metrics=None):
+    fetcher = build_fetcher(FETCH_MODE, render_page, executor, max_connections=HTTP_MAX_CONNECTIONS,
+                            timeout=WAIT_TIMEOUT, check_executor=parse_pool)
+    if REPLAY_ORIGIN:
+        fetcher = RewritingFetcher(fetcher, BASE_URL, REPLAY_ORIGIN)
+    # Inside the throttle, so fetch times exclude pacing and every blocked attempt is counted
+    if metrics:
+        fetcher = MeteredFetcher(fetcher, metrics)
+    if ADAPTIVE_THROTTLE:
+        throttle = new_throttle()
+        if metrics:
+            metrics.add_source("throttle", throttle.stats)
+        fetcher = ThrottledFetcher(fetcher, throttle)
+    if RECORD_DIR:
+        fetcher = RecordingFetcher(fetcher, PageStore(RECORD_DIR))
+    return fetcher
+
+def start_parse_pool():
+    """
+    CPU stage: HTML parsing runs in PARSE_WORKERS worker processes, away from
+    the fetch threads. The pool is started once from __main__, before any
+    thread exists, and shared by every job; until then jobs parse in threads.
+    """
+    global PARSE_POOL
+    if PARSE_POOL is None:
+        PARSE_POOL = new_parse_pool(PARSE_WORKERS)
+    return PARSE_POOL
+
+def stop_parse_pool():
+    global PARSE_POOL
+    if PARSE_POOL is not None:
+        PARSE_POOL.shutdown(wait=True)
+        PARSE_POOL = None
+
+def discovery_scraper(fetcher, parse_pool, metrics=None):
+    """Fetch + link extraction for one discovery page: `(url) -> links`."""
+    return PageScraper(fetcher, DiscoveryExtractor(BASE_URL, LANGUAGE_MARKER), parse_pool,
+                       wait_selector=DISCOVERY_WAIT_SELECTOR, metrics=metrics)
+
+def open_job(frontier, kind, job_id=None, resume=False, meta=None):
+    """Starts a new frontier job, or picks up a stored one when `resume` is set. Returns (job_id, meta)."""
+    if resume:
+        job = frontier.resume_job(job_id)
+        if job["kind"] != kind:
+            raise ValueError(f"Job {job_id} is a {job['kind']} job, not {kind}")
+        logging.info(f"[FRONTIER] Resuming {kind} job {job_id}: {frontier.counts(job_id)}")
+        return job_id, job["meta"]
+
+    job_id = job_id or new_job_id()
+    frontier.start_job(job_id, kind, meta)
+    logging.info(f"[FRONTIER] Started {kind} job {job_id}")
+    return job_id, meta or {}
+
+# Jobs running side by side share one store per SQLite file: every store batches its writes in
+# checkpointed transactions, and a second connection to the same file would block on them
+_STORES = {}
+
+def open_store(cls, path, **kwargs):
+    """Opens the `cls` store at `path`, or shares the one already open; pair with close_store."""
+    key = (cls, str(path))
+    entry = _STORES.get(key)
+    if entry is None:
+        entry = _STORES[key] = [cls(path, **kwargs), 0]
+    entry[1] += 1
+    return entry[0]
+
+def close_store(store):
+    for key, entry in list(_STORES.items()):
+        if entry[0] is store:
+            entry[1] -= 1
+            if entry[1] > 0:
+                store.checkpoint()
+                return
+            del _STORES[key]
+            break
+    store.close()
+
+def open_frontier():
+    return open_store(Frontier, FRONTIER_DB, max_attempts=FRONTIER_MAX_ATTEMPTS)
+
+def lookup_job(job_id):
+    frontier = open_frontier()
     try:
-        driver.get(url)
-        try:
-            WebDriverWait(driver, WAIT_TIMEOUT).until(
-                EC.presence_of_element_located(("css selector", "a[href]"))
-            )
-        except TimeoutException:
-            title = driver.title
-            logging.warning(f"[DISCOVERY] Timeout on {url}. Page Title: '{title}'")
-            if "Access Denied" in title or "Pardon" in title:
-                logging.error("BLOCKED: WEG has detected the crawler as a bot.")
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-
+        return frontier.get_job(job_id)
     finally:
-        try:
-            CHROME_POOL.put_nowait(driver)
-        except Full:
-            driver.quit()
-
-    if not soup:
-        return []
-
-    links = set()
-    for a in soup.select("a[href]"):
-        href = a.get("href")
-        if not href or href.startswith("#"):
-            continue
-
-        if any(ext in href.lower() for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']):
-            continue
-            
-        full = normalize_url(urljoin(BASE_URL, href))
-        if BASE_URL in full and is_valid_language(full):
-            links.add(full)
+        close_store(frontier)
 
-    return list(links)
-
-async def discovery_crawl(start_url: str, passes: int = 2) -> set[str]:
-    executor = ThreadPoolExecutor(MAX_WORKERS)
-    loop = asyncio.get_running_loop()
-
-    discovered = set([start_url])
+def frontier_gauge(frontier, job_id, metrics, interval=1.0):
+    """
+    Returns an `update(force=False)` that sets the "frontier" gauge to the
+    job's pending URL count. The count is a query, so unless forced it runs
+    at most every `interval` seconds.
+    """
+    last = None
 
-    for p in range(passes):
-        logging.info(f"[DISCOVERY] Pass {p+1}")
-        pending = set(discovered)
-        visited = set()
+    def update(force=False):
+        nonlocal last
+        now = time.monotonic()
+        if force or last is None or now - last >= interval:
+            metrics.set_gauge("frontier", frontier.counts(job_id)[PENDING])
+            last = now
 
-        pbar = tqdm_asyncio(desc=f"Discovery pass {p+1}", unit="page", total=len(pending))
+    return update
 
-        while pending:
-            batch = set()
-            while pending and len(batch) < MAX_WORKERS:
-                u = pending.pop()
-                if u not in visited:
-                    visited.add(u)
-                    batch.add(loop.run_in_executor(executor, scrape_page_discovery, u))
+def queue_links(frontier, job_id, links, depth, seen=None) -> int:
+    """
+    Adds links to the frontier grouped by `url_priority`; returns how many
+    were new. Links already in `seen` never reach SQLite.
+    """
+    if seen is not None:
+        links = [link for link in links if seen.add(link)]
+    groups = {}
+    for link in links:
+        groups.setdefault(url_priority(link), []).append(link)
+    return sum(frontier.add(job_id, urls, depth=depth, priority=priority) for priority, urls in groups.items())
+
+def open_seen(frontier, job_id, resume=False) -> UrlSeen:
+    """
+    Opens the persisted seen-set of a discovery job. Every URL in it was
+    handed to the frontier, so on resume it is trusted when its size
+    matches the job's URL count; otherwise (lost journal, crash between
+    the two writes) it is rebuilt from the frontier.
+    """
+    path = FRONTIER_SEEN_DIR / f"{job_id}.npy"
+    if not resume:
+        UrlSeen.remove(path)
+        return UrlSeen(path)
+
+    seen = UrlSeen(path)
+    total = sum(frontier.counts(job_id).values())
+    if len(seen) != total:
+        logging.warning(f"[FRONTIER] Seen set of job {job_id} is out of date ({len(seen)}/{total}), rebuilding")
+        seen.close()
+        UrlSeen.remove(path)
+        seen = UrlSeen(path)
+        seen.update(frontier.urls(job_id))
+    return seen
+
+async def discovery_crawl(start_url: str, job_id=None, resume=False, max_depth=None, control=None) -> set[str]:
+    """
+    Follows same-site links from `start_url` in a single pass. Every URL
+    and its state lives in the SQLite frontier, with the job's seen-set
+    saved beside it, so an interrupted job can be resumed by id.
 
-            done, _ = await asyncio.wait(batch)
-            for fut in done:
-                pbar.update(1)
-                try:
-                    new_links = fut.result()
-                    for l in new_links:
-                        if l not in discovered:
-                            discovered.add(l)
-                            pending.add(l)
-                    pbar.total = len(pending) + len(visited)
-                except Exception as e:
-                    logging.error(e)
+    Workers are refilled as soon as any page finishes (no lock-step
+    batches), always with the highest-priority pending URLs: listing pages
+    before other pages before product leaves, shallowest first. Links found
+    deeper than `max_depth` (default DISCOVERY_MAX_DEPTH) are dropped.
 
+    A JobControl in `control` can pause or cancel the crawl and cap it with
+    a Budget; a crawl stopped early is left resumable.
+    """
+    max_depth = DISCOVERY_MAX_DEPTH if max_depth is None else max_depth
+    frontier = open_frontier()
+    job_id, meta = open_job(frontier, "discovery", job_id, resume,
+                            {"source": "links", "start_url": start_url, "max_depth": max_depth})
+    max_depth = meta.get("max_depth", max_depth)
+    metrics = METRICS.begin("discovery", job_id)
+    # Filter in front of the frontier (most links on a page are already known),
+    # flushed with every frontier checkpoint
+    seen = open_seen(frontier, job_id, resume)
+    frontier.checkpoint_hooks.append(seen.flush)
+    if not resume:
+        queue_links(frontier, job_id, [start_url], depth=0, seen=seen)
+
+    executor = ThreadPoolExecutor(control.drivers(MAX_WORKERS) if control else MAX_WORKERS)
+    parse_pool = PARSE_POOL
+    fetcher = new_fetcher(executor, parse_pool, metrics)
+
+    counts = frontier.counts(job_id)
+    pbar = tqdm_asyncio(desc="Discovery", unit="page",
+                        total=sum(counts.values()), initial=counts[DONE] + counts[FAILED])
+    update_frontier_gauge = frontier_gauge(frontier, job_id, metrics)
+
+    async def on_result(u, depth, links):
+        if depth < max_depth:
+            pbar.total += queue_links(frontier, job_id, links, depth + 1, seen)
+        frontier.mark_done(job_id, u)
+        pbar.update(1)
+        metrics.page_done()
+        update_frontier_gauge()
+
+    async def on_error(u, depth, e):
+        logging.error(f"[DISCOVERY] Error {u}: {e}")
+        if frontier.mark_failed(job_id, u, str(e)):
+            pbar.update(1)
+            metrics.page_done(failed=True)
+
+    crawler = CrawlEngine(FrontierSource(frontier, job_id), discovery_scraper(fetcher, parse_pool, metrics),
+                          on_result, on_error, max_workers=MAX_WORKERS, control=control, metrics=metrics)
+    try:
+        stopped = await crawler.run()
+        update_frontier_gauge(force=True)
+        crawler.log_stats("DISCOVERY")
+        if stopped:
+            logging.info(f"[DISCOVERY] Job {job_id} stopped early ({stopped}); resume it to continue")
+        frontier.set_job_state(job_id, "interrupted" if stopped else "done")
+        return set(frontier.urls(job_id))
+    except BaseException:
+        frontier.set_job_state(job_id, "interrupted")
+        raise
+    finally:
         pbar.close()
+        frontier.checkpoint_hooks.remove(seen.flush)
+        seen.close()
+        close_store(frontier)
+        await fetcher.aclose()
+        executor.shutdown(wait=True)
+        logging.info(f"[METRICS] {json.dumps(METRICS.end(job_id), default=str)}")
+
+async def report_metrics(publish, interval=None):
+    """Hands a METRICS snapshot (every running job) to `publish` every `interval` (default METRICS_INTERVAL) seconds."""
+    interval = interval or METRICS_INTERVAL
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await publish(METRICS.snapshot())
+        except Exception as e:
+            logging.error(f"[METRICS] Publish failed: {e}")
 
-    executor.shutdown(wait=True)
-    return discovered
+def start_metrics_server():
+    """Starts the Prometheus endpoint on METRICS_PORT; returns None when disabled or the port is taken."""
+    if not METRICS_PORT:
+        return None
+    try:
+        return MetricsServer(METRICS, METRICS_PORT).start()
+    except OSError as e:
+        logging.warning(f"[METRICS] Cannot serve metrics on port {METRICS_PORT}: {e}")
+        return None
+
+def replay_rewrite(url: str) -> str:
+    """Points BASE_URL addresses at REPLAY_ORIGIN, like RewritingFetcher."""
+    if REPLAY_ORIGIN and url.startswith(BASE_URL):
+        return REPLAY_ORIGIN.rstrip("/") + url[len(BASE_URL):]
+    return url
+
+async def sitemap_discovery(start_url: str, job_id=None, control=None) -> dict:
+    """
+    Reads the site's sitemaps over plain HTTP and returns {url: lastmod}
+    for every same-site page in LANGUAGE_MARKER (lastmod may be None).
+    No page is rendered.
+    """
+    frontier = open_frontier()
+    job_id, _ = open_job(frontier, "discovery", job_id, meta={"source": "sitemap", "start_url": start_url})
+    reader = SitemapReader(rewrite=replay_rewrite)
+    found = {}
+    state = "interrupted"
+    try:
+        sitemaps = SITEMAP_URLS or await reader.find_sitemaps(start_url)
+        logging.info(f"[SITEMAP] Reading {sitemaps}")
+        async for entry in reader.entries(sitemaps):
+            if entry.loc.startswith(BASE_URL) and LANGUAGE_MARKER in entry.loc:
+                found[entry.loc] = entry.lastmod
+            if control and control.cancelled:
+                break
+        else:
+            state = "done"
+    finally:
+        await reader.aclose()
+        frontier.set_job_state(job_id, state, {"source": "sitemap", "start_url": start_url, "urls": len(found)})
+        close_store(frontier)
+    logging.info(f"[SITEMAP] {len(found)} URLs from {reader.sitemaps_read} sitemaps ({reader.failed} failed)")
+    return found
 
-def save_product_urls(urls: set[str]):
+async def run_discovery(start_url: str, job_id=None, resume=False, source=None, control=None):
+    """
+    Runs discovery from DISCOVERY_SOURCE (or `source`) and returns
+    (urls, lastmods). "auto" reads the sitemaps and falls back to the link
+    crawl when they are missing or list no product pages. Only link crawls
+    are resumable; an unfinished sitemap job is simply read again.
+    """
+    source = source or DISCOVERY_SOURCE
+    if source not in DISCOVERY_SOURCES:
+        raise ValueError(f"Unknown discovery source: {source}")
+    if resume:
+        job = lookup_job(job_id)
+        if job and job["meta"].get("source") == "links":
+            return await discovery_crawl(start_url, job_id=job_id, resume=True, control=control), {}
+
+    if source != "links":
+        try:
+            lastmods = await sitemap_discovery(start_url, job_id, control)
+        except Exception as e:
+            if source == "sitemap":
+                raise
+            logging.warning(f"[SITEMAP] Sitemap discovery failed: {e}")
+            lastmods = {}
+        if source == "sitemap" or any(looks_like_product(u) for u in lastmods):
+            return set(lastmods), lastmods
+        logging.info("[DISCOVERY] Sitemaps listed no product pages, crawling links instead")
+
+    return await discovery_crawl(start_url, job_id=job_id, control=control), {}
+
+def save_product_urls(urls: set[str], lastmods=None):
+    """Writes the product URLs (with their sitemap lastmod, when known) to PRODUCT_URLS_FILE."""
     products = sorted({u for u in urls if looks_like_product(u)})
+    lastmods = lastmods or {}
 
     with open(PRODUCT_URLS_FILE, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
-        w.writerow(["product_url"])
+        w.writerow(["product_url", "lastmod"])
         for u in products:
-            w.writerow([u])
+            lastmod = lastmods.get(u)
+            w.writerow([u, lastmod.isoformat() if lastmod else ""])
 
     logging.info(f"[DISCOVERY] Produtos encontrados: {len(products)}")
     print(f"Found {len(products)} product URLs")
 
-def extract_product_data(soup: BeautifulSoup, url: str) -> list[list[str]]:
-    """
-    Extracts product data including images and flattens it 
-    into a list of [URL, Feature, Value] rows for CSV storage.
-    """
-    rows = []
-    def add(feature, value):
-        if feature and value: 
-            rows.append([url, feature, value])
-    
-    breadcrumb_elements = soup.select('ol.breadcrumb li span[itemprop="name"]')
-    if breadcrumb_elements:
-        levels = [b.get_text(strip=True) for b in breadcrumb_elements]
-        path_levels = levels[1:-1] 
-        
-        full_path = " > ".join(path_levels)
-        add("Category_Path", full_path)
-        
-        for i, level in enumerate(path_levels):
-            add(f"Category_Level_{i+1}", level)
-            
-    name = soup.select_one("h1.product-card-title")
-    if name: add("Product Name", name.get_text(strip=True))
-    
-    code = soup.select_one("small.product-card-info")
-    if code: 
-        add("Product Code", code.get_text(strip=True).replace("Product:", "").strip())
-    
-    desc = soup.select_one("div.xtt-product-description p")
-    if desc: 
-        add("Description", desc.get_text(strip=True))
-    
-    # Extract tables (features and details)
-    for table in soup.select("div.product-info-specs table.table, table.table-striped"):
-        for tr in table.select("tr"):
-            th, td = tr.find("th"), tr.find("td")
-            if th and td: 
-                add(th.get_text(strip=True), td.get_text(strip=True))
-    
+def unchanged_by_lastmod(urls, lastmods, page_index):
+    """URLs whose sitemap lastmod is not newer than our last fetch of them."""
+    unchanged = set()
+    for url, lastmod in zip(urls, lastmods):
+        if not isinstance(lastmod, str) or not lastmod:
+            continue
+        fetched_at = page_index.fetched_at(url)
+        if fetched_at is not None and pd.Timestamp(lastmod).timestamp() <= fetched_at:
+            unchanged.add(url)
+    return unchanged
 
-    image_selectors = [
-        # Main product image
-        "div.product-image img[src]",
-        "img.product-image[src]",
-        "div.xtt-product-image-zoom img[src]",
-        # Gallery images
-        "div.product-gallery img[src]",
-        "ul.product-thumbnails img[src]",
-        "div.carousel-item img[src]",
-        # General product images
-        "div.product-images img[src]",
-        "section.product-images img[src]",
-        # Any img tag that might contain product image
-        "img[src*='product']",
-        "img[src*='Product']",
-    ]
-    
-    seen_images = set()
-    all_images = []
-    
-    # Extract from img tags
-    for selector in image_selectors:
-        img_tags = soup.select(selector)
-        for img in img_tags:
-            src = img.get('src')
-            if src and src.strip():
-                # Handle relative URLs
-                if src.startswith('/'):
-                    full_url = urljoin(BASE_URL, src)
-                elif src.startswith('http'):
-                    full_url = src
-                else:
-                    full_url = urljoin(url, src)
-                
-                # Avoid duplicates and non-image files
-                if (full_url not in seen_images and 
-                    any(ext in full_url.lower() for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp'])):
-                    all_images.append(full_url)
-                    seen_images.add(full_url)
-    
-    image_links = soup.select("a[href*='.jpg'], a[href*='.jpeg'], a[href*='.png'], a[href*='.gif'], a[href*='.webp']")
-    for link in image_links:
-        href = link.get('href')
-        if href and href.strip():
-            if href.startswith('/'):
-                full_url = urljoin(BASE_URL, href)
-            elif href.startswith('http'):
-                full_url = href
-            else:
-                full_url = urljoin(url, href)
-            
-            if full_url not in seen_images:
-                all_images.append(full_url)
-                seen_images.add(full_url)
-    
-    for i, img_url in enumerate(all_images, 1):
-        add(f"Image URL {i}", img_url)
-    
-    return rows
+async def scrape_product_page(fetcher, url: str, parse_pool, page_index=None, incremental=False, metrics=None):
+    """
+    Returns (rows, version): the page's rows ([] for pages without product
+    data, None when the fetch failed) and the PageVersion to record once
+    they were written (None without a page index).
 
-def scrape_product_page(url: str) -> list[list[str]]:
-    driver = None
+    With `incremental`, the fetch is conditional and a page that answers 304,
+    has the same HTML or yields the same rows as last time comes back as
+    ([], version) with version.changed False.
+    """
+    previous = page_index.get(url) if page_index else None
+    headers = PageIndex.conditional_headers(previous) if incremental else None
     try:
-        try: 
-            driver = CHROME_POOL.get_nowait()
-        except Empty: 
-            driver = create_driver_instance()
-        
-        driver.get(url)
-        WebDriverWait(driver, WAIT_TIMEOUT).until(
-            EC.presence_of_element_located(("css selector", "h1, table"))
+        result = await fetcher.fetch(url, PRODUCT_WAIT_SELECTOR, PRODUCT_REQUIRED_SELECTOR, headers=headers)
+        if result.status == 304 and previous is not None:
+            page_index.not_modified += 1
+            return [], previous
+        if not result.html:
+            return ([] if result.status == 404 else None), None
+
+        version = None
+        if page_index:
+            version = PageVersion(
+                url,
+                etag=header_value(result.headers, "etag"),
+                last_modified=header_value(result.headers, "last-modified"),
+                html_hash=hash_html(result.html),
+            )
+            if incremental and previous and version.html_hash == previous.html_hash:
+                page_index.same_html += 1
+                version.content_hash = previous.content_hash
+                version.changed = False
+                return [], version
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        rows = await loop.run_in_executor(
+            parse_pool, parse_product_html, result.html, url, BASE_URL, PARSER_BACKEND
         )
-        return extract_product_data(BeautifulSoup(driver.page_source, "html.parser"), url)
+        if metrics:
+            metrics.observe_parse(time.perf_counter() - start)
+
+        if version:
+            version.content_hash = hash_rows(rows)
+            if incremental and previous and version.content_hash == previous.content_hash:
+                page_index.same_content += 1
+                version.changed = False
+                return [], version
+            page_index.changed += 1
+        return rows, version
     except Exception as e:
         logging.error(f"[PRODUCT] Error {url}: {e}")
-        return []
-    finally:
-        if driver:
-            try: 
-                CHROME_POOL.put_nowait(driver)
-            except Full: 
-                driver.quit()
-
-async def product_crawl(status_callback):
-    if not PRODUCT_URLS_FILE.exists():
+        return None, None
+
+class CsvAuditSink:
+    """Appends scraped rows to the long-format CSV, kept as an audit trail."""
+
+    def __init__(self, path=None, append=False):
+        path = Path(path or OUTPUT_FILE)
+        has_rows = append and path.exists() and path.stat().st_size > 0
+        self.file = open(path, "a" if has_rows else "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        if not has_rows:
+            self.writer.writerow(["Product URL", "Feature", "Value"])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class ProductDbSink:
+    """Resolves categories and upserts a batch of scraped products."""
+
+    def __init__(self, engine, batch_size=STREAM_BATCH_SIZE):
+        self.resolver = CategoryResolver(engine)
+        self.upserter = ChunkedUpserter(Products, engine, batch_size=batch_size, touch_column='scraped_at')
+
+    def write(self, products):
+        scraped_at = pd.Timestamp.now().isoformat()
+        breadcrumbs = [tuple(breadcrumb_from_specs(specs)) for _, specs, _ in products]
+        category_ids = self.resolver.resolve_many(breadcrumbs)
+        for (url, specs, images), breadcrumb in zip(products, breadcrumbs):
+            self.upserter.add(make_product_record(url, specs, images, category_ids[breadcrumb], scraped_at))
+        self.upserter.flush()
+
+    def close(self):
+        self.upserter.close()
+
+def category_subtree(conn, slug):
+    """Ids of the category with `slug` and all of its descendants."""
+    children = {}
+    roots = []
+    for cat_id, cat_slug, parent_id in conn.execute(select(Categories.id, Categories.slug, Categories.parent_id)):
+        children.setdefault(parent_id, []).append(cat_id)
+        if cat_slug == slug:
+            roots.append(cat_id)
+    ids = set()
+    stack = roots
+    while stack:
+        cat_id = stack.pop()
+        if cat_id not in ids:
+            ids.add(cat_id)
+            stack.extend(children.get(cat_id, ()))
+    return ids
+
+def resolve_refresh_urls(codes=(), urls=(), category=None):
+    """
+    Product URLs for a targeted refresh: the stored URL of every product
+    code in `codes`, every product in the `category` subtree (by slug) and
+    `urls` themselves, which must be on BASE_URL's site. Returns
+    (urls, unknown codes); raises ValueError when the category is unknown.
+    """
+    codes = [str(c).strip() for c in codes or () if str(c).strip()]
+    site = urlsplit(BASE_URL).netloc
+    resolved = []
+    missing = []
+
+    with engine.connect() as conn:
+        if codes:
+            found = dict(conn.execute(select(Products.id, Products.url).where(Products.id.in_(codes))).all())
+            resolved += [found[c] for c in codes if c in found]
+            missing = [c for c in codes if c not in found]
+        if category:
+            ids = category_subtree(conn, category)
+            if not ids:
+                raise ValueError(f"Unknown category: {category}")
+            resolved += conn.execute(select(Products.url).where(Products.category_id.in_(ids))).scalars().all()
+
+    for url in urls or ():
+        if urlsplit(url).netloc == site:
+            resolved.append(url)
+        else:
+            logging.warning(f"[REFRESH] Skipping {url}: not on {site}")
+
+    resolved = list(dict.fromkeys(resolved))
+    logging.info(f"[REFRESH] {len(resolved)} product URLs to refresh ({len(missing)} unknown codes)")
+    return resolved, missing
+
+async def product_crawl(status_callback, stream_to_db=STREAM_TO_DB, audit_csv=AUDIT_CSV,
+                        job_id=None, resume=False, incremental=None, control=None, urls=None):
+    """
+    Scrapes every URL in PRODUCT_URLS_FILE (or `urls`, e.g. a targeted
+    refresh) and streams the results out as
+    they arrive: scraper -> bounded asyncio queue -> sink stage, which
+    appends to the audit CSV and writes products to the Parquet dataset and
+    the database in small batches (every STREAM_BATCH_SIZE products or
+    STREAM_FLUSH_INTERVAL seconds).
+
+    URL state is tracked in the frontier: a page counts as done once its
+    rows reached the sinks, failed fetches are retried up to
+    FRONTIER_MAX_ATTEMPTS times, and `resume=True` continues job `job_id`
+    where it stopped (appending to the audit CSV).
+
+    Every page's validators and hashes go to the page index once its rows
+    were written. With `incremental` (default INCREMENTAL) unchanged pages
+    are skipped, so the sinks only receive products whose content changed.
+
+    `control` (a JobControl) pauses, cancels or budgets the crawl between
+    pages. Pages already in flight still reach the sinks, and the job is
+    left resumable.
+    """
+    if not resume and urls is None and not PRODUCT_URLS_FILE.exists():
         raise FileNotFoundError(f"Product URLs file not found: {PRODUCT_URLS_FILE}")
+
+    frontier = open_frontier()
+    try:
+        if resume:
+            job_id, meta = open_job(frontier, "product", job_id, resume=True)
+            if incremental is None:
+                incremental = meta.get("incremental", INCREMENTAL)
+        elif urls is not None:
+            incremental = INCREMENTAL if incremental is None else incremental
+            job_id, _ = open_job(frontier, "product", job_id, meta={"source": "list", "incremental": incremental})
+            frontier.add(job_id, list(urls))
+        else:
+            incremental = INCREMENTAL if incremental is None else incremental
+            url_table = pd.read_csv(PRODUCT_URLS_FILE, dtype=str, keep_default_na=False)
+            urls = url_table["product_url"].tolist()
+            if incremental and "lastmod" in url_table:
+                index = open_store(PageIndex, PAGE_INDEX_DB)
+                try:
+                    unchanged = unchanged_by_lastmod(urls, url_table["lastmod"].tolist(), index)
+                finally:
+                    close_store(index)
+                if unchanged:
+                    logging.info(f"[INCREMENTAL] {len(unchanged)} pages unchanged since last fetch (sitemap lastmod)")
+                    urls = [u for u in urls if u not in unchanged]
+            job_id, _ = open_job(frontier, "product", job_id,
+                                 meta={"source": str(PRODUCT_URLS_FILE), "incremental": incremental})
+            frontier.add(job_id, urls)
+    except BaseException:
+        close_store(frontier)
+        raise
+    page_index = open_store(PageIndex, PAGE_INDEX_DB)
+    metrics = METRICS.begin("product", job_id)
+    metrics.add_source("incremental", page_index.stats)
+    if incremental:
+        logging.info("[INCREMENTAL] Skipping pages that did not change since the last crawl")
+
+    counts = frontier.counts(job_id)
+    total = sum(counts.values())
+    processed = counts[DONE] + counts[FAILED]
+    update_frontier_gauge = frontier_gauge(frontier, job_id, metrics)
     
-    df = pd.read_csv(PRODUCT_URLS_FILE)
-    urls = df["product_url"].tolist()
-    total = len(urls)
-    processed = 0
-    
-    executor = ThreadPoolExecutor(MAX_WORKERS)
+    executor = ThreadPoolExecutor(control.drivers(MAX_WORKERS) if control else MAX_WORKERS)
+    parse_pool = PARSE_POOL
+    db_executor = ThreadPoolExecutor(1)
     loop = asyncio.get_running_loop()
+    fetcher = new_fetcher(executor, parse_pool, metrics)
+
+    queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+    csv_sink = CsvAuditSink(append=resume) if audit_csv else None
+    parquet_sink = ParquetSink(PARQUET_DIR, run_id=job_id) if PARQUET_OUTPUT else None
+    db_sink = await loop.run_in_executor(db_executor, ProductDbSink, engine) if stream_to_db else None
+
+    async def flush_batch(batch, versions):
+        if parquet_sink:
+            try:
+                await loop.run_in_executor(db_executor, parquet_sink.write, batch)
+            except Exception as e:
+                logging.error(f"[STREAM] Failed to write batch of {len(batch)} products to Parquet: {e}")
+        if not db_sink:
+            return
+        try:
+            await loop.run_in_executor(db_executor, db_sink.write, batch)
+        except Exception as e:
+            logging.error(f"[STREAM] Failed to upsert batch of {len(batch)} products: {e}")
+            return
+        # Only remember versions that reached the database, so a failed batch is retried next run
+        for version in versions:
+            page_index.record(version)
+
+    async def sink_stage():
+        batch = []
+        versions = []
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=STREAM_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                item = ()
+            if item is None:
+                break
+
+            if item:
+                url, rows, version = item
+                if csv_sink:
+                    csv_sink.write(rows)
+                if db_sink or parquet_sink:
+                    batch.append(rows_to_product(rows))
+                if db_sink and version:
+                    versions.append(version)
+                elif version:
+                    page_index.record(version)
+                frontier.mark_done(job_id, url)
+
+            if batch and (len(batch) >= STREAM_BATCH_SIZE or time.monotonic() - last_flush >= STREAM_FLUSH_INTERVAL):
+                await flush_batch(batch, versions)
+                batch = []
+                versions = []
+                last_flush = time.monotonic()
+
+        if batch:
+            await flush_batch(batch, versions)
+
+    sink_task = asyncio.create_task(sink_stage())
+
+    async def scrape(url, _depth):
+        return await scrape_product_page(fetcher, url, parse_pool, page_index, incremental, metrics)
+
+    async def on_result(url, _depth, result):
+        nonlocal processed
+        rows, version = result
+        if rows is None:
+            if not frontier.mark_failed(job_id, url, "fetch failed"):
+                # Back in the queue for another attempt
+                return
+            metrics.page_done(failed=True)
+        elif rows:
+            await queue.put((url, rows, version))
+        else:
+            if version:
+                page_index.record(version)
+            frontier.mark_done(job_id, url)
+        if rows is not None:
+            metrics.page_done()
+        processed += 1
+        update_frontier_gauge()
+        metrics.set_gauge("sink", queue.qsize())
+        await status_callback(processed, total)
+
+    # URLs are claimed two pages per worker at a time; claimed but never started ones go back to pending on resume
+    crawler = CrawlEngine(FrontierSource(frontier, job_id, prefetch=MAX_WORKERS * 2), scrape, on_result,
+                          max_workers=MAX_WORKERS, control=control, metrics=metrics)
+    state = "interrupted"
+    try:
+        stopped = await crawler.run()
+        update_frontier_gauge(force=True)
+        await queue.put(None)
+        await sink_task
+        crawler.log_stats("PRODUCT")
+        state = "interrupted" if stopped else "done"
+    finally:
+        if not sink_task.done():
+            sink_task.cancel()
+        await fetcher.aclose()
+        executor.shutdown(wait=True)
+        if db_sink:
+            await loop.run_in_executor(db_executor, db_sink.close)
+        if parquet_sink:
+            await loop.run_in_executor(db_executor, parquet_sink.close)
+        db_executor.shutdown(wait=True)
+        if csv_sink:
+            csv_sink.close()
+        logging.info(f"[INCREMENTAL] {page_index.stats()}")
+        logging.info(f"[METRICS] {json.dumps(METRICS.end(job_id), default=str)}")
+        close_store(page_index)
+        frontier.set_job_state(job_id, state)
+        close_store(frontier)
 
-    with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["Product URL", "Feature", "Value"])
-        
-        tasks = set()
-        
-        for u in urls:
-            if len(tasks) >= MAX_WORKERS:
-                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
-                for fut in done:
-                    rows = fut.result()
-                    if rows: 
-                        writer.writerows(rows)
-                        f.flush()
-                    processed += 1
-                    await status_callback(processed, total)
-            
-            tasks.add(loop.run_in_executor(executor, scrape_product_page, u))
-
-        if tasks:
-            done, _ = await asyncio.wait(tasks)
-            for fut in done:
-                rows = fut.result()
-                if rows: 
-                    writer.writerows(rows)
-                processed += 1
-                await status_callback(processed, total)
-    
-    executor.shutdown(wait=True)
     return total
 
+class ShardScraper:
+    """
+    Scrapes the product pages of a shard on a worker. The fetcher lives as
+    long as the worker and parses in the shared PARSE_POOL; MAX_WORKERS
+    pages are fetched at once across all the shards it runs.
+    """
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.executor = ThreadPoolExecutor(MAX_WORKERS)
+        self.parse_pool = PARSE_POOL
+        self.fetcher = new_fetcher(self.executor, self.parse_pool, metrics)
+        self.limit = asyncio.Semaphore(MAX_WORKERS)
+
+    async def _scrape(self, url):
+        async with self.limit:
+            rows, _ = await scrape_product_page(self.fetcher, url, self.parse_pool, metrics=self.metrics)
+        if self.metrics:
+            self.metrics.page_done(failed=rows is None)
+        return url, rows
+
+    async def __call__(self, urls):
+        results = await asyncio.gather(*(self._scrape(u) for u in urls))
+        return {
+            "pages": len(urls),
+            "products": [rows_to_product(rows) for _, rows in results if rows],
+            "failed": [url for url, rows in results if rows is None],
+        }
+
+    async def aclose(self):
+        await self.fetcher.aclose()
+        self.executor.shutdown(wait=True)
+
+async def run_worker(bus, worker_id=None, stop_on_done=False):
+    """Scrapes shards handed out over `bus` until cancelled (or until a job ends, with `stop_on_done`)."""
+    worker_id = worker_id or WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
+    scraper = ShardScraper(METRICS.begin("worker", worker_id))
+    worker = Worker(bus, worker_id, scraper, slots=WORKER_SLOTS, heartbeat_interval=SHARD_LEASE_SECONDS / 4)
+    logging.info(f"[CLUSTER] Worker {worker_id} ready ({WORKER_SLOTS} shards at once)")
+    try:
+        await worker.run(stop_on_done)
+    finally:
+        await scraper.aclose()
+        METRICS.end(worker_id)
+        logging.info(f"[CLUSTER] Worker {worker_id} scraped {worker.shards_done} shards")
+
+async def distributed_product_crawl(bus, status_callback, job_id=None, resume=False, stream_to_db=STREAM_TO_DB):
+    """
+    `product_crawl` spread over worker processes: PRODUCT_URLS_FILE is cut
+    into shards, workers scrape them and send the products back, and they
+    are written here through the same Parquet and database sinks. A shard
+    whose products could not be upserted is scraped again. Pages are not
+    checked against the page index.
+    """
+    frontier = open_frontier()
+    ledger = ShardLedger(SHARDS_DB, max_attempts=FRONTIER_MAX_ATTEMPTS)
+    try:
+        if resume:
+            job_id, _ = open_job(frontier, "product", job_id, resume=True)
+            logging.info(f"[CLUSTER] {ledger.resume(job_id)} leased shards back in the queue")
+        else:
+            if not PRODUCT_URLS_FILE.exists():
+                raise FileNotFoundError(f"Product URLs file not found: {PRODUCT_URLS_FILE}")
+            urls = pd.read_csv(PRODUCT_URLS_FILE, dtype=str, keep_default_na=False)["product_url"].tolist()
+            job_id, _ = open_job(frontier, "product", job_id,
+                                 meta={"source": str(PRODUCT_URLS_FILE), "distributed": True})
+            shards = ledger.create(job_id, urls, SHARD_SIZE)
+            logging.info(f"[CLUSTER] {len(urls)} URLs in {shards} shards of {SHARD_SIZE}")
+    except BaseException:
+        close_store(frontier)
+        ledger.close()
+        raise
+
+    pages = ledger.page_counts(job_id)
+    total = sum(pages.values())
+    processed = pages[DONE] + pages[FAILED]
+    metrics = METRICS.begin("product", job_id)
+
+    loop = asyncio.get_running_loop()
+    db_executor = ThreadPoolExecutor(1)
+    parquet_sink = ParquetSink(PARQUET_DIR, run_id=job_id) if PARQUET_OUTPUT else None
+    db_sink = await loop.run_in_executor(db_executor, ProductDbSink, engine) if stream_to_db else None
+
+    async def on_result(shard_id, result):
+        nonlocal processed
+        products = [tuple(p) for p in result["products"]]
+        if products and parquet_sink:
+            try:
+                await loop.run_in_executor(db_executor, parquet_sink.write, products)
+            except Exception as e:
+                logging.error(f"[STREAM] Failed to write shard {shard_id} to Parquet: {e}")
+        if products and db_sink:
+            # Raising sends the shard back to the queue
+            await loop.run_in_executor(db_executor, db_sink.write, products)
+        if result["failed"]:
+            logging.warning(f"[CLUSTER] Shard {shard_id}: {len(result['failed'])} pages failed")
+        processed += result["pages"]
+        metrics.set_gauge("frontier", total - processed)
+        await status_callback(processed, total)
+
+    state = "interrupted"
+    try:
+        await Coordinator(bus, ledger, job_id, on_result, lease_seconds=SHARD_LEASE_SECONDS).run()
+        state = "done"
+    finally:
+        if db_sink:
+            await loop.run_in_executor(db_executor, db_sink.close)
+        if parquet_sink:
+            await loop.run_in_executor(db_executor, parquet_sink.close)
+        db_executor.shutdown(wait=True)
+        ledger.close()
+        frontier.set_job_state(job_id, state)
+        close_store(frontier)
+        METRICS.end(job_id)
+
+    return total
+
+async def local_cluster_product_crawl(status_callback, workers=2, stream_to_db=STREAM_TO_DB):
+    """Coordinator and `workers` workers in this process, over an in-process broker."""
+    broker = InProcessBroker()
+    worker_tasks = [asyncio.create_task(run_worker(broker.connect(), f"local-{i}", stop_on_done=True))
+                    for i in range(workers)]
+    # Let the workers subscribe before the job is announced
+    await asyncio.sleep(0)
+    try:
+        return await distributed_product_crawl(broker.connect(), status_callback, stream_to_db=stream_to_db)
+    finally:
+        await asyncio.wait(worker_tasks, timeout=5)
+        for task in worker_tasks:
+            task.cancel()
+
 # ============================================================
 # ================= LÓGICA DE PROCESSAMENTO ==================
 # ============================================================
@@ -450,116 +1099,411 @@ def simple_slugify(text):
     text = re.sub(r'[^a-z0-9\s-]', '', text)
     return re.sub(r'[\s-]+', '-', text)
 
-def get_or_create_category_path(session, breadcrumb_list):
+class CategoryResolver:
     """
-    Takes a list like ['Industrial Automation', 'Controls', 'Capacitors']
-    and returns the ID of the last category, creating parents as needed.
+    Resolves breadcrumb lists like ['Industrial Automation', 'Controls', 'Capacitors']
+    to the ID of the last category, creating parents as needed.
+
+    Every existing (name, parent_id) -> id pair is loaded once and resolved
+    paths are memoized for the whole run, so known paths cost a dict lookup.
+    Missing nodes are inserted level by level (one executemany per level)
+    and committed together per `resolve_many` call.
+
+    `categories.slug` is unique, so a name that repeats under another parent
+    gets its slug suffixed with the parent id. If a level still hits an
+    IntegrityError (e.g. a slug taken by another writer), that level falls
+    back to inserting node by node, reusing rows that already exist.
     """
-    parent_id = None
-    last_cat_id = None
-    
-    for cat_name in breadcrumb_list:
-        slug = simple_slugify(cat_name)
-        category = session.query(Categories).filter_by(name=cat_name, parent_id=parent_id).first()
-        
-        if not category:
-            category = Categories(name=cat_name, slug=slug, parent_id=parent_id)
-            session.add(category)
-            session.commit()
-            session.refresh(category)
-            
-        parent_id = category.id
-        last_cat_id = category.id
-        
-    return last_cat_id
-
-def process_and_upsert():
-    if not OUTPUT_FILE.exists():
-        logging.warning("Output file not found.")
-        return
 
-    raw_data = pd.read_csv(OUTPUT_FILE, sep=',', encoding='utf-8')
-    grouped = raw_data.groupby('Product URL')
-    
-    Session = sessionmaker(bind=engine)
-    session = Session()
+    def __init__(self, engine):
+        self.engine = engine
+        self.node_ids = {}
+        self.path_ids = {}
+        self.slugs = set()
+        self.created = 0
+        self.load()
+
+    def load(self):
+        stmt = select(Categories.id, Categories.name, Categories.parent_id, Categories.slug).order_by(Categories.id)
+        with self.engine.connect() as conn:
+            for cat_id, name, parent_id, slug in conn.execute(stmt):
+                # Keep the oldest row if legacy duplicates exist, like .first() did
+                self.node_ids.setdefault((name, parent_id), cat_id)
+                self.slugs.add(slug)
+        logging.info(f"[CATEGORIES] Loaded {len(self.node_ids)} existing categories")
+
+    def resolve(self, breadcrumb_list):
+        return self.resolve_many([breadcrumb_list])[tuple(breadcrumb_list)]
+
+    def resolve_many(self, breadcrumb_lists):
+        paths = {tuple(p) for p in breadcrumb_lists}
+        missing_paths = [p for p in paths if p not in self.path_ids]
+        if missing_paths:
+            self._resolve_paths(missing_paths)
+        return {p: self.path_ids[p] for p in paths}
+
+    def _new_slug(self, name, parent_id):
+        base = simple_slugify(name)
+        if base in self.slugs and parent_id is not None:
+            base = f"{base}-{parent_id}"
+        slug = base
+        n = 2
+        while slug in self.slugs:
+            slug = f"{base}-{n}"
+            n += 1
+        self.slugs.add(slug)
+        return slug
+
+    def _load_nodes(self, conn, names):
+        rows = conn.execute(
+            select(Categories.id, Categories.name, Categories.parent_id)
+            .where(Categories.name.in_(names))
+            .order_by(Categories.id)
+        )
+        for cat_id, name, parent_id in rows:
+            self.node_ids.setdefault((name, parent_id), cat_id)
 
-    products_to_insert = []
-    logging.info("Processing hierarchical categories and products...")
+    def _insert_nodes(self, conn, keys):
+        rows = [{"name": name, "slug": self._new_slug(name, parent_id), "parent_id": parent_id}
+                for name, parent_id in keys]
+        try:
+            with conn.begin_nested():
+                conn.execute(Categories.__table__.insert(), rows)
+            self.created += len(rows)
+        except IntegrityError as e:
+            logging.warning(f"[CATEGORIES] Batch insert of {len(rows)} categories failed, inserting one by one: {e.orig}")
+            for row in rows:
+                self._insert_node(conn, row)
+        self._load_nodes(conn, {name for name, _ in keys})
+
+    def _insert_node(self, conn, row, attempts=3):
+        key = (row["name"], row["parent_id"])
+        for attempt in range(attempts):
+            try:
+                with conn.begin_nested():
+                    conn.execute(Categories.__table__.insert(), row)
+                self.created += 1
+                return
+            except IntegrityError:
+                self._load_nodes(conn, {row["name"]})
+                if key in self.node_ids:
+                    return
+                if attempt == attempts - 1:
+                    raise
+                # The slug is taken by a row we haven't loaded: refresh the slugs and pick another one
+                self.slugs.update(conn.execute(select(Categories.slug)).scalars())
+                row = dict(row, slug=self._new_slug(*key))
+
+    def _resolve_paths(self, paths):
+        prefix_ids = {(): None}
+
+        with self.engine.begin() as conn:
+            for level in range(max(len(p) for p in paths)):
+                pending = {}
+                for path in paths:
+                    if len(path) <= level:
+                        continue
+                    key = (path[level], prefix_ids[path[:level]])
+                    if key not in self.node_ids:
+                        pending[key] = None
+
+                if pending:
+                    self._insert_nodes(conn, list(pending))
+
+                for path in paths:
+                    if len(path) > level:
+                        prefix_ids[path[:level + 1]] = self.node_ids[(path[level], prefix_ids[path[:level]])]
+
+        for path in paths:
+            self.path_ids[path] = prefix_ids[path]
+
+def group_product_rows(raw_data):
+    """
+    Turns the long (url, feature, value) frame into one (url, specs, images)
+    tuple per product.
 
-    for url, group in grouped:
-        specs = {}
-        for _, row in group.iterrows():
-            if pd.notna(row['Feature']) and 'Image URL' not in str(row['Feature']):
-                specs[row['Feature']] = row['Value']
-        
-        image_rows = group[group['Feature'].str.contains('Image URL', na=False)]
-        images = image_rows['Value'].tolist() if not image_rows.empty else []
-        
-        breadcrumb_path = []
-        i = 1
-        while f"Category_Level_{i}" in specs:
-            breadcrumb_path.append(specs[f"Category_Level_{i}"])
-            i += 1
-        
-        if not breadcrumb_path:
-            breadcrumb_path = ["Geral"]
-            
-        cat_id = get_or_create_category_path(session, breadcrumb_path)
-
-        record = {
-            'id': specs.get('Product Code', hashlib.md5(url.encode()).hexdigest()[:20]),
-            'url': url,
-            'name': specs.get('Product Name', 'Produto sem Nome'),
-            'category_id': cat_id,
-            'description': specs.get('Description', ''),
-            'specs': json.dumps(specs) if specs else '{}',
-            'images': json.dumps(images) if images else '[]',
-            'scraped_at': pd.Timestamp.now().isoformat()
-        }
-        products_to_insert.append(record)
+    Rows are factorized by URL and stable-sorted once, so every product is a
+    contiguous slice of plain numpy arrays; specs and image lists are then
+    built with C-level dict/zip calls instead of per-row iterrows(). Empty
+    values become None (null in the specs JSON) instead of NaN.
+    """
+    codes, urls = pd.factorize(raw_data['Product URL'], sort=False)
+    feature = raw_data['Feature']
+    has_feature = feature.notna().to_numpy()
+    is_image = feature.astype(str).str.contains('Image URL', regex=False).to_numpy() & has_feature
+    is_spec = has_feature & ~is_image
+
+    keep = codes >= 0  # groupby drops rows without a URL
+    order = np.flatnonzero(keep)[np.argsort(codes[keep], kind='stable')]
+    if order.size == 0:
+        return
 
-    session.close()
+    codes_sorted = codes[order]
+    features = feature.to_numpy(dtype=object)[order]
+    values = raw_data['Value'].astype(object).where(raw_data['Value'].notna(), None).to_numpy(dtype=object)[order]
+    spec_mask = is_spec[order]
+    image_mask = is_image[order]
+
+    bounds = np.flatnonzero(np.diff(codes_sorted)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [codes_sorted.size]))
+
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        spec_slice = spec_mask[start:end]
+        specs = dict(zip(features[start:end][spec_slice], values[start:end][spec_slice]))
+        images = values[start:end][image_mask[start:end]].tolist()
+        yield urls[codes_sorted[start]], specs, images
+
+def breadcrumb_from_specs(specs):
+    breadcrumb_path = []
+    i = 1
+    while f"Category_Level_{i}" in specs:
+        breadcrumb_path.append(specs[f"Category_Level_{i}"])
+        i += 1
+    return breadcrumb_path or ["Geral"]
+
+def make_product_record(url, specs, images, category_id, scraped_at):
+    return {
+        'id': specs.get('Product Code', hashlib.md5(url.encode()).hexdigest()[:20]),
+        'url': url,
+        'name': specs.get('Product Name', 'Produto sem Nome'),
+        'category_id': category_id,
+        'description': specs.get('Description', ''),
+        'specs': json.dumps(specs) if specs else '{}',
+        'images': json.dumps(images) if images else '[]',
+        'scraped_at': scraped_at
+    }
+
+def iter_parquet_products(root):
+    """(url, specs, images) per product from the Parquet dataset, latest record per URL."""
+    table = read_products(root, ["url", "specs", "images"])
+    for batch in table.to_batches():
+        for url, specs, images in zip(batch.column("url").to_pylist(),
+                                      batch.column("specs").to_pylist(),
+                                      batch.column("images").to_pylist()):
+            yield url, dict(specs or []), images or []
+
+def load_scraped_products():
+    """
+    Scraped products for the import job: the Parquet dataset when there is
+    one (only the columns the upsert needs), else the long audit CSV.
+    Returns (products iterator, description) or None when neither exists.
+    """
+    if PYARROW_AVAILABLE and has_products(PARQUET_DIR):
+        return iter_parquet_products(PARQUET_DIR), f"Parquet dataset {PARQUET_DIR}"
+    if OUTPUT_FILE.exists():
+        raw_data = pd.read_csv(OUTPUT_FILE, sep=',', encoding='utf-8')
+        return group_product_rows(raw_data), f"{len(raw_data)} CSV rows"
+    return None
+
+def process_and_upsert(control=None):
+    """
+    Upserts the scraped products (see `load_scraped_products`) in batches of
+    UPSERT_BATCH_SIZE. A cancelled `control` stops it between batches; what
+    was already upserted stays. Returns the number of products written.
+    """
+    loaded = load_scraped_products()
+    if loaded is None:
+        logging.warning("Output file not found.")
+        return 0
 
-    if products_to_insert:
-        df_products = pd.DataFrame(products_to_insert)
-        mysql_upsert(Products, engine, df_products)
+    start = time.perf_counter()
+    products, source = loaded
+    
+    resolver = CategoryResolver(engine)
+    upserter = ChunkedUpserter(Products, engine, touch_column='scraped_at')
+    scraped_at = pd.Timestamp.now().isoformat()
+    logging.info(f"Processing hierarchical categories and products from {source}...")
+
+    def flush_products(batch):
+        category_ids = resolver.resolve_many(breadcrumb for _, _, _, breadcrumb in batch)
+        for url, specs, images, breadcrumb in batch:
+            upserter.add(make_product_record(url, specs, images, category_ids[breadcrumb], scraped_at))
+
+    batch = []
+    for url, specs, images in products:
+        batch.append((url, specs, images, tuple(breadcrumb_from_specs(specs))))
+        if len(batch) >= UPSERT_BATCH_SIZE:
+            flush_products(batch)
+            batch = []
+            if control is not None and control.cancelled:
+                logging.info(f"Import cancelled after {upserter.received} products")
+                break
     else:
+        if batch:
+            flush_products(batch)
+
+    upserter.close()
+    logging.info(f"[CATEGORIES] {len(resolver.path_ids)} distinct paths, {resolver.created} categories created")
+
+    if upserter.received == 0:
         logging.warning("No products were processed.")
+    else:
+        logging.info(f"Processed {upserter.received} products in {time.perf_counter() - start:.1f}s")
+    return upserter.received
+
+class ChunkedUpserter:
+    """
+    Streams records into a table with INSERT ... ON DUPLICATE KEY UPDATE.
+
+    Records are buffered up to `batch_size` and written with a single
+    executemany over one compiled statement, so memory stays bounded and no
+    statement can outgrow `max_allowed_packet`. A chunk that hits a transient
+    error is retried and the error is raised once the retries run out; a
+    chunk the database rejects is replayed row by row and the rows it still
+    rejects go to a JSON-lines dead-letter file instead of rolling back the
+    whole run.
+
+    With `touch_column` (e.g. scraped_at) that column only takes the new
+    value when another column changed, so re-importing identical products
+    leaves their rows untouched.
+    """
 
-def mysql_upsert(table_class, engine, df):
-    df_clean = df.where(pd.notnull(df), None)
-    records = df_clean.to_dict(orient='records')
-    for r in records:
-        if isinstance(r['specs'], dict): 
+    def __init__(self, table_class, engine, batch_size=UPSERT_BATCH_SIZE,
+                 max_retries=UPSERT_MAX_RETRIES, dead_letter_path=DEAD_LETTER_FILE,
+                 touch_column=None):
+        table = table_class.__table__
+        stmt = insert(table)
+        update_cols = [c for c in table.columns if not c.primary_key and c.name != touch_column]
+        updates = [(c.name, stmt.inserted[c.name]) for c in update_cols]
+        if touch_column:
+            # MySQL applies the assignments left to right, so the touch column
+            # goes first and still compares against the old values
+            unchanged = and_(*[c.is_not_distinct_from(stmt.inserted[c.name]) for c in update_cols])
+            touched = table.c[touch_column]
+            updates.insert(0, (touch_column, case((unchanged, touched), else_=stmt.inserted[touch_column])))
+        self.stmt = stmt.on_duplicate_key_update(updates)
+        self.columns = [c.name for c in table.columns]
+        self.table_name = table.name
+        self.engine = engine
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max(1, max_retries)
+        self.dead_letter_path = Path(dead_letter_path)
+
+        self.buffer = []
+        self.received = 0
+        self.written = 0
+        self.rejected = 0
+        self.chunks = 0
+        self.elapsed = 0.0
+
+    @staticmethod
+    def _clean(value):
+        if isinstance(value, float) and math.isnan(value):
+            return None
+        return value
+
+    def normalize(self, record):
+        r = {c: self._clean(record.get(c)) for c in self.columns}
+        if isinstance(r.get('specs'), dict):
             r['specs'] = json.dumps(r['specs'])
-        if isinstance(r['description'], (dict, list)): 
+        if isinstance(r.get('description'), (dict, list)):
             r['description'] = json.dumps(r['description'])
-    
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    try:
-        stmt = insert(table_class).values(records)
-        update_dict = {c.name: stmt.inserted[c.name] for c in table_class.__table__.columns if not c.primary_key}
-        session.execute(stmt.on_duplicate_key_update(update_dict))
-        session.commit()
-        logging.info(f"Upserted {len(records)} records to database")
-    except Exception as e:
-        session.rollback()
-        logging.error(f"DB Error: {e}")
-    finally:
-        session.close()
+        return r
+
+    def add(self, record):
+        self.buffer.append(self.normalize(record))
+        self.received += 1
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, records):
+        for record in records:
+            self.add(record)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        chunk, self.buffer = self.buffer, []
+
+        start = time.perf_counter()
+        if not self._write_chunk(chunk):
+            self._write_rows(chunk)
+        self.elapsed += time.perf_counter() - start
+        self.chunks += 1
+
+        logging.debug(
+            f"[UPSERT] {self.table_name}: chunk {self.chunks} ({len(chunk)} rows), "
+            f"{self.rows_per_second:.0f} rows/s"
+        )
+
+    def _write_chunk(self, chunk):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(self.stmt, chunk)
+                self.written += len(chunk)
+                return True
+            except OperationalError as e:
+                # Lost connections, lock timeouts and deadlocks are worth retrying,
+                # but once retries run out the rows themselves aren't the problem
+                logging.warning(f"[UPSERT] Chunk attempt {attempt}/{self.max_retries} failed: {e}")
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(min(2 ** attempt, 30))
+            except SQLAlchemyError as e:
+                logging.warning(f"[UPSERT] Chunk rejected, isolating bad rows: {e}")
+                return False
+
+    def _write_rows(self, chunk):
+        for record in chunk:
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(self.stmt, [record])
+                self.written += 1
+            except OperationalError:
+                raise
+            except SQLAlchemyError as e:
+                self._dead_letter(record, e)
+
+    def _dead_letter(self, record, error):
+        self.rejected += 1
+        self.dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "table": self.table_name,
+                "error": str(error).splitlines()[0],
+                "failed_at": pd.Timestamp.now().isoformat(),
+                "record": record,
+            }, default=str) + "\n")
+
+    @property
+    def rows_per_second(self):
+        return self.written / self.elapsed if self.elapsed > 0 else 0.0
+
+    def close(self):
+        self.flush()
+        logging.info(
+            f"Upserted {self.written}/{self.received} records to {self.table_name} "
+            f"in {self.chunks} chunks ({self.rows_per_second:.0f} rows/s)"
+        )
+        if self.rejected:
+            logging.error(f"{self.rejected} records rejected, see {self.dead_letter_path}")
+        return self.written
 
 # ============================================================
 # ================ COMMAND LINE INTERFACE ====================
 # ============================================================
 
-async def run_standalone_mode(job_type="full"):
-    """Run the crawler in standalone mode without MQTT"""
+async def run_standalone_mode(job_type="full", resume_id=None, refresh=None):
+    """
+    Run the crawler in standalone mode without MQTT. Each run gets an id;
+    passing it back as `resume_id` continues the crawl stages it left
+    unfinished (a full run stores them as <id>-discovery and <id>-product).
+    A refresh job takes `refresh` = {"codes", "urls", "category"}.
+    """
+    run_id = resume_id or new_job_id()
     print("=" * 60)
     print(f"WEG CRAWLER - STANDALONE MODE")
     print(f"Job: {job_type}")
+    print(f"Run id: {run_id} (resume with --resume {run_id})")
     print("=" * 60)
+
+    def stage(kind):
+        """(frontier job id, resume?) for one crawl stage of this run."""
+        job_id = f"{run_id}-{kind}" if job_type == "full" else run_id
+        job = lookup_job(job_id) if resume_id else None
+        return job_id, job
     
     start_time = time.time()
     
@@ -571,21 +1515,30 @@ async def run_standalone_mode(job_type="full"):
     init_db()
     
     # Initialize drivers
-    print("[2/4] Initializing Chrome drivers...")
-    for _ in range(min(4, MAX_DRIVERS)):
-        try: 
-            CHROME_POOL.put_nowait(create_driver_instance())
-        except Exception as e:
-            print(f"Warning: Failed to initialize driver: {e}")
+    if job_type != "import":
+        print("[2/4] Initializing Chrome drivers...")
+        start_drivers()
+
+    # Progress bars are invisible in containers, so log the metrics as well
+    async def log_metrics(snapshot):
+        logging.info(f"[METRICS] {json.dumps(snapshot, default=str)}")
+
+    metrics_server = start_metrics_server()
+    metrics_task = asyncio.create_task(report_metrics(log_metrics))
     
     if job_type in ["discovery", "full"]:
-        print("[3/4] Running discovery crawl...")
-        urls = await discovery_crawl(settings.START_URL, passes=1)
-        save_product_urls(urls)
-        print(f"Discovery complete: Found {len(urls)} URLs")
+        job_id, job = stage("discovery")
+        if job and job["state"] == "done":
+            print("[3/4] Discovery already finished for this run, skipping.")
+        else:
+            print("[3/4] Running discovery crawl...")
+            urls, lastmods = await run_discovery(settings.START_URL, job_id=job_id, resume=job is not None)
+            save_product_urls(urls, lastmods)
+            print(f"Discovery complete: Found {len(urls)} URLs")
     
     if job_type in ["product", "full"]:
-        if not PRODUCT_URLS_FILE.exists():
+        job_id, job = stage("product")
+        if job is None and not PRODUCT_URLS_FILE.exists():
             print("Error: Product URLs file not found. Run discovery first.")
             return
         
@@ -594,21 +1547,41 @@ async def run_standalone_mode(job_type="full"):
         async def progress_callback(processed, total):
             print(f"Progress: {processed}/{total} ({processed/total*100:.1f}%)", end='\r')
         
-        total = await product_crawl(progress_callback)
-        print(f"\nScraping complete: {total} products")
-        
-        # Process and save to database
-        print("\nProcessing and saving to database...")
+        total = await product_crawl(progress_callback, job_id=job_id, resume=job is not None)
+        print(f"\nScraping complete: {total} products (streamed to database)")
+
+    if job_type == "refresh":
+        job_id, job = stage("refresh")
+        urls = None
+        if job is None:
+            refresh = refresh or {}
+            urls, missing = resolve_refresh_urls(refresh.get("codes"), refresh.get("urls"), refresh.get("category"))
+            if missing:
+                print(f"Unknown product codes: {', '.join(missing)}")
+            if not urls:
+                print("Error: nothing to refresh.")
+                return
+
+        print(f"[4/4] Refreshing {len(urls) if urls else 'remaining'} products...")
+
+        async def progress_callback(processed, total):
+            print(f"Progress: {processed}/{total}", end='\r')
+
+        total = await product_crawl(progress_callback, audit_csv=False, job_id=job_id, resume=job is not None,
+                                    incremental=False if job is None else None, urls=urls)
+        print(f"\nRefresh complete: {total} products upserted")
+
+    if job_type == "import":
+        # Re-import previously scraped data (Parquet dataset, else the audit CSV)
+        print("[4/4] Importing scraped data into database...")
         process_and_upsert()
     
     # Cleanup
     print("\nCleaning up...")
-    while not CHROME_POOL.empty():
-        try: 
-            driver = CHROME_POOL.get_nowait()
-            driver.quit()
-        except:
-            pass
+    metrics_task.cancel()
+    if metrics_server:
+        metrics_server.close()
+    stop_drivers()
     
     elapsed = time.time() - start_time
     print(f"\n✅ Done! Total time: {elapsed:.2f}s")
@@ -620,63 +1593,139 @@ async def run_standalone_mode(job_type="full"):
 class CrawlerManager:
     def __init__(self, use_mqtt=True):
         self.state = "idle"
-        self.job_id = None
         self.client = None
         self.use_mqtt = use_mqtt and MQTT_AVAILABLE
         self.topic_command = "indumine/crawler/command"
         self.topic_status = "indumine/crawler/status"
-        self.task = None
+        self.topic_metrics = "indumine/crawler/metrics"
+        self.bus = None  # cluster messages, for distributed product jobs
+        self.scheduler = JobScheduler(self.execute_job, max_concurrent=MAX_CONCURRENT_JOBS,
+                                      on_change=self.job_changed)
 
-    async def publish_status(self, processed=0, total=0, message=""):
+    async def publish_status(self, processed=0, total=0, message="", job_id=None):
         payload = {
-            "job_id": self.job_id,
+            "job_id": job_id,
             "state": self.state,
             "processed": processed,
             "total_estimated": total,
             "message": message,
+            "jobs": self.scheduler.jobs(include_finished=False),
+            "drivers": DRIVER_POOL.stats(),
             "timestamp": pd.Timestamp.now().isoformat()
         }
 
         # If using MQTT, try to publish
         if self.use_mqtt and self.client:
             try:
-                await self.client.publish(self.topic_status, json.dumps(payload))
+                await self.client.publish(self.topic_status, json.dumps(payload, default=str))
                 logging.debug(f"MQTT Publish: {payload}")
             except Exception as e:
                 logging.error(f"MQTT Publish Error: {e}")
         else:
             # Fallback to standard logging if MQTT is off
+            prefix = f"[{job_id}] " if job_id else ""
             if total > 0:
-                logging.info(f"[STATUS] {message} | Progress: {processed}/{total}")
+                logging.info(f"[STATUS] {prefix}{message} | Progress: {processed}/{total}")
             else:
-                logging.info(f"[STATUS] {message}")
+                logging.info(f"[STATUS] {prefix}{message}")
+
+    async def publish_metrics(self, snapshot=None):
+        """Publishes a METRICS snapshot, keyed by job id, while a job runs (and once more when it ends)."""
+        if snapshot is not None and self.state != "running":
+            return
+        payload = {
+            **(snapshot or METRICS.snapshot()),
+            "state": self.state,
+            "timestamp": pd.Timestamp.now().isoformat(),
+        }
+        if self.use_mqtt and self.client:
+            try:
+                await self.client.publish(self.topic_metrics, json.dumps(payload, default=str))
+            except Exception as e:
+                logging.error(f"MQTT Publish Error: {e}")
+        else:
+            logging.info(f"[METRICS] {json.dumps(payload, default=str)}")
+
+    async def job_changed(self, job):
+        self.state = "running" if self.scheduler.running() else "idle"
+        if job.state in (CANCELLED, JOB_DONE, JOB_FAILED) and self.scheduler.idle():
+            logging.info("Cleaning up Chrome drivers...")
+            stop_drivers()
+        message = f"Job {job.job_id} ({job.kind}) {job.state}"
+        if job.error:
+            message += f": {job.error}"
+        await self.publish_status(message=message, job_id=job.job_id)
+
+    def new_job(self, job_id, mode, data, **params):
+        """Builds a scheduler Job from a start/resume command."""
+        return Job(
+            job_id=job_id,
+            kind=mode,
+            priority=int(data.get("priority", JOB_PRIORITIES.get(mode, 0))),
+            params=params,
+            budget=Budget.from_dict(data.get("budget")),
+            preemptible=bool(data.get("preemptible", True)),
+            # One job per kind at a time: they share the URL list and output files. Refreshes
+            # bring their own URLs and only write through the upsert path, so they can overlap
+            group=None if mode == "refresh" else mode,
+        )
 
     async def handle_command(self, message):
         try:
             data = json.loads(message.payload.decode())
             command = data.get("command")
+            job_id = data.get("job_id")
             
             if command == "start":
-                if self.state == "running":
-                    await self.publish_status(message="Ignored: Already running")
-                    logging.warning("Received start command but already running")
-                    return
-                
-                self.job_id = data.get("job_id", str(uuid.uuid4())[:8])
                 mode = data.get("mode", "product")
+                if mode not in JOB_PRIORITIES:
+                    await self.publish_status(message=f"Unknown mode: {mode}")
+                    return
+                if mode == "refresh":
+                    params = {"codes": data.get("codes") or [], "urls": data.get("urls") or [],
+                              "category": data.get("category"), "incremental": data.get("incremental", False)}
+                    if not (params["codes"] or params["urls"] or params["category"]):
+                        await self.publish_status(message="Refresh needs codes, urls or a category", job_id=job_id)
+                        return
+                else:
+                    params = {"incremental": data.get("incremental"),
+                              "source": data.get("discovery_source"),
+                              "distributed": data.get("distributed", DISTRIBUTED)}
+                job = self.new_job(job_id or new_job_id(), mode, data, **params)
+                await self.scheduler.submit(job)
+                logging.info(f"Queued job {job.job_id} in mode {mode} (priority {job.priority})")
+
+            elif command == "resume":
+                # A paused job continues in place; a stopped one is picked up from the frontier
+                if job_id and await self.scheduler.resume(job_id):
+                    logging.info(f"Resumed paused job {job_id}")
+                    return
+
+                stored = lookup_job(job_id) if job_id else None
+                if stored is None:
+                    await self.publish_status(message=f"Cannot resume: unknown job {job_id}")
+                    return
+
+                # Refreshes are product jobs over their own URL list
+                mode = "refresh" if stored["meta"].get("source") == "list" else stored["kind"]
+                job = self.new_job(job_id, mode, data, resume=True,
+                                   distributed=stored["meta"].get("distributed", False))
+                await self.scheduler.submit(job)
+                logging.info(f"Resuming job {job_id} in mode {mode}")
+
+            elif command == "pause":
+                if not await self.scheduler.pause(job_id):
+                    await self.publish_status(message=f"Cannot pause job {job_id}: not running", job_id=job_id)
                 
-                if self.task and not self.task.done():
-                    self.task.cancel()
-                
-                self.task = asyncio.create_task(self.execute_job(mode))
-                logging.info(f"Started job {self.job_id} in mode {mode}")
-                
-            elif command == "stop":
-                if self.state == "running" and self.task:
-                    self.task.cancel()
-                    self.state = "stopped"
-                    await self.publish_status(message="Job stopped by command")
-                    logging.info("Job stopped by command")
+            elif command in ("stop", "cancel"):
+                # Without a job id, everything running or queued is cancelled
+                targets = [job_id] if job_id else [j["job_id"] for j in self.scheduler.jobs(include_finished=False)]
+                for target in targets:
+                    if await self.scheduler.cancel(target, force=bool(data.get("force"))):
+                        logging.info(f"Job {target} cancelled by command")
+
+            elif command == "status":
+                await self.publish_status(message="Status requested")
                     
         except json.JSONDecodeError as e:
             logging.error(f"Invalid JSON in MQTT message: {e}")
@@ -685,73 +1734,82 @@ class CrawlerManager:
             logging.error(f"MQTT Process Error: {e}")
             await self.publish_status(message=f"Command error: {str(e)}")
 
-    async def execute_job(self, mode):
-        self.state = "running"
-        logging.info(f"Executing job in {mode} mode")
+    async def execute_job(self, job):
+        """Scheduler runner: one job, stopped early through `job.control`."""
+        mode = job.kind
+        control = job.control
+        resume = job.params.get("resume", False)
+        logging.info(f"Executing job {job.job_id} in {mode} mode")
+
+        async def progress(processed, total):
+            await self.publish_status(processed, total, job_id=job.job_id)
         
-        try:
-            await self.publish_status(message=f"Starting mode: {mode}")
-            
-            # Ensure DB is ready
-            init_db()
-            
-            # Initialize drivers
+        # Ensure DB is ready
+        init_db()
+        
+        # Drivers are shared by every running job and only started with the first one
+        if len(self.scheduler.active) == 1:
             logging.info("Initializing Chrome drivers...")
-            # Ensure we don't overfill if retrying
-            while not CHROME_POOL.empty():
-                try: CHROME_POOL.get_nowait().quit()
-                except: pass
-
-            for _ in range(min(4, MAX_DRIVERS)):
-                try: 
-                    CHROME_POOL.put_nowait(create_driver_instance())
-                except Exception as e:
-                    logging.warning(f"Failed to initialize driver: {e}")
+            # Drop drivers left over from a previous job before prewarming
+            DRIVER_POOL.close()
+            start_drivers()
+
+        if mode == "discovery":
+            logging.info("Starting discovery crawl...")
+            urls, lastmods = await run_discovery(settings.START_URL, job_id=job.job_id, resume=resume,
+                                                 source=job.params.get("source"), control=control)
+            if control.cancelled:
+                return len(urls)
+            save_product_urls(urls, lastmods)
+            await self.publish_status(message=f"Discovery finished. Found {len(urls)} URLs", job_id=job.job_id)
+            return len(urls)
             
-            logging.info(f"Chrome pool size: {CHROME_POOL.qsize()}")
-
-            if mode == "discovery":
-                logging.info("Starting discovery crawl...")
-                urls = await discovery_crawl(settings.START_URL, passes=1)
-                save_product_urls(urls)
-                await self.publish_status(message=f"Discovery finished. Found {len(urls)} URLs")
-                
-            elif mode == "product":
-                if not PRODUCT_URLS_FILE.exists():
-                    error_msg = f"Product URLs file not found: {PRODUCT_URLS_FILE}. Run discovery mode first."
-                    logging.error(error_msg)
-                    raise FileNotFoundError(error_msg)
-                
-                logging.info("Starting product crawl...")
-                total = await product_crawl(self.publish_status)
-                await self.publish_status(message=f"Scraping complete. Processing data...")
-                logging.info("Processing and upserting data...")
-                process_and_upsert()
-                await self.publish_status(message=f"Data processed and upserted to database")
+        if mode == "product":
+            if not resume and not PRODUCT_URLS_FILE.exists():
+                error_msg = f"Product URLs file not found: {PRODUCT_URLS_FILE}. Run discovery mode first."
+                logging.error(error_msg)
+                raise FileNotFoundError(error_msg)
             
-            self.state = "idle"
-            await self.publish_status(message="Job completed successfully")
-            
-        except asyncio.CancelledError:
-            self.state = "cancelled"
-            await self.publish_status(message="Job cancelled")
-            logging.info("Job cancelled")
-            raise
-        except Exception as e:
-            self.state = "error"
-            error_msg = f"Fatal error: {str(e)}"
-            await self.publish_status(message=error_msg)
-            logging.error(f"Job failed: {e}", exc_info=True)
-        finally:
-            # Cleanup
-            logging.info("Cleaning up Chrome drivers...")
-            while not CHROME_POOL.empty():
-                try: 
-                    driver = CHROME_POOL.get_nowait()
-                    driver.quit()
-                except Exception as e:
-                    logging.warning(f"Error cleaning up driver: {e}")
-            self.job_id = None
+            if job.params.get("distributed"):
+                if self.bus is None:
+                    raise RuntimeError("Distributed product jobs need the MQTT connection")
+                logging.info("Starting distributed product crawl...")
+                total = await run_until_cancelled(
+                    distributed_product_crawl(self.bus, progress, job_id=job.job_id, resume=resume), control)
+            else:
+                logging.info("Starting product crawl...")
+                total = await product_crawl(progress, job_id=job.job_id, resume=resume,
+                                            incremental=job.params.get("incremental"), control=control)
+            await self.publish_status(
+                message=f"Scraping {JOB_OUTCOMES[control.outcome()]}. {total} products streamed to database",
+                job_id=job.job_id)
+            return total
+
+        if mode == "refresh":
+            urls = None
+            if not resume:
+                urls, missing = await asyncio.get_running_loop().run_in_executor(
+                    None, resolve_refresh_urls, job.params.get("codes"), job.params.get("urls"),
+                    job.params.get("category"))
+                if missing:
+                    await self.publish_status(message=f"Unknown product codes: {', '.join(missing)}",
+                                              job_id=job.job_id)
+                if not urls:
+                    raise ValueError("No product URLs to refresh")
+            logging.info(f"Refreshing {len(urls) if urls else 'remaining'} products...")
+            total = await product_crawl(progress, audit_csv=False, job_id=job.job_id, resume=resume,
+                                        incremental=job.params.get("incremental"), control=control, urls=urls)
+            await self.publish_status(message=f"Refresh {JOB_OUTCOMES[control.outcome()]}. {total} products upserted",
+                                      job_id=job.job_id)
+            return total
+
+        if mode == "import":
+            logging.info("Importing scraped data...")
+            # Stops between batches on cancel: a worker thread can't be interrupted mid-write
+            total = await asyncio.get_running_loop().run_in_executor(None, process_and_upsert, control)
+            await self.publish_status(message=f"Import {JOB_OUTCOMES[control.outcome()]}. {total} products upserted",
+                                      job_id=job.job_id)
+            return total
 
     async def run_mqtt(self):
         """Main loop for MQTT mode"""
@@ -763,30 +1821,29 @@ class CrawlerManager:
         logging.info(f"MQTT Host: {settings.MQTT_HOST}:{settings.MQTT_PORT}")
         
         reconnect_interval = 5  # seconds
+        start_metrics_server()
         
         while True:
             try:
-                client_options = {
-                    "hostname": settings.MQTT_HOST,
-                    "port": settings.MQTT_PORT,
-                }
-                
-                if settings.MQTT_USERNAME:
-                    client_options["username"] = settings.MQTT_USERNAME
-                if settings.MQTT_PASSWORD:
-                    client_options["password"] = settings.MQTT_PASSWORD
-                
-                async with aiomqtt.Client(**client_options) as client:
+                async with aiomqtt.Client(**mqtt_client_options()) as client:
                     self.client = client
+                    self.bus = MqttBus(client)
                     
                     await client.subscribe(self.topic_command)
                     logging.info(f"Subscribed to {self.topic_command}")
                     await self.publish_status(message="Crawler started and ready")
+                    metrics_task = asyncio.create_task(report_metrics(self.publish_metrics))
                     
-                    async for message in client.messages:
-                        logging.info(f"Received message on topic: {message.topic} | Payload: {message.payload.decode()}")
-                        if str(message.topic) == self.topic_command:
-                            await self.handle_command(message)
+                    try:
+                        async for message in client.messages:
+                            if str(message.topic) == self.topic_command:
+                                logging.info(f"Received message on topic: {message.topic} | Payload: {message.payload.decode()}")
+                                await self.handle_command(message)
+                            else:
+                                self.bus.dispatch(str(message.topic), message.payload)
+                    finally:
+                        metrics_task.cancel()
+                        self.bus = None
                             
             except aiomqtt.MqttError as e:
                 logging.error(f"MQTT connection error: {e}. Reconnecting in {reconnect_interval} seconds...")
@@ -796,6 +1853,48 @@ class CrawlerManager:
                 logging.error(f"Unexpected error: {e}", exc_info=True)
                 await asyncio.sleep(reconnect_interval)
 
+def mqtt_client_options():
+    client_options = {
+        "hostname": settings.MQTT_HOST,
+        "port": settings.MQTT_PORT,
+    }
+    if settings.MQTT_USERNAME:
+        client_options["username"] = settings.MQTT_USERNAME
+    if settings.MQTT_PASSWORD:
+        client_options["password"] = settings.MQTT_PASSWORD
+    return client_options
+
+async def run_worker_mqtt(worker_id=None):
+    """Worker role: scrapes shards of distributed product jobs, reconnecting to the broker as needed."""
+    if not MQTT_AVAILABLE:
+        logging.error("Cannot start a worker without 'aiomqtt'.")
+        return
+    reconnect_interval = 5  # seconds
+    start_metrics_server()
+    start_drivers()
+    try:
+        while True:
+            try:
+                async with aiomqtt.Client(**mqtt_client_options()) as client:
+                    bus = MqttBus(client)
+                    # Whichever ends first (usually the pump, on a dropped connection) ends the session
+                    tasks = [asyncio.create_task(bus.pump()), asyncio.create_task(run_worker(bus, worker_id))]
+                    try:
+                        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        for task in tasks:
+                            task.cancel()
+                    for task in done:
+                        task.result()
+            except aiomqtt.MqttError as e:
+                logging.error(f"MQTT connection error: {e}. Reconnecting in {reconnect_interval} seconds...")
+                await asyncio.sleep(reconnect_interval)
+            except Exception as e:
+                logging.error(f"Unexpected error: {e}", exc_info=True)
+                await asyncio.sleep(reconnect_interval)
+    finally:
+        stop_drivers()
+
 async def main_mqtt():
     """Main async entry point for MQTT mode"""
     Path("logs").mkdir(exist_ok=True)
@@ -804,7 +1903,8 @@ async def main_mqtt():
     parser.add_argument("--no-mqtt", action="store_true", help="Disable MQTT and run in standalone mode")
     parser.add_argument("--job", type=str, choices=["discovery", "product"], help="Job to run in standalone mode (required if --no-mqtt is used)")
     
-    args = parser.parse_args()
+    # The crawler's own flags are parsed in __main__
+    args, _ = parser.parse_known_args()
     
     # Determine mode
     if args.no_mqtt:
@@ -833,8 +1933,42 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='WEG Web Crawler')
     parser.add_argument('--no-mqtt', action='store_true', 
                        help='Run in standalone mode without MQTT')
-    parser.add_argument('--job', choices=['discovery', 'product', 'full'], default='full',
-                       help='Job type: discovery (find URLs), product (scrape data), full (both)')
+    parser.add_argument('--job', choices=['discovery', 'product', 'full', 'import', 'refresh'], default='full',
+                       help='Job type: discovery (find URLs), product (scrape data), full (both), import (load scraped Parquet/CSV data into DB), '
+                            'refresh (re-scrape the products given by --codes/--urls/--category)')
+    parser.add_argument('--codes', type=str,
+                       help='Comma-separated product codes for --job refresh')
+    parser.add_argument('--urls', type=str,
+                       help='Comma-separated product URLs for --job refresh')
+    parser.add_argument('--category', type=str,
+                       help='Category slug for --job refresh (the whole subtree is refreshed)')
+    parser.add_argument('--resume', type=str, metavar='RUN_ID',
+                       help='Continue an interrupted standalone run (its id is printed at start)')
+    parser.add_argument('--fetch-mode', choices=list(FETCH_MODES), default=FETCH_MODE,
+                       help='Page fetch engine: http, selenium or hybrid (HTTP first, Chrome fallback)')
+    parser.add_argument('--parser', choices=list(PARSER_BACKENDS), default=PARSER_BACKEND,
+                       help='Product page parser: lxml (single pass), bs4 or auto (lxml when installed)')
+    parser.add_argument('--full-browser', action='store_true',
+                       help='Load pages with every resource (disables the lean Chrome profile)')
+    parser.add_argument('--no-throttle', action='store_true',
+                       help='Disable adaptive rate control (always run MAX_WORKERS requests at once)')
+    parser.add_argument('--discovery-source', choices=list(DISCOVERY_SOURCES), default=DISCOVERY_SOURCE,
+                       help='Discovery input: sitemap (robots.txt/sitemap.xml), links (crawl from START_URL) or auto')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Only parse and upsert product pages that changed since the last crawl')
+    parser.add_argument('--record', type=str,
+                       help='Save every fetched page into this directory (replayable with benchmark.py)')
+    parser.add_argument('--replay-origin', type=str,
+                       help='Fetch pages from this origin (e.g. a fixture server) instead of BASE_URL')
+    parser.add_argument('--role', choices=['manager', 'worker'], default='manager',
+                       help='manager: take commands over MQTT (and coordinate distributed jobs); '
+                            'worker: scrape shards of distributed product jobs')
+    parser.add_argument('--worker-id', type=str,
+                       help='Worker name on the cluster topics (default: <hostname>-<pid>)')
+    parser.add_argument('--distributed', action='store_true',
+                       help='Spread product jobs started over MQTT across the workers by default')
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                       help='Port of the Prometheus /metrics endpoint (0 disables it)')
     parser.add_argument('--mqtt-host', type=str, 
                        help='MQTT broker host (default: mqtt-broker)')
     parser.add_argument('--mqtt-port', type=int, 
@@ -842,6 +1976,18 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     
+    FETCH_MODE = args.fetch_mode
+    PARSER_BACKEND = args.parser
+    LEAN_BROWSER = not args.full_browser
+    ADAPTIVE_THROTTLE = not args.no_throttle
+    DISCOVERY_SOURCE = args.discovery_source
+    INCREMENTAL = args.incremental
+    RECORD_DIR = args.record
+    REPLAY_ORIGIN = args.replay_origin
+    METRICS_PORT = args.metrics_port
+    DISTRIBUTED = args.distributed
+    WORKER_ID = args.worker_id
+
     # Update settings if command-line args provided
     if args.mqtt_host:
         settings.MQTT_HOST = args.mqtt_hostr
@@ -850,12 +1996,25 @@ if __name__ == "__main__":
     
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    
-    if args.no_mqtt:
-        # Run in standalone mode without MQTT
-        print("Running in standalone mode (no MQTT)...")
-        asyncio.run(run_standalone_mode(args.job))
-    else:
-        # Run with MQTT (default)
-        print(f"Running with MQTT (host: {settings.MQTT_HOST}:{settings.MQTT_PORT})...")
-        asyncio.run(main_mqtt())
+
+    # Before the event loop, MQTT client or any driver thread exists
+    start_parse_pool()
+    try:
+        if args.no_mqtt:
+            # Run in standalone mode without MQTT
+            print("Running in standalone mode (no MQTT)...")
+            refresh = {
+                "codes": [c for c in (args.codes or "").split(",") if c],
+                "urls": [u for u in (args.urls or "").split(",") if u],
+                "category": args.category,
+            }
+            asyncio.run(run_standalone_mode(args.job, resume_id=args.resume, refresh=refresh))
+        elif args.role == 'worker':
+            print(f"Running as crawl worker (host: {settings.MQTT_HOST}:{settings.MQTT_PORT})...")
+            asyncio.run(run_worker_mqtt(args.worker_id))
+        else:
+            # Run with MQTT (default)
+            print(f"Running with MQTT (host: {settings.MQTT_HOST}:{settings.MQTT_PORT})...")
+            asyncio.run(main_mqtt())
+    finally:
+        stop_parse_pool()
@@ -34,7 +34,35 @@ basicConfig(
 # 1. CARREGAR OS DADOS 
 # ===================================================================
 
-df = pd.read_csv('data\\grouped_products_final.csv')
+PARQUET_DIR = 'data\\products'
+CSV_PIVOTADO = 'data\\grouped_products_final.csv'
+
+def carregar_produtos():
+    """
+    Lê só as colunas url/specs do dataset Parquet do crawler (um registro por
+    produto, fica o mais recente de cada URL). Sem pyarrow ou sem dataset,
+    cai para o CSV pivotado.
+    """
+    try:
+        import pyarrow.dataset as ds
+        tabela = ds.dataset(PARQUET_DIR, format="parquet", partitioning="hive").to_table(
+            columns=["url", "specs", "scraped_at"]
+        )
+    except (ImportError, FileNotFoundError, OSError) as e:
+        debug(f"Dataset Parquet indisponível ({e}), usando {CSV_PIVOTADO}")
+        return pd.read_csv(CSV_PIVOTADO)
+
+    produtos = (
+        tabela.to_pandas()
+        .sort_values('scraped_at')
+        .drop_duplicates('url', keep='last')
+    )
+    linhas = [dict(specs) for specs in produtos['specs']]
+    df = pd.DataFrame.from_records(linhas)
+    df.insert(0, 'Product URL', produtos['url'].to_numpy())
+    return df
+
+df = carregar_produtos()
 
 debug(f"Linhas carregadas: {len(df)}")
 info(f"1- Dataset Carregado!")
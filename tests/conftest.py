@@ -0,0 +1,58 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ETL_DIR = Path(__file__).resolve().parent.parent / "etl"
+sys.path.insert(0, str(ETL_DIR))
+
+# Scripts run by hand against a live browser, API or model, not pytest tests
+collect_ignore = ["test.py", "test_api.py", "predictor_load_test.py"]
+
+BASE_URL = "https://www.weg.net"
+
+
+@pytest.fixture(scope="session")
+def wc(tmp_path_factory):
+    """
+    weg_crawler, imported from a scratch directory: the module reads its
+    settings from the environment and creates data/ and logs/ on import.
+    """
+    os.environ.setdefault("DB_PASSWORD", "test")
+    workdir = tmp_path_factory.mktemp("weg_crawler")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        return importlib.import_module("weg_crawler")
+    finally:
+        os.chdir(cwd)
+
+
+def product_page(name, code, specs=(), images=(), breadcrumb=("Home", "Motors", "W22", "Page")):
+    """A minimal WEG product page with the blocks both parsers read."""
+    crumbs = "".join(f'<li><a href="/c/{i}"><span itemprop="name">{c}</span></a></li>'
+                     for i, c in enumerate(breadcrumb))
+    rows = "".join(f"<tr><th>{k}</th><td>{v}</td></tr>" for k, v in specs)
+    imgs = "".join(f'<img src="{src}">' for src in images)
+    return f"""<html><body>
+<ol class="breadcrumb">{crumbs}</ol>
+<h1 class="product-card-title">{name}</h1>
+<small class="product-card-info">Product: {code}</small>
+<div class="xtt-product-description"><p>{name} description</p></div>
+<div class="product-info-specs"><table class="table">{rows}</table></div>
+<div class="product-gallery">{imgs}</div>
+<a href="/files/{code}.png">Drawing</a>
+</body></html>"""
+
+
+def listing_page(links, pagination=()):
+    """A category page: navigation links only, no product blocks."""
+    anchors = "".join(f'<a class="xtt-url-categories" href="{href}">{href}</a>' for href in links)
+    pages = "".join(f'<li><a data-href="{href}">{i}</a></li>' for i, href in enumerate(pagination, 2))
+    return f"""<html><body>
+<div id="productMenuContent"><ul><li><a href="#">Menu</a></li></ul></div>
+{anchors}
+<ul class="pagination">{pages}</ul>
+</body></html>"""
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from conftest import BASE_URL, product_page
+from crawling.engine import CrawlEngine, FrontierSource, PageScraper
+from crawling.fetchers import HTTPX_AVAILABLE, HttpFetcher
+from crawling.frontier import DONE, FAILED, IN_FLIGHT, PENDING, Frontier
+from crawling.jobs import Budget, JobControl
+from crawling.parsing import ProductExtractor
+from crawling.replay import FixtureServer, PageStore, RewritingFetcher
+
+URLS = [f"{BASE_URL}/catalog/weg/BR/en/p/{i}" for i in range(12)]
+
+
+def test_resume_requeues_in_flight_urls(tmp_path):
+    path = tmp_path / "frontier.db"
+    frontier = Frontier(path, max_attempts=2)
+    frontier.start_job("job", "product", {"source": "test"})
+    assert frontier.add("job", URLS[:4]) == 4
+    assert frontier.add("job", URLS[:6]) == 2
+
+    claimed = [url for url, _ in frontier.claim("job", 4)]
+    frontier.mark_done("job", claimed[0])
+    assert not frontier.mark_failed("job", claimed[1], "timeout")  # back to pending
+    frontier.checkpoint()
+    # Crash: claimed[2:] are left in flight
+    frontier.conn.close()
+
+    frontier = Frontier(path, max_attempts=2)
+    assert frontier.counts("job") == {PENDING: 3, IN_FLIGHT: 2, DONE: 1, FAILED: 0}
+    job = frontier.resume_job("job")
+    assert job["meta"] == {"source": "test"} and job["state"] == "running"
+    assert frontier.counts("job") == {PENDING: 5, IN_FLIGHT: 0, DONE: 1, FAILED: 0}
+
+    claimed_again = {url for url, _ in frontier.claim("job", 10)}
+    assert claimed_again == set(URLS[:6]) - {claimed[0]}
+    # Second attempt for claimed[1]: it gives up now
+    assert frontier.mark_failed("job", claimed[1], "timeout")
+    assert frontier.urls("job", FAILED) == [claimed[1]]
+    frontier.close()
+
+
+def test_start_job_drops_old_state(tmp_path):
+    with Frontier(tmp_path / "frontier.db") as frontier:
+        frontier.start_job("job", "discovery")
+        frontier.add("job", URLS)
+        frontier.start_job("job", "discovery")
+        assert frontier.urls("job") == []
+        with pytest.raises(KeyError):
+            frontier.resume_job("missing")
+
+
+def test_checkpoint_hooks_run_after_commit(tmp_path):
+    with Frontier(tmp_path / "frontier.db", checkpoint_every=5) as frontier:
+        calls = []
+        frontier.checkpoint_hooks.append(lambda: calls.append(frontier.counts("job")[PENDING]))
+        frontier.start_job("job", "discovery")
+        calls.clear()
+        frontier.add("job", URLS[:4])
+        assert calls == []
+        frontier.add("job", URLS[4:])
+        assert calls == [len(URLS)]
+
+
+@pytest.fixture
+def served_pages(tmp_path):
+    store = PageStore(tmp_path / "corpus")
+    for i, url in enumerate(URLS):
+        store.put(url, product_page(f"Motor {i}", f"{i:05d}", specs=[("Poles", str(i % 4 + 2))]))
+    with FixtureServer(store, BASE_URL) as server:
+        yield server
+
+
+def crawl(frontier, server, job_id, control=None):
+    rows = {}
+
+    async def main():
+        fetcher = RewritingFetcher(HttpFetcher(timeout=10), BASE_URL, server.url)
+        scraper = PageScraper(fetcher, ProductExtractor(BASE_URL, "bs4"))
+
+        async def on_result(url, _, result):
+            rows[url] = result
+            frontier.mark_done(job_id, url)
+
+        async def on_error(url, _, e):
+            frontier.mark_failed(job_id, url, str(e))
+
+        engine = CrawlEngine(FrontierSource(frontier, job_id), scraper, on_result, on_error,
+                             max_workers=3, control=control)
+        try:
+            return await engine.run()
+        finally:
+            await fetcher.aclose()
+
+    return asyncio.run(main()), rows
+
+
+@pytest.mark.skipif(not HTTPX_AVAILABLE, reason="httpx is not installed")
+def test_interrupted_crawl_resumes_where_it_stopped(tmp_path, served_pages):
+    path = tmp_path / "frontier.db"
+    frontier = Frontier(path)
+    frontier.start_job("job", "product")
+    frontier.add("job", URLS)
+
+    stopped, first = crawl(frontier, served_pages, "job", JobControl(Budget(max_pages=5)))
+    assert stopped == "budget"
+    assert len(first) == 5
+    frontier.set_job_state("job", "interrupted")
+    frontier.close()
+
+    frontier = Frontier(path)
+    frontier.resume_job("job")
+    stopped, second = crawl(frontier, served_pages, "job")
+    assert stopped is None
+    assert set(first) | set(second) == set(URLS)
+    assert not set(first) & set(second)
+    assert frontier.counts("job")[DONE] == len(URLS)
+    assert served_pages.hits == len(URLS)
+    rows = {**first, **second}
+    codes = [value for url in URLS for _, feature, value in rows[url] if feature == "Product Code"]
+    assert codes == [f"{i:05d}" for i in range(len(URLS))]
+    frontier.close()
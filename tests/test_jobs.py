@@ -0,0 +1,209 @@
+import asyncio
+
+import pytest
+
+from crawling.jobs import (
+    CANCELLED,
+    DONE,
+    PREEMPTED,
+    QUEUED,
+    RUNNING,
+    Budget,
+    Job,
+    JobControl,
+    JobScheduler,
+    run_until_cancelled,
+)
+
+
+class Runner:
+    """Scheduler runner whose jobs work until `finish(job_id)`, honouring pause and cancel like the crawlers do."""
+
+    def __init__(self):
+        self.gates = {}
+        self.started = []
+
+    def finish(self, job_id):
+        self.gates.setdefault(job_id, asyncio.Event()).set()
+
+    async def __call__(self, job):
+        self.started.append(job.job_id)
+        gate = self.gates.setdefault(job.job_id, asyncio.Event())
+        while not gate.is_set() and not job.control.cancelled:
+            await job.control.wait_running()
+            await asyncio.sleep(0.001)
+        return job.job_id
+
+
+async def settle():
+    for _ in range(20):
+        await asyncio.sleep(0.001)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_priority_order_and_fifo():
+    async def scenario():
+        runner = Runner()
+        scheduler = JobScheduler(runner, max_concurrent=1)
+        await scheduler.submit(Job("first", "import", preemptible=False))
+        await scheduler.submit(Job("low", "product"))
+        await scheduler.submit(Job("high", "refresh", priority=5))
+        await scheduler.submit(Job("low2", "product"))
+        for job_id in ["first", "high", "low", "low2"]:
+            await settle()
+            assert scheduler.get(job_id).state == RUNNING
+            runner.finish(job_id)
+        await settle()
+        assert scheduler.idle()
+        return runner.started
+
+    assert run(scenario()) == ["first", "high", "low", "low2"]
+
+
+def test_preempt_and_resume():
+    async def scenario():
+        runner = Runner()
+        changes = []
+
+        async def on_change(job):
+            changes.append((job.job_id, job.state))
+
+        scheduler = JobScheduler(runner, max_concurrent=1, on_change=on_change)
+        crawl = await scheduler.submit(Job("crawl", "product"))
+        await settle()
+        refresh = await scheduler.submit(Job("refresh", "refresh", priority=10))
+        await settle()
+        assert crawl.state == PREEMPTED and crawl.control.paused
+        assert refresh.state == RUNNING
+
+        runner.finish("refresh")
+        await settle()
+        assert refresh.state == DONE
+        assert crawl.state == RUNNING and not crawl.control.paused
+
+        runner.finish("crawl")
+        await settle()
+        assert crawl.state == DONE and crawl.result == "crawl"
+        # The crawl was started once and paused in between, not restarted
+        assert runner.started == ["crawl", "refresh"]
+        assert ("crawl", PREEMPTED) in changes
+
+    run(scenario())
+
+
+def test_non_preemptible_job_keeps_its_slot():
+    async def scenario():
+        runner = Runner()
+        scheduler = JobScheduler(runner, max_concurrent=1)
+        imported = await scheduler.submit(Job("import", "import", preemptible=False))
+        await settle()
+        refresh = await scheduler.submit(Job("refresh", "refresh", priority=10))
+        await settle()
+        assert imported.state == RUNNING and refresh.state == QUEUED
+        runner.finish("import")
+        await settle()
+        assert refresh.state == RUNNING
+        runner.finish("refresh")
+        await settle()
+
+    run(scenario())
+
+
+def test_group_members_never_run_together():
+    async def scenario():
+        runner = Runner()
+        scheduler = JobScheduler(runner, max_concurrent=3)
+        a = await scheduler.submit(Job("a", "product", group="products"))
+        b = await scheduler.submit(Job("b", "product", group="products"))
+        c = await scheduler.submit(Job("c", "discovery"))
+        await settle()
+        # b waits for its group, but doesn't hold up c behind it
+        assert a.state == RUNNING and b.state == QUEUED and c.state == RUNNING
+
+        runner.finish("a")
+        await settle()
+        assert b.state == RUNNING
+        for job_id in "bc":
+            runner.finish(job_id)
+        await settle()
+        assert scheduler.idle()
+
+    run(scenario())
+
+
+def test_manual_pause_and_resume():
+    async def scenario():
+        runner = Runner()
+        scheduler = JobScheduler(runner, max_concurrent=1)
+        crawl = await scheduler.submit(Job("crawl", "product"))
+        await settle()
+        assert await scheduler.pause("crawl")
+        other = await scheduler.submit(Job("other", "discovery"))
+        await settle()
+        # A paused job gives its slot away
+        assert other.state == RUNNING
+
+        assert await scheduler.resume("crawl")
+        await settle()
+        assert crawl.state == PREEMPTED
+        runner.finish("other")
+        await settle()
+        assert crawl.state == RUNNING
+        runner.finish("crawl")
+        await settle()
+
+    run(scenario())
+
+
+def test_cancel_queued_and_running():
+    async def scenario():
+        runner = Runner()
+        scheduler = JobScheduler(runner, max_concurrent=1)
+        running = await scheduler.submit(Job("running", "product"))
+        queued = await scheduler.submit(Job("queued", "product"))
+        await settle()
+        assert await scheduler.cancel("queued")
+        assert queued.state == CANCELLED and queued.control.cancelled
+
+        assert await scheduler.cancel("running")
+        await settle()
+        assert running.state == CANCELLED
+        assert not await scheduler.cancel("running")
+        assert runner.started == ["running"]
+
+        again = await scheduler.submit(Job("again", "product"))
+        with pytest.raises(ValueError):
+            await scheduler.submit(Job("again", "product"))
+        runner.finish("again")
+        await settle()
+        assert again.state == DONE
+
+    run(scenario())
+
+
+def test_budget_limits_claims():
+    control = JobControl(Budget(max_pages=5, max_workers=2, max_drivers=3))
+    assert control.claim_limit(in_flight=0, free=8) == 2
+    control.started(4)
+    assert control.claim_limit(in_flight=0, free=8) == 1
+    control.started(1)
+    assert control.claim_limit(in_flight=0, free=8) == 0
+    assert control.outcome() == "budget"
+    assert control.drivers(8) == 3
+    control.cancel()
+    assert control.outcome() == "cancelled"
+
+
+def test_run_until_cancelled():
+    async def scenario():
+        control = JobControl()
+        task = asyncio.ensure_future(run_until_cancelled(asyncio.sleep(60), control))
+        await settle()
+        control.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    run(scenario())
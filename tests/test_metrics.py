@@ -0,0 +1,47 @@
+from crawling.metrics import MetricsRegistry
+from crawling.throttle import Throttle
+
+
+def sample_lines(text, name):
+    return sorted(line for line in text.splitlines() if line.startswith(f"crawler_{name}{{"))
+
+
+def test_jobs_are_reported_separately():
+    registry = MetricsRegistry()
+    discovery = registry.begin("discovery", "d1")
+    product = registry.begin("product", "p1")
+    discovery.page_done()
+    product.page_done()
+    product.page_done(failed=True)
+    product.set_gauge("frontier_pending", 7)
+
+    text = registry.prometheus_text()
+    assert text.count("# TYPE crawler_pages_total counter") == 1
+    assert sample_lines(text, "pages_total") == [
+        'crawler_pages_total{job_id="d1",stage="discovery"} 1',
+        'crawler_pages_total{job_id="p1",stage="product"} 2',
+    ]
+    assert 'crawler_queue_depth{job_id="p1",stage="product",queue="frontier_pending"} 7' in text
+
+    assert registry.end("d1")["pages"] == 1
+    assert "d1" not in registry.snapshot()["jobs"]
+
+
+def test_throttle_stats_are_labelled_by_host():
+    registry = MetricsRegistry()
+    metrics = registry.begin("product", "p1")
+    throttle = Throttle(max_concurrency=4, rate=2.0)
+    throttle.for_url("https://www.weg.net/a")
+    throttle.for_url("https://static.weg.net/b")
+    metrics.add_source("throttle", throttle.stats)
+    registry.add_source("drivers", lambda: {"size": 3, "utilization": 0.5, "closed": False})
+
+    text = registry.prometheus_text()
+    assert sample_lines(text, "throttle_rate") == [
+        'crawler_throttle_rate{job_id="p1",stage="product",host="static.weg.net"} 2.0',
+        'crawler_throttle_rate{job_id="p1",stage="product",host="www.weg.net"} 2.0',
+    ]
+    # latency_ewma is None until the first response
+    assert "crawler_throttle_latency_ewma{" not in text
+    assert "crawler_drivers_utilization 0.5" in text
+    assert "crawler_drivers_closed" not in text
@@ -0,0 +1,88 @@
+import pickle
+
+import pytest
+from bs4 import BeautifulSoup
+
+from conftest import BASE_URL, listing_page, product_page
+from crawling.parsing import (
+    PageExtractor,
+    ProductExtractor,
+    extract_navigation_links,
+    extract_navigation_links_lxml,
+    _parse_tree,
+    new_parse_pool,
+    parse_product_html,
+)
+
+pytest.importorskip("lxml")
+
+URL = f"{BASE_URL}/catalog/weg/BR/en/p/MKT_W22"
+
+PAGES = [
+    product_page("W22 Motor", "12345",
+                 specs=[("Frame", "80"), ("Output", "0,75 kW"), ("Poles", "4")],
+                 images=["/img/product-w22.jpg", "https://static.weg.net/product-w22-side.png", "/img/logo.svg"]),
+    product_page("Capacitor", "CAP-1", specs=[("Voltage", "220 V")], images=[],
+                 breadcrumb=("Home", "Controls", "Capacitors", "Page")),
+    # Partial page: no table, no breadcrumb
+    '<html><body><h1 class="product-card-title">Bare</h1></body></html>',
+    "<html><body><p>No product here</p></body></html>",
+]
+
+
+@pytest.mark.parametrize("html", PAGES)
+def test_lxml_rows_match_bs4(html):
+    assert parse_product_html(html, URL, BASE_URL, "lxml") == parse_product_html(html, URL, BASE_URL, "bs4")
+
+
+def test_product_rows():
+    rows = parse_product_html(PAGES[0], URL, BASE_URL, "lxml")
+    fields = {feature: value for _, feature, value in rows}
+    assert fields["Category_Path"] == "Motors > W22"
+    assert fields["Product Code"] == "12345"
+    assert fields["Output"] == "0,75 kW"
+    assert fields["Image URL 1"] == f"{BASE_URL}/img/product-w22.jpg"
+    assert fields["Image URL 3"] == f"{BASE_URL}/files/12345.png"
+    assert all(url == URL for url, _, _ in rows)
+
+
+def test_navigation_links_match_bs4():
+    html = listing_page(
+        ["/catalog/weg/BR/en/Motors/c/BR_MOTORS", f"{BASE_URL}/catalog/weg/BR/en/Drives/c/BR_DRIVES", "/img/banner.jpg"],
+        pagination=["/catalog/weg/BR/en/Motors/c/BR_MOTORS?page=2"],
+    )
+    page = f"{BASE_URL}/catalog/weg/BR/en/"
+    bs4_links = extract_navigation_links(BeautifulSoup(html, "html.parser"), page, BASE_URL)
+    lxml_links = extract_navigation_links_lxml(_parse_tree(html), page, BASE_URL)
+    assert sorted(lxml_links) == sorted(bs4_links)
+    assert f"{BASE_URL}/catalog/weg/BR/en/Motors/c/BR_MOTORS?page=2" in lxml_links
+    assert not any(link.endswith(".jpg") for link in lxml_links)
+
+
+@pytest.mark.parametrize("html", PAGES + [listing_page(["/catalog/weg/BR/en/Motors/c/BR_MOTORS"])])
+def test_page_extractor_backends_agree(html):
+    rows, links = PageExtractor(BASE_URL, "lxml")(html, URL)
+    bs4_rows, bs4_links = PageExtractor(BASE_URL, "bs4")(html, URL)
+    assert rows == bs4_rows
+    assert sorted(links) == sorted(bs4_links)
+
+
+def test_extractors_pickle():
+    # The crawler ships them to the parse pool's worker processes
+    extract = pickle.loads(pickle.dumps(ProductExtractor(BASE_URL, "lxml")))
+    assert extract(PAGES[1], URL) == parse_product_html(PAGES[1], URL, BASE_URL, "bs4")
+
+
+def test_parse_pool_runs_extractors():
+    assert new_parse_pool(0) is None
+    pool = new_parse_pool(1)
+    try:
+        rows = pool.submit(ProductExtractor(BASE_URL, "lxml"), PAGES[0], URL).result(timeout=60)
+    finally:
+        pool.shutdown(wait=True)
+    assert rows == parse_product_html(PAGES[0], URL, BASE_URL, "bs4")
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        parse_product_html(PAGES[0], URL, BASE_URL, "html5lib")
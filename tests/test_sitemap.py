@@ -0,0 +1,111 @@
+import asyncio
+import gzip
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from conftest import BASE_URL
+from crawling.incremental import PageIndex, PageVersion
+from crawling.replay import FixtureServer, PageStore
+from crawling.sitemap import HTTPX_AVAILABLE, SitemapReader, parse_lastmod, parse_sitemap, sitemaps_from_robots
+
+NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+
+def urlset(entries):
+    body = "".join(
+        f"<url><loc>{loc}</loc>{f'<lastmod>{lastmod}</lastmod>' if lastmod else ''}</url>"
+        for loc, lastmod in entries
+    )
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset {NS}>{body}</urlset>'
+
+
+def sitemap_index(locs):
+    body = "".join(f"<sitemap><loc>{loc}</loc></sitemap>" for loc in locs)
+    return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex {NS}>{body}</sitemapindex>'
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2024-05-01", datetime(2024, 5, 1, tzinfo=timezone.utc)),
+    ("2024-05-01T10:00:00Z", datetime(2024, 5, 1, 10, tzinfo=timezone.utc)),
+    (" 2024-05-01T10:00:00z ", datetime(2024, 5, 1, 10, tzinfo=timezone.utc)),
+    ("2024-05-01T10:00:00+02:00", datetime(2024, 5, 1, 8, tzinfo=timezone.utc)),
+    ("yesterday", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_lastmod(value, expected):
+    assert parse_lastmod(value) == expected
+
+
+def test_robots_sitemaps():
+    robots = "User-agent: *\nDisallow: /admin\nSitemap: /sitemap_index.xml\nsitemap: https://www.weg.net/extra.xml\n"
+    assert sitemaps_from_robots(robots, BASE_URL) == [f"{BASE_URL}/sitemap_index.xml", f"{BASE_URL}/extra.xml"]
+
+
+def test_parse_sitemap_in_chunks_and_gzipped():
+    xml = urlset([(f"{BASE_URL}/p/{i}", "2024-05-01T10:00:00Z") for i in range(50)]).encode()
+    for body in (xml, gzip.compress(xml)):
+        chunks = [body[i:i + 97] for i in range(0, len(body), 97)]
+        entries = list(parse_sitemap(chunks))
+        assert [entry.loc for _, entry in entries] == [f"{BASE_URL}/p/{i}" for i in range(50)]
+        assert {kind for kind, _ in entries} == {"url"}
+        assert entries[0][1].lastmod == datetime(2024, 5, 1, 10, tzinfo=timezone.utc)
+
+
+@pytest.mark.skipif(not HTTPX_AVAILABLE, reason="httpx is not installed")
+def test_reader_follows_robots_and_indexes(tmp_path):
+    store = PageStore(tmp_path / "corpus")
+    store.put(f"{BASE_URL}/robots.txt", "Sitemap: /sitemap_index.xml\n")
+    store.put(f"{BASE_URL}/sitemap_index.xml",
+              sitemap_index([f"{BASE_URL}/sitemap-1.xml", f"{BASE_URL}/sitemap-missing.xml", f"{BASE_URL}/sitemap-2.xml"]))
+    store.put(f"{BASE_URL}/sitemap-1.xml", urlset([(f"{BASE_URL}/BR/en/p/1", "2024-05-01T10:00:00Z"),
+                                                   (f"{BASE_URL}/BR/en/p/2", None)]))
+    store.put(f"{BASE_URL}/sitemap-2.xml", urlset([(f"{BASE_URL}/BR/en/p/3", "2024-06-01")]))
+
+    async def main(server):
+        reader = SitemapReader(timeout=10, rewrite=lambda url: server.url + url[len(BASE_URL):])
+        try:
+            sitemaps = await reader.find_sitemaps(f"{BASE_URL}/institutional/BR/en/")
+            entries = [entry async for entry in reader.entries(sitemaps)]
+        finally:
+            await reader.aclose()
+        return sitemaps, entries, reader
+
+    with FixtureServer(store, BASE_URL) as server:
+        sitemaps, entries, reader = asyncio.run(main(server))
+
+    assert sitemaps == [f"{BASE_URL}/sitemap_index.xml"]
+    assert [entry.loc for entry in entries] == [f"{BASE_URL}/BR/en/p/{i}" for i in (1, 2, 3)]
+    assert [entry.lastmod for entry in entries] == [
+        datetime(2024, 5, 1, 10, tzinfo=timezone.utc), None, datetime(2024, 6, 1, tzinfo=timezone.utc),
+    ]
+    assert (reader.sitemaps_read, reader.failed) == (3, 1)
+
+
+def test_lastmod_filtering(wc, tmp_path, monkeypatch):
+    now = datetime.now(timezone.utc)
+    fetched = f"{BASE_URL}/catalog/weg/BR/en/p/fetched"
+    updated = f"{BASE_URL}/catalog/weg/BR/en/p/updated"
+    undated = f"{BASE_URL}/catalog/weg/BR/en/p/undated"
+    new = f"{BASE_URL}/catalog/weg/BR/en/p/new"
+
+    with PageIndex(tmp_path / "index.sqlite3") as index:
+        for url in (fetched, updated, undated):
+            index.record(PageVersion(url, html_hash="h", content_hash="c"))
+
+        # Written and read back the way discovery hands lastmods to the product job
+        monkeypatch.setattr(wc, "PRODUCT_URLS_FILE", tmp_path / "product_urls.csv")
+        wc.save_product_urls({fetched, updated, undated, new}, {
+            fetched: now - timedelta(days=2),
+            updated: now + timedelta(hours=1),
+            new: now - timedelta(days=2),
+        })
+        table = pd.read_csv(wc.PRODUCT_URLS_FILE, dtype=str, keep_default_na=False)
+        assert table.loc[table.product_url == undated, "lastmod"].item() == ""
+
+        unchanged = wc.unchanged_by_lastmod(table["product_url"].tolist(), table["lastmod"].tolist(), index)
+
+    # Only a page fetched after its lastmod can be skipped
+    assert unchanged == {fetched}
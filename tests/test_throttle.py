@@ -0,0 +1,52 @@
+import asyncio
+
+from crawling.throttle import AdaptiveConcurrency, HostThrottle, Throttle, TokenBucket, is_block_page
+
+
+def host_throttle(limit=1, rate=1.0):
+    return HostThrottle("www.weg.net", AdaptiveConcurrency(limit, max_limit=limit), TokenBucket(rate),
+                        min_rate=0.1, max_rate=4.0, rate_step=0.5, backoff_base=30.0, backoff_max=600.0)
+
+
+def test_cancel_while_waiting_for_a_token_frees_the_slot():
+    async def scenario():
+        throttle = host_throttle(limit=2, rate=0.01)
+        await throttle.acquire()  # takes the only token
+        waiter = asyncio.ensure_future(throttle.acquire())
+        await asyncio.sleep(0.01)
+        assert throttle.concurrency.in_flight == 2
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert throttle.concurrency.in_flight == 1
+        await throttle.release(0.1, ok=True)
+        assert throttle.concurrency.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_block_pages_pause_the_host():
+    async def scenario():
+        throttle = host_throttle(limit=2, rate=2.0)
+        await throttle.acquire()
+        await throttle.release(0.1, ok=False, blocked=True)
+        return throttle
+
+    throttle = asyncio.run(scenario())
+    assert throttle.blocks == 1
+    assert throttle.bucket.rate == 1.0
+    assert throttle.stats()["in_flight"] == 0
+    assert throttle.paused_until > 0
+
+
+def test_hosts_are_throttled_separately():
+    throttle = Throttle(max_concurrency=4)
+    a = throttle.for_url("https://www.weg.net/a")
+    assert throttle.for_url("https://www.weg.net/b") is a
+    assert throttle.for_url("https://static.weg.net/a") is not a
+    assert set(throttle.stats()) == {"www.weg.net", "static.weg.net"}
+
+
+def test_block_page_detection():
+    assert is_block_page("", 429)
+    assert is_block_page("<html><head><title>Access Denied</title></head></html>")
+    assert not is_block_page("<html><head><title>W22 Motor</title></head></html>")
@@ -0,0 +1,174 @@
+import json
+from contextlib import contextmanager
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+
+class FlakyEngine:
+    """
+    Stands in for the MySQL engine: executes nothing, but rejects records
+    whose id starts with "bad" and fails the first `outages` calls with a
+    connection error.
+    """
+
+    def __init__(self, outages=0):
+        self.outages = outages
+        self.written = []
+        self.calls = 0
+
+    @contextmanager
+    def begin(self):
+        yield self
+
+    def execute(self, stmt, rows):
+        self.calls += 1
+        if self.outages:
+            self.outages -= 1
+            raise OperationalError("INSERT", {}, Exception("Lost connection to MySQL server"))
+        bad = [row["id"] for row in rows if str(row["id"]).startswith("bad")]
+        if bad:
+            raise IntegrityError("INSERT", {}, Exception(f"Data too long for column 'id': {bad[0]}"))
+        self.written.extend(rows)
+
+
+def product(code, **fields):
+    return {"id": code, "url": f"https://www.weg.net/p/{code}", "name": code, "specs": {"Poles": 4},
+            "scraped_at": "2024-05-01T10:00:00", **fields}
+
+
+@pytest.fixture
+def no_backoff(wc, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(wc.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def test_rejected_rows_are_dead_lettered(wc, tmp_path):
+    engine = FlakyEngine()
+    dead_letter = tmp_path / "dead_letter.jsonl"
+    upserter = wc.ChunkedUpserter(wc.Products, engine, batch_size=4, dead_letter_path=dead_letter)
+    upserter.add_many([product("1"), product("bad-2", description=float("nan")), product("3"), product("4"),
+                       product("5"), product("bad-6")])
+    upserter.close()
+
+    assert [row["id"] for row in engine.written] == ["1", "3", "4", "5"]
+    assert (upserter.received, upserter.written, upserter.rejected) == (6, 4, 2)
+    letters = [json.loads(line) for line in dead_letter.read_text(encoding="utf-8").splitlines()]
+    assert [letter["record"]["id"] for letter in letters] == ["bad-2", "bad-6"]
+    assert letters[0]["table"] == "products"
+    assert "Data too long" in letters[0]["error"]
+    # Records are stored the way they were sent: specs already JSON, NaN as null
+    assert json.loads(letters[0]["record"]["specs"]) == {"Poles": 4}
+    assert letters[0]["record"]["description"] is None
+
+
+def test_transient_errors_are_retried(wc, tmp_path, no_backoff):
+    engine = FlakyEngine(outages=2)
+    upserter = wc.ChunkedUpserter(wc.Products, engine, batch_size=10, max_retries=3,
+                                  dead_letter_path=tmp_path / "dead_letter.jsonl")
+    upserter.add_many([product(str(i)) for i in range(3)])
+    upserter.close()
+    assert upserter.written == 3 and upserter.rejected == 0
+    assert no_backoff == [2, 4]
+
+
+def test_exhausted_retries_raise_instead_of_dead_lettering(wc, tmp_path, no_backoff):
+    engine = FlakyEngine(outages=10)
+    dead_letter = tmp_path / "dead_letter.jsonl"
+    upserter = wc.ChunkedUpserter(wc.Products, engine, batch_size=10, max_retries=2, dead_letter_path=dead_letter)
+    upserter.add_many([product(str(i)) for i in range(3)])
+    with pytest.raises(OperationalError):
+        upserter.flush()
+    assert engine.calls == 2
+    assert upserter.rejected == 0
+    assert not dead_letter.exists()
+
+
+def test_connection_lost_while_isolating_rows_raises(wc, tmp_path):
+    engine = FlakyEngine()
+    upserter = wc.ChunkedUpserter(wc.Products, engine, batch_size=10, dead_letter_path=tmp_path / "dl.jsonl")
+    upserter.add_many([product("1"), product("bad-2")])
+    original = engine.execute
+
+    def execute(stmt, rows):
+        # The chunk is rejected, then the server goes away mid-replay
+        if len(rows) == 1:
+            raise OperationalError("INSERT", {}, Exception("Lost connection to MySQL server"))
+        return original(stmt, rows)
+
+    engine.execute = execute
+    with pytest.raises(OperationalError):
+        upserter.flush()
+    assert upserter.rejected == 0
+
+
+def test_group_product_rows(wc, tmp_path):
+    csv = tmp_path / "rows.csv"
+    csv.write_text(
+        "Product URL,Feature,Value\n"
+        "u1,Product Code,123\n"
+        "u2,Product Code,abc\n"
+        "u1,Voltage,\n"
+        "u1,Image URL 1,https://static.weg.net/1.jpg\n"
+        ",Orphan,x\n"
+        "u1,Image URL 2,https://static.weg.net/2.jpg\n",
+        encoding="utf-8",
+    )
+    products = list(wc.group_product_rows(pd.read_csv(csv)))
+    assert [url for url, _, _ in products] == ["u1", "u2"]
+    _, specs, images = products[0]
+    assert specs == {"Product Code": "123", "Voltage": None}
+    assert json.dumps(specs) == '{"Product Code": "123", "Voltage": null}'
+    assert images == ["https://static.weg.net/1.jpg", "https://static.weg.net/2.jpg"]
+
+
+@pytest.fixture
+def category_db(wc):
+    engine = create_engine("sqlite://")
+    wc.Base.metadata.create_all(engine, tables=[wc.Categories.__table__])
+    with engine.begin() as conn:
+        # categories.slug is unique in the application schema
+        conn.execute(text("CREATE UNIQUE INDEX ux_categories_slug ON categories (slug)"))
+    return engine
+
+
+def test_category_paths_are_created_once(wc, category_db):
+    resolver = wc.CategoryResolver(category_db)
+    ids = resolver.resolve_many([["Motors", "W22"], ["Motors", "W21"], ["Drives"]])
+    assert resolver.created == 4
+    assert resolver.resolve(["Motors", "W22"]) == ids[("Motors", "W22")]
+
+    again = wc.CategoryResolver(category_db)
+    assert again.resolve_many([["Motors", "W22"], ["Drives"]]) == {
+        ("Motors", "W22"): ids[("Motors", "W22")], ("Drives",): ids[("Drives",)],
+    }
+    assert again.created == 0
+
+
+def test_repeated_names_get_distinct_slugs(wc, category_db):
+    resolver = wc.CategoryResolver(category_db)
+    ids = resolver.resolve_many([["Motors", "Accessories"], ["Drives", "Accessories"], ["Accessories"]])
+    assert len(set(ids.values())) == 3
+
+    with category_db.connect() as conn:
+        rows = conn.execute(select(wc.Categories.name, wc.Categories.slug, wc.Categories.parent_id)).all()
+    slugs = [slug for _, slug, _ in rows]
+    assert len(slugs) == len(set(slugs))
+    assert {slug for name, slug, _ in rows if name == "Accessories"} >= {"accessories"}
+
+
+def test_slug_taken_by_another_writer(wc, category_db):
+    resolver = wc.CategoryResolver(category_db)
+    with category_db.begin() as conn:
+        conn.execute(text("INSERT INTO categories (name, slug) VALUES ('Legacy', 'motors')"))
+
+    # The resolver doesn't know "motors" is taken: the level falls back to row-by-row inserts
+    ids = resolver.resolve_many([["Motors", "W22"], ["Drives"]])
+    with category_db.connect() as conn:
+        slugs = dict(conn.execute(select(wc.Categories.id, wc.Categories.slug)).all())
+    assert slugs[ids[("Drives",)]] == "drives"
+    assert slugs[ids[("Motors", "W22")]] == "w22"
+    assert len(set(slugs.values())) == len(slugs) == 4
@@ -0,0 +1,75 @@
+import numpy as np
+
+from crawling.urlseen import UrlSeen, hash_url
+
+URLS = [f"https://www.weg.net/catalog/weg/BR/en/p/{i}" for i in range(1000)]
+
+
+def test_in_memory_set():
+    seen = UrlSeen(buffer_size=64)
+    assert seen.update(URLS[:500]) == 500
+    assert seen.update(URLS) == 500
+    assert not seen.add(URLS[0])
+    assert seen.add("https://www.weg.net/new")
+    assert len(seen) == 1001
+    assert all(url in seen for url in URLS)
+    assert "https://www.weg.net/other" not in seen
+
+
+def test_save_and_reopen_memory_maps(tmp_path):
+    path = tmp_path / "seen.npy"
+    with UrlSeen(path, buffer_size=64) as seen:
+        seen.update(URLS)
+    assert not (tmp_path / "seen.npy.journal").read_bytes()
+
+    reopened = UrlSeen(path)
+    assert isinstance(reopened.base, np.memmap)
+    assert len(reopened) == len(URLS)
+    assert all(url in reopened for url in URLS)
+    assert not reopened.add(URLS[10])
+    reopened.close()
+
+
+def test_journal_survives_a_crash(tmp_path):
+    path = tmp_path / "seen.npy"
+    with UrlSeen(path) as seen:
+        seen.update(URLS[:100])
+
+    crashed = UrlSeen(path)
+    crashed.update(URLS[100:200])
+    crashed.add(URLS[200])
+    crashed.flush()
+    # No close(): the additions only exist in the journal, plus a torn last write
+    with open(tmp_path / "seen.npy.journal", "ab") as f:
+        f.write(b"\x01\x02\x03")
+
+    resumed = UrlSeen(path)
+    assert len(resumed) == 201
+    assert all(url in resumed for url in URLS[:201])
+    assert URLS[201] not in resumed
+    resumed.close()
+
+    # save() folded the journal into the array
+    assert len(UrlSeen(path)) == 201
+
+
+def test_journal_entries_already_saved_are_not_counted_twice(tmp_path):
+    path = tmp_path / "seen.npy"
+    with UrlSeen(path) as seen:
+        seen.update(URLS[:50])
+    journal = tmp_path / "seen.npy.journal"
+    journal.write_bytes(np.array([hash_url(u) for u in URLS[:60]], dtype="<u8").tobytes())
+
+    with UrlSeen(path) as seen:
+        seen._merge()
+        assert len(seen) == 60
+
+
+def test_remove(tmp_path):
+    path = tmp_path / "seen.npy"
+    with UrlSeen(path) as seen:
+        seen.add(URLS[0])
+    UrlSeen.remove(path)
+    assert not path.exists()
+    assert not (tmp_path / "seen.npy.journal").exists()
+    assert URLS[0] not in UrlSeen(path)